@@ -0,0 +1,328 @@
+"""Archive tasks run in the process pools of the backend (metadata writes, integrity checks).
+
+The pools start their workers with forkserver (spawn where it is unavailable), never fork: the
+backend process runs threads and holds SQLite and logging locks a forked child could inherit
+locked. Workers unpickle their tasks from this module, which only depends on the standard
+library and rarfile, so importing it opens no cache, connection or thread of the backend.
+"""
+import copy
+import hashlib
+import io
+import json
+import os
+import shutil
+import struct
+import tempfile
+import time
+import zipfile
+
+import rarfile
+
+# --- CBZ Archive Writes --- START ---
+
+COMIC_INFO_NAME = 'ComicInfo.xml'
+_ZIP64_EXTRA_ID = 0x0001
+_DATA_DESCRIPTOR_FLAG = 0x08
+# Local file header (APPNOTE 4.3.7): signature, version needed, flags, method, time, date, CRC-32,
+# compressed size, size, file name length, extra field length
+_LOCAL_HEADER = struct.Struct('<4s5H3L2H')
+_LOCAL_HEADER_SIGNATURE = b'PK\x03\x04'
+
+def _is_comic_info(name):
+    return os.path.basename(name).lower() == COMIC_INFO_NAME.lower()
+
+def zip_data_offset(fp, info):
+    """Return the offset of the (compressed) data of ``info`` in the open archive file ``fp``."""
+    fp.seek(info.header_offset)
+    header = fp.read(_LOCAL_HEADER.size)
+    if len(header) != _LOCAL_HEADER.size or header[:4] != _LOCAL_HEADER_SIGNATURE:
+        raise zipfile.BadZipFile(f'Bad local header for {info.filename}')
+    *_, name_length, extra_length = _LOCAL_HEADER.unpack(header)
+    return info.header_offset + _LOCAL_HEADER.size + name_length + extra_length
+
+def _strip_zip64_extra(extra):
+    """Drop the ZIP64 record from an extra field; FileHeader() re-adds it when needed."""
+    kept, i = [], 0
+    while i + 4 <= len(extra):
+        header_id, size = struct.unpack('<HH', extra[i:i + 4])
+        if header_id != _ZIP64_EXTRA_ID:
+            kept.append(extra[i:i + 4 + size])
+        i += 4 + size
+    return b''.join(kept)
+
+def copy_zip_member_raw(src_fp, info, dst):
+    """Append member ``info`` to the ZipFile ``dst`` (opened with mode 'w') without recompressing it.
+
+    zipfile has no public API for this. The local header and the data are written to ``dst.fp``,
+    then the entry is registered the way ZipFile.write() does, so close() writes its central
+    directory record: ``filelist`` and ``NameToInfo`` get the ZipInfo, and ``start_dir`` (where
+    the next member or the central directory starts) moves past the data. Checked against
+    CPython 3.8 to 3.13; tests/test_archive_workers.py covers it.
+    """
+    if dst.mode != 'w':
+        raise ValueError("L'archive de destination doit être ouverte en écriture (mode 'w')")
+    new_info = copy.copy(info)
+    new_info.flag_bits &= ~_DATA_DESCRIPTOR_FLAG  # CRC and sizes are known, write them in the local header
+    new_info.extra = _strip_zip64_extra(info.extra)
+    new_info.header_offset = dst.fp.tell()
+    dst.fp.write(new_info.FileHeader())
+
+    src_fp.seek(zip_data_offset(src_fp, info))
+    remaining = info.compress_size
+    while remaining:
+        chunk = src_fp.read(min(remaining, 1024 * 1024))
+        if not chunk:
+            raise zipfile.BadZipFile(f'Truncated data for {info.filename}')
+        dst.fp.write(chunk)
+        remaining -= len(chunk)
+
+    dst.filelist.append(new_info)
+    dst.NameToInfo[new_info.filename] = new_info
+    dst.start_dir = dst.fp.tell()
+
+def _fsync_directory(path):
+    try:
+        fd = os.open(path, os.O_RDONLY)
+    except OSError:
+        return  # Not supported on every platform (e.g. Windows)
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+def replace_file_atomically(file_path, write_func):
+    """Write a sibling temp file with ``write_func(fp)``, fsync it and rename it over ``file_path``."""
+    directory = os.path.dirname(os.path.abspath(file_path))
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.' + os.path.basename(file_path) + '.', suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'w+b') as tmp_file:
+            write_func(tmp_file)
+            tmp_file.flush()
+            os.fsync(tmp_file.fileno())
+        if os.path.exists(file_path):
+            shutil.copymode(file_path, tmp_path)
+        os.replace(tmp_path, file_path)
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
+    _fsync_directory(directory)
+
+def rewrite_cbz(file_path, comic_info_xml=None, compact=False):
+    """Rewrite a CBZ with a single ComicInfo.xml, copying the other members without recompression.
+
+    ``comic_info_xml`` replaces the existing ComicInfo.xml (the last one is kept when None).
+    With ``compact`` duplicated members are dropped too, keeping the last copy like readers do.
+    Returns a summary dict with the entry counts and sizes before/after.
+    """
+    size_before = os.path.getsize(file_path)
+    with open(file_path, 'rb') as src_fp, zipfile.ZipFile(src_fp) as src:
+        members = src.infolist()
+        last_index = {info.filename: i for i, info in enumerate(members)}
+        comic_infos = [info for info in members if _is_comic_info(info.filename)]
+        if comic_info_xml is None and comic_infos:
+            comic_info_xml = src.read(comic_infos[-1])
+
+        kept = [info for i, info in enumerate(members)
+                if not _is_comic_info(info.filename) and (not compact or last_index[info.filename] == i)]
+
+        def write_archive(tmp_file):
+            with zipfile.ZipFile(tmp_file, 'w') as dst:
+                dst.comment = src.comment
+                for info in kept:
+                    copy_zip_member_raw(src_fp, info, dst)
+                if comic_info_xml is not None:
+                    comic_info = zipfile.ZipInfo(COMIC_INFO_NAME, date_time=time.localtime()[:6])
+                    comic_info.compress_type = zipfile.ZIP_DEFLATED
+                    dst.writestr(comic_info, comic_info_xml)
+
+        replace_file_atomically(file_path, write_archive)
+
+    entries_after = len(kept) + (1 if comic_info_xml is not None else 0)
+    return {
+        'entriesBefore': len(members),
+        'entriesAfter': entries_after,
+        'sizeBefore': size_before,
+        'sizeAfter': os.path.getsize(file_path),
+    }
+
+SIDECAR_SUFFIX = '.ComicInfo.xml'
+# Only CBR archives get a sidecar: 'Tome 01.cbz' next to 'Tome 01.cbr' must not share it
+SIDECAR_EXTENSIONS = ('.cbr',)
+CBR_METADATA_MODES = ('sidecar', 'convert')
+# Images are already compressed: store them as-is when repacking a CBR
+_STORED_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.gif', '.webp', '.avif', '.jxl', '.bmp')
+
+def sidecar_path(archive_path):
+    """Path of the sidecar ComicInfo.xml of a CBR ('Tome 01.cbr' -> 'Tome 01.ComicInfo.xml')."""
+    return os.path.splitext(archive_path)[0] + SIDECAR_SUFFIX
+
+def has_sidecar(archive_path):
+    """Return True if ``archive_path`` is a CBR with a sidecar ComicInfo.xml."""
+    return archive_path.endswith(SIDECAR_EXTENSIONS) and os.path.isfile(sidecar_path(archive_path))
+
+def read_sidecar(archive_path):
+    """Return the sidecar ComicInfo.xml content of a CBR, or None (always None for other archives)."""
+    if not archive_path.endswith(SIDECAR_EXTENSIONS):
+        return None
+    try:
+        with open(sidecar_path(archive_path), 'rb') as f:
+            return f.read().decode('utf-8')
+    except FileNotFoundError:
+        return None
+
+def write_sidecar(archive_path, comic_info_xml):
+    """Atomically write the sidecar ComicInfo.xml of an archive."""
+    data = comic_info_xml.encode('utf-8') if isinstance(comic_info_xml, str) else comic_info_xml
+    replace_file_atomically(sidecar_path(archive_path), lambda f: f.write(data))
+    return {'sidecarPath': sidecar_path(archive_path)}
+
+def convert_cbr_to_cbz(file_path, comic_info_xml=None):
+    """Repack a CBR as a CBZ next to it, streaming each member through rarfile.
+
+    Images are stored without recompression. ``comic_info_xml`` (or else the sidecar, or else
+    the ComicInfo.xml of the CBR) becomes the single ComicInfo.xml of the CBZ. The CBZ is fsynced
+    and renamed into place before the CBR and its sidecar are removed.
+    """
+    new_path = os.path.splitext(file_path)[0] + '.cbz'
+    if os.path.exists(new_path):
+        raise FileExistsError(f"Le fichier '{os.path.basename(new_path)}' existe déjà")
+    if comic_info_xml is None:
+        comic_info_xml = read_sidecar(file_path)
+
+    with rarfile.RarFile(file_path) as rar_file:
+        members = [info for info in rar_file.infolist() if not info.is_dir()]
+        if comic_info_xml is None:
+            comic_infos = [info for info in members if _is_comic_info(info.filename)]
+            if comic_infos:
+                comic_info_xml = rar_file.read(comic_infos[-1])
+
+        def write_archive(tmp_file):
+            with zipfile.ZipFile(tmp_file, 'w') as dst:
+                for info in members:
+                    if _is_comic_info(info.filename):
+                        continue
+                    zinfo = zipfile.ZipInfo(info.filename.replace('\\', '/'), date_time=info.date_time or (1980, 1, 1, 0, 0, 0))
+                    zinfo.file_size = info.file_size
+                    stored = info.filename.lower().endswith(_STORED_EXTENSIONS)
+                    zinfo.compress_type = zipfile.ZIP_STORED if stored else zipfile.ZIP_DEFLATED
+                    with rar_file.open(info) as src, dst.open(zinfo, 'w', force_zip64=info.file_size > zipfile.ZIP64_LIMIT) as out:
+                        shutil.copyfileobj(src, out, 1024 * 1024)
+                if comic_info_xml is not None:
+                    comic_info = zipfile.ZipInfo(COMIC_INFO_NAME, date_time=time.localtime()[:6])
+                    comic_info.compress_type = zipfile.ZIP_DEFLATED
+                    dst.writestr(comic_info, comic_info_xml)
+
+        replace_file_atomically(new_path, write_archive)
+
+    os.remove(file_path)
+    if os.path.exists(sidecar_path(file_path)):
+        os.remove(sidecar_path(file_path))
+    return {'newPath': new_path}
+
+def write_archive_metadata(file_path, comic_info_xml, cbr_mode):
+    """Write ComicInfo.xml for a CBZ/CBR archive and return a summary of what was done.
+
+    CBR archives are handled according to ``cbr_mode`` ('sidecar' or 'convert').
+    """
+    if file_path.endswith('.cbz'):
+        return rewrite_cbz(file_path, comic_info_xml)
+    elif file_path.endswith('.cbr'):
+        if cbr_mode == 'convert':
+            return convert_cbr_to_cbz(file_path, comic_info_xml)
+        elif cbr_mode == 'sidecar':
+            if not os.path.isfile(file_path):
+                raise FileNotFoundError(f"Le fichier '{file_path}' n'existe pas")
+            return write_sidecar(file_path, comic_info_xml)
+        raise ValueError(f"Mode CBR inconnu : {cbr_mode} (attendu : {', '.join(CBR_METADATA_MODES)})")
+    raise ValueError('Seuls les fichiers .cbz et .cbr sont supportés')
+
+def write_entry_metadata(entry):
+    """Process pool task of /update-cbz/batch: ``entry`` is ``{'filePath', 'comicInfoXML', 'cbrMode'}``."""
+    return write_archive_metadata(entry['filePath'], entry['comicInfoXML'], entry['cbrMode'])
+
+def convert_entry(entry):
+    """Process pool task of /convert-cbr: ``entry`` is ``{'filePath'}``."""
+    return convert_cbr_to_cbz(entry['filePath'])
+
+# --- CBZ Archive Writes --- END ---
+
+# --- Integrity Checks --- START ---
+
+class ThrottledReader(io.RawIOBase):
+    """Read-only file whose reads are paced to ``byte_rate`` bytes per second (0: unlimited)."""
+
+    def __init__(self, path, byte_rate=0):
+        super().__init__()
+        self._file = open(path, 'rb', buffering=0)
+        self._byte_rate = byte_rate
+        self._opened = time.monotonic()
+        self.bytes_read = 0
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def readinto(self, buffer):
+        count = self._file.readinto(buffer)
+        if count:
+            self.bytes_read += count
+            if self._byte_rate > 0:
+                delay = self.bytes_read / self._byte_rate - (time.monotonic() - self._opened)
+                if delay > 0:
+                    time.sleep(delay)
+        return count
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        return self._file.seek(offset, whence)
+
+    def tell(self):
+        return self._file.tell()
+
+    def close(self):
+        self._file.close()
+        super().close()
+
+def check_archive_integrity(file_path, byte_rate=0, verify=True):
+    """Process pool task: fingerprint an archive and, with ``verify``, CRC-check all its members.
+
+    The fingerprint hashes the sorted (CRC, size) pairs of the members listed in the central
+    directory (ComicInfo.xml excluded), so it needs no decompression. Returns ``{'status': 'ok' |
+    'corrupt' | 'unreadable' | 'unchecked', 'error', 'fingerprint', 'members'}``.
+    """
+    result = {'status': 'ok', 'error': None, 'fingerprint': None, 'members': [], 'bytes': 0}
+    reader = None
+    try:
+        reader = ThrottledReader(file_path, byte_rate)
+        with io.BufferedReader(reader, 256 * 1024) as f:
+            archive = rarfile.RarFile(f) if file_path.endswith('.cbr') else zipfile.ZipFile(f)
+            with archive:
+                members = sorted([info.CRC, info.file_size] for info in archive.infolist()
+                                 if not info.is_dir() and not _is_comic_info(info.filename))
+                result['members'] = members
+                if members:
+                    result['fingerprint'] = hashlib.sha1(json.dumps(members).encode()).hexdigest()
+                if verify and isinstance(archive, zipfile.ZipFile):
+                    bad_member = archive.testzip()
+                    if bad_member is not None:
+                        result.update(status='corrupt', error=f'CRC incorrect : {bad_member}')
+                elif verify:
+                    archive.testrar()
+    except rarfile.RarCannotExec as e:
+        result.update(status='unchecked', error=f'Outil unrar introuvable : {e}')
+    except (PermissionError, FileNotFoundError) as e:
+        result.update(status='unreadable', error=str(e))
+    except Exception as e:
+        # Truncated or damaged archives: BadZipFile, BadRarFile, EOFError, zlib.error...
+        result.update(status='corrupt', error=f'{type(e).__name__}: {e}')
+    if reader is not None:
+        result['bytes'] = reader.bytes_read
+    return result
+
+# --- Integrity Checks --- END ---
@@ -0,0 +1,451 @@
+"""Production entry point for the backend (ASGI).
+
+    uvicorn asgi:app --host 0.0.0.0 --port 3001    (or: python asgi.py)
+
+/proxy/* and /manga-news/* are served natively with an async HTTP client, so hundreds of
+upstream requests can be in flight without holding a thread each. They share the caches,
+rate limiters and scraping logic of backend.py. Every other route is the Flask app, run on
+a thread pool of WSGI_THREADS workers with its response streamed back.
+"""
+import asyncio
+import concurrent.futures
+import io
+import json
+import os
+import sys
+import threading
+import time
+import urllib.parse
+
+import httpx
+
+import backend
+
+WSGI_THREADS = int(os.getenv('WSGI_THREADS', '32'))
+# Upper bound of simultaneous upstream connections of the async client
+ASYNC_MAX_CONNECTIONS = int(os.getenv('ASYNC_MAX_CONNECTIONS', '200'))
+
+# --- Async helpers --- START ---
+
+class AsyncSingleFlight:
+    """Coalesce concurrent coroutines sharing a key into one task whose result everyone gets."""
+
+    def __init__(self):
+        self._tasks = {}
+
+    async def do(self, key, func):
+        task = self._tasks.get(key)
+        if task is None:
+            task = asyncio.ensure_future(func())
+            self._tasks[key] = task
+            task.add_done_callback(lambda _: self._tasks.pop(key, None))
+        # A cancelled waiter must not cancel the shared task
+        return await asyncio.shield(task)
+
+class UpstreamError(Exception):
+    """Non-2xx upstream response, forwarded as-is to the frontend."""
+
+    def __init__(self, response):
+        super().__init__(f'HTTP {response.status_code}')
+        self.response = response
+
+_client = None
+_proxy_inflight = AsyncSingleFlight()
+_manga_news_inflight = AsyncSingleFlight()
+
+def get_client():
+    """Shared pooled AsyncClient (created on startup, or lazily if the server has no lifespan)."""
+    global _client
+    if _client is None:
+        _client = httpx.AsyncClient(
+            follow_redirects=True,
+            limits=httpx.Limits(max_connections=ASYNC_MAX_CONNECTIONS, max_keepalive_connections=backend.PROXY_POOL_SIZE),
+        )
+    return _client
+
+async def upstream_get(upstream, url, **kwargs):
+    """GET through the shared client, timed under the ``upstream`` label of the backend metrics."""
+    with backend.timed_upstream(upstream) as timer:
+        response = await get_client().get(url, **kwargs)
+        timer.status = response.status_code
+    return response
+
+# --- Async helpers --- END ---
+
+# --- Async proxies --- START ---
+
+async def fetch_upstream(upstream, subpath, params, headers, stale):
+    """Async twin of UpstreamProxy._fetch: rate-limited conditional GET returning ``(entry, cacheable)``."""
+    request_headers = {**headers, **backend.conditional_headers(stale)}
+    for attempt in range(2):
+        wait = upstream.limiter.reserve()
+        if wait:
+            await asyncio.sleep(wait)
+        response = await upstream_get(upstream.name, upstream.url(subpath), params=params, headers=request_headers,
+                                      timeout=upstream.timeout)
+        if response.status_code != 429 or attempt:
+            break
+        delay = backend.retry_after_seconds(response.headers.get('Retry-After'))
+        if delay > backend.MAX_RETRY_AFTER:
+            break
+        await asyncio.sleep(delay)
+
+    if response.status_code >= 400 or (response.status_code == 304 and stale is None):
+        raise UpstreamError(response)
+    return backend.build_cache_entry(response.status_code, response.headers, response.content, stale)
+
+async def proxy_get(upstream, subpath, params, headers):
+    """Async twin of UpstreamProxy.get: returns ``(entry, cache_status)``."""
+    if 'Authorization' in headers:
+        return (await fetch_upstream(upstream, subpath, params, headers, None))[0], 'BYPASS'
+
+    key = upstream.cache_key(subpath, params)
+    entry = upstream.cache.get(key)
+    if entry is not None and entry['expires'] > time.time():
+        return entry, 'HIT'
+
+    async def refresh():
+        try:
+            fresh, cacheable = await fetch_upstream(upstream, subpath, params, {}, entry)
+        except httpx.TransportError:
+            if entry is None:
+                raise
+            return entry, 'STALE'
+        if cacheable:
+            upstream.cache.put(key, fresh)
+        if fresh is entry:
+            return fresh, 'REVALIDATED'
+        backend.remember_api_titles(upstream.name, subpath, fresh)
+        return fresh, 'MISS'
+
+    return await _proxy_inflight.do(key, refresh)
+
+PROXY_ROUTES = {
+    '/proxy/mangadex/': (backend.mangadex_upstream, 'MangaDex', True),
+    '/proxy/jikan/': (backend.jikan_upstream, 'Jikan API', False),
+}
+
+async def handle_proxy(scope, route_prefix):
+    upstream, label, forward_authorization = PROXY_ROUTES[route_prefix]
+    subpath = scope['path'][len(route_prefix):]
+    query = urllib.parse.parse_qsl(scope['query_string'].decode('latin-1'), keep_blank_values=True)
+    params = {}
+    for name, value in query:
+        params.setdefault(name, []).append(value)
+    headers = {}
+    authorization = request_header(scope, b'authorization')
+    if forward_authorization and authorization is not None:
+        headers['Authorization'] = authorization
+
+    try:
+        entry, cache_status = await proxy_get(upstream, subpath, params, headers)
+        backend.cache_requests.inc(f'proxy-{upstream.name}', cache_status.lower())
+        return entry['status'], entry['body'], {'Content-Type': entry['content_type'], 'X-Cache': cache_status}
+    except UpstreamError as e:
+        content_type = e.response.headers.get('Content-Type', 'application/json')
+        return e.response.status_code, e.response.content, {'Content-Type': content_type}
+    except httpx.HTTPError as e:
+        return json_response(500, {'error': f'Error proxying to {label}: {e}'})
+    except Exception as e:
+        return json_response(500, {'error': f'An unexpected error occurred: {str(e)}'})
+
+# --- Async proxies --- END ---
+
+# --- Async Manga-News --- START ---
+
+async def probe_manga_news_url(path_type, slug):
+    response = await upstream_get('manga-news', backend.manga_news_url(path_type, slug),
+                                  headers=backend.MANGA_NEWS_HEADERS, timeout=10)
+    return response.status_code == 200
+
+async def search_manga_news_slug(title):
+    """Async twin of backend.search_manga_news_slug(raise_errors=True)."""
+    request_error = None
+    match_info = None
+    try:
+        response = await upstream_get('duckduckgo', backend.duckduckgo_search_url(title),
+                                      headers=backend.DUCKDUCKGO_HEADERS, timeout=15)
+        response.raise_for_status()
+        # BeautifulSoup parsing is CPU work: keep it off the event loop
+        match_info = await asyncio.to_thread(backend.match_duckduckgo_results, title, response.text)
+    except httpx.HTTPError as e:
+        request_error = e
+    except Exception:
+        backend.ddg_log.exception('Error during DuckDuckGo parsing', title=title)
+    if match_info:
+        return match_info
+
+    direct_slug = backend.direct_manga_news_slug(title)
+    results = await asyncio.gather(
+        *(probe_manga_news_url(path_type, direct_slug) for path_type in backend.MANGA_NEWS_PATH_TYPES),
+        return_exceptions=True)
+    for path_type, result in zip(backend.MANGA_NEWS_PATH_TYPES, results):
+        if result is True:
+            return {'path_type': path_type, 'slug': direct_slug}
+        if isinstance(result, httpx.HTTPError):
+            request_error = result
+    if request_error is not None:
+        raise request_error
+    return None
+
+async def scrape_synopsis(slug, path_type):
+    """Async twin of backend.scrape_synopsis(raise_errors=True)."""
+    response = await upstream_get('manga-news', backend.manga_news_url(path_type, slug),
+                                  headers=backend.MANGA_NEWS_HEADERS, timeout=10)
+    if response.status_code == 404:
+        return None
+    response.raise_for_status()
+    try:
+        return await asyncio.to_thread(backend.parse_synopsis, response.text)
+    except Exception:
+        backend.manga_news_log.exception('Error during synopsis parsing', slug=slug, path=path_type)
+        return None
+
+async def get_manga_news_synopsis(title):
+    """Async twin of backend.get_manga_news_synopsis, sharing its persistent cache."""
+    async def lookup():
+        found, match_info = backend.cached_manga_news_slug(title)
+        if not found:
+            try:
+                match_info = await search_manga_news_slug(title)
+            except httpx.HTTPError:
+                return None, None
+            backend.remember_manga_news_slug(title, match_info)
+        if not match_info:
+            return None, None
+
+        slug, path_type = match_info['slug'], match_info['path_type']
+        found, synopsis = backend.manga_news_cache.get('synopsis', f'{path_type}/{slug}')
+        if not found:
+            try:
+                synopsis = await scrape_synopsis(slug, path_type)
+            except httpx.HTTPError:
+                return match_info, None
+            backend.remember_synopsis(slug, path_type, synopsis)
+        return match_info, synopsis
+
+    return await _manga_news_inflight.do(backend.manga_news_title_key(title), lookup)
+
+async def handle_manga_news(scope, title):
+    try:
+        match_info, synopsis = await get_manga_news_synopsis(urllib.parse.unquote(title))
+        if not match_info:
+            return json_response(404, {'error': 'Manga not found on Manga-News'})
+        if not synopsis:
+            return json_response(404, {'error': 'Synopsis not found on Manga-News page (or page inaccessible)'})
+        return json_response(200, {'summary': synopsis})
+    except Exception as e:
+        backend.manga_news_log.exception('API error in /manga-news', title=title)
+        return json_response(500, {'error': 'Server error processing Manga-News request', 'details': str(e)})
+
+# --- Async Manga-News --- END ---
+
+# --- WSGI bridge --- START ---
+
+def build_environ(scope, body):
+    """WSGI environ for an ASGI HTTP scope."""
+    server = scope.get('server') or ('localhost', 80)
+    environ = {
+        'REQUEST_METHOD': scope['method'],
+        'SCRIPT_NAME': scope.get('root_path', '').encode('utf-8').decode('latin-1'),
+        'PATH_INFO': scope['path'].encode('utf-8').decode('latin-1'),
+        'QUERY_STRING': scope['query_string'].decode('latin-1'),
+        'SERVER_NAME': server[0],
+        'SERVER_PORT': str(server[1]),
+        'SERVER_PROTOCOL': f"HTTP/{scope.get('http_version', '1.1')}",
+        'REMOTE_ADDR': scope['client'][0] if scope.get('client') else '',
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': scope.get('scheme', 'http'),
+        'wsgi.input': io.BytesIO(body),
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': False,
+        'wsgi.run_once': False,
+    }
+    for raw_name, raw_value in scope['headers']:
+        name, value = raw_name.decode('latin-1').upper().replace('-', '_'), raw_value.decode('latin-1')
+        if name in ('CONTENT_TYPE', 'CONTENT_LENGTH'):
+            environ[name] = value
+            continue
+        key = f'HTTP_{name}'
+        environ[key] = f'{environ[key]},{value}' if key in environ else value
+    return environ
+
+class WsgiBridge:
+    """Run a WSGI app on a thread pool and stream its response back through ASGI.
+
+    Unlike asgiref's WsgiToAsgi, requests don't share one thread, so long streaming responses
+    (NDJSON, server-sent events) don't block the other routes.
+    """
+
+    def __init__(self, wsgi_app, max_workers):
+        self.wsgi_app = wsgi_app
+        self.executor = concurrent.futures.ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='wsgi')
+
+    async def __call__(self, scope, receive, send):
+        body = await read_body(receive)
+        loop = asyncio.get_running_loop()
+        queue = asyncio.Queue(maxsize=16)
+        disconnected = threading.Event()
+
+        def put(message):
+            # Blocks the worker thread while the client is slower than the app (backpressure)
+            while not disconnected.is_set():
+                future = asyncio.run_coroutine_threadsafe(queue.put(message), loop)
+                try:
+                    future.result(timeout=1)
+                    return
+                except concurrent.futures.TimeoutError:
+                    future.cancel()
+
+        async def watch_disconnect():
+            while (await receive())['type'] != 'http.disconnect':
+                pass
+            disconnected.set()
+
+        worker = loop.run_in_executor(self.executor, self._run, build_environ(scope, body), put, disconnected)
+        watcher = asyncio.ensure_future(watch_disconnect())
+        try:
+            while True:
+                # Once the client is gone the worker stops queueing, its final None included
+                getter = asyncio.ensure_future(queue.get())
+                await asyncio.wait({getter, watcher}, return_when=asyncio.FIRST_COMPLETED)
+                if not getter.done():
+                    getter.cancel()
+                    break
+                message = getter.result()
+                if message is None:
+                    break
+                await send(message)
+        finally:
+            disconnected.set()
+            watcher.cancel()
+        await worker
+
+    def _run(self, environ, put, disconnected):
+        response = {}
+
+        def start_response(status, headers, exc_info=None):
+            response['start'] = {
+                'type': 'http.response.start',
+                'status': int(status.split(' ', 1)[0]),
+                'headers': [(name.lower().encode('latin-1'), value.encode('latin-1')) for name, value in headers],
+            }
+            return lambda data: put({'type': 'http.response.body', 'body': data, 'more_body': True})
+
+        started = False
+        try:
+            result = self.wsgi_app(environ, start_response)
+            try:
+                for chunk in result:
+                    if disconnected.is_set():
+                        break
+                    if not started:
+                        put(response['start'])
+                        started = True
+                    if chunk:
+                        put({'type': 'http.response.body', 'body': chunk, 'more_body': True})
+            finally:
+                if hasattr(result, 'close'):
+                    result.close()
+            if not started:
+                put(response['start'])
+            put({'type': 'http.response.body', 'body': b'', 'more_body': False})
+        finally:
+            put(None)
+
+# --- WSGI bridge --- END ---
+
+async def read_body(receive):
+    chunks = []
+    while True:
+        message = await receive()
+        if message['type'] == 'http.disconnect':
+            break
+        chunks.append(message.get('body', b''))
+        if not message.get('more_body'):
+            break
+    return b''.join(chunks)
+
+def request_header(scope, name):
+    for raw_name, raw_value in scope['headers']:
+        if raw_name.lower() == name:
+            return raw_value.decode('latin-1')
+    return None
+
+def json_response(status, payload):
+    return status, json.dumps(payload).encode('utf-8'), {'Content-Type': 'application/json'}
+
+def cors_headers(scope):
+    """Same policy as Flask-CORS in backend.py, for the natively served routes."""
+    origin = request_header(scope, b'origin')
+    if origin != backend.FRONTEND_ORIGIN:
+        return {}
+    headers = {'Access-Control-Allow-Origin': origin, 'Vary': 'Origin'}
+    if scope['method'] == 'OPTIONS':
+        headers['Access-Control-Allow-Methods'] = 'GET, OPTIONS'
+        requested = request_header(scope, b'access-control-request-headers')
+        if requested:
+            headers['Access-Control-Allow-Headers'] = requested
+    return headers
+
+async def send_response(send, status, body, headers):
+    raw_headers = [(name.lower().encode('latin-1'), value.encode('latin-1')) for name, value in headers.items()]
+    raw_headers.append((b'content-length', str(len(body)).encode('latin-1')))
+    await send({'type': 'http.response.start', 'status': status, 'headers': raw_headers})
+    await send({'type': 'http.response.body', 'body': body})
+
+def native_route(path):
+    """Return ``(handler, argument, route)`` for the routes served natively, or None.
+
+    ``route`` is the matching Flask rule, so both servers report the same metrics labels.
+    """
+    for prefix in PROXY_ROUTES:
+        if path.startswith(prefix) and len(path) > len(prefix):
+            return handle_proxy, prefix, f'{prefix}<path:subpath>'
+    if path.startswith('/manga-news/'):
+        title = path[len('/manga-news/'):]
+        if title and '/' not in title:
+            return handle_manga_news, title, '/manga-news/<title>'
+    return None
+
+async def lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message['type'] == 'lifespan.startup':
+            get_client()
+            backend.recover_rename_journals()
+            backend.job_queue.resume()
+            backend.start_library_watcher()
+            await send({'type': 'lifespan.startup.complete'})
+        elif message['type'] == 'lifespan.shutdown':
+            if _client is not None:
+                await _client.aclose()
+            wsgi_app.executor.shutdown(wait=False)
+            await send({'type': 'lifespan.shutdown.complete'})
+            return
+
+wsgi_app = WsgiBridge(backend.app, WSGI_THREADS)
+
+async def app(scope, receive, send):
+    if scope['type'] == 'lifespan':
+        return await lifespan(receive, send)
+    if scope['type'] != 'http':
+        return
+
+    route = native_route(scope['path'])
+    if route is None or scope['method'] not in ('GET', 'OPTIONS'):
+        return await wsgi_app(scope, receive, send)
+
+    handler, argument, rule = route
+    started = time.perf_counter()
+    if scope['method'] == 'OPTIONS':
+        status, body, headers = 200, b'', {'Content-Type': 'text/html; charset=utf-8'}
+    else:
+        status, body, headers = await handler(scope, argument)
+    backend.http_request_seconds.observe(time.perf_counter() - started, scope['method'], rule, str(status))
+    await send_response(send, status, body, {**headers, **cors_headers(scope)})
+
+if __name__ == '__main__':
+    import uvicorn
+    uvicorn.run('asgi:app', host=os.getenv('HOST', '0.0.0.0'), port=int(os.getenv('PORT', '3001')))
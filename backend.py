@@ -1,248 +1,3328 @@
-from flask import Flask, jsonify, request, Response # Import Response
+from flask import Flask, g, jsonify, request, Response, send_file # Import Response
 from flask_cors import CORS # Import CORS
 import os
+import sys
 import zipfile
+import struct
+import tempfile
+import bisect
+import cProfile
+import ctypes
+import ctypes.util
+import hashlib
+import io
+import mmap
+import multiprocessing
 import rarfile
 import requests # Import requests library
 import re
+import select
+import string
+import json
+import logging
 import urllib.parse
 from bs4 import BeautifulSoup # Import BeautifulSoup
 from unidecode import unidecode # Import unidecode
 import Levenshtein # Import Levenshtein
 import asyncio # Import asyncio for running async functions if needed elsewhere, but remove from scraping logic
+import sqlite3
+import threading
+import time
+import xml.etree.ElementTree as ET
+from collections import OrderedDict, deque
+import uuid
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+from email.utils import parsedate_to_datetime
+from requests.adapters import HTTPAdapter
+from PIL import Image
+from archive_workers import (COMIC_INFO_NAME, SIDECAR_EXTENSIONS, SIDECAR_SUFFIX, check_archive_integrity,
+                             convert_cbr_to_cbz, convert_entry, has_sidecar, read_sidecar, rewrite_cbz, sidecar_path,
+                             write_archive_metadata, write_entry_metadata, zip_data_offset)
 
 app = Flask(__name__)
 # Ensure CORS allows headers like Authorization
-CORS(app, resources={r"/*": {"origins": "http://localhost:5173", "allow_headers": "*"}})
+FRONTEND_ORIGIN = 'http://localhost:5173'
+CORS(app, resources={r"/*": {"origins": FRONTEND_ORIGIN, "allow_headers": "*"}})
 
 FILES_PATH = os.getenv('FILES_PATH', './files')
+CACHE_DIR = os.getenv('CACHE_DIR', './cache')
+# Minimum delay (seconds) between two incremental rescans triggered by GET /files
+LIBRARY_RESCAN_INTERVAL = float(os.getenv('LIBRARY_RESCAN_INTERVAL', '30'))
+ARCHIVE_EXTENSIONS = ('.cbz', '.cbr')
+# Library watcher: 'inotify' (falls back to polling when unavailable), 'poll' or 'off'; quiet period
+# and maximum delay (seconds) before applying watched changes, polling interval, and how long
+# changes are gathered into one /files/events batch
+LIBRARY_WATCH = os.getenv('LIBRARY_WATCH', 'inotify')
+LIBRARY_WATCH_DEBOUNCE = float(os.getenv('LIBRARY_WATCH_DEBOUNCE', '1'))
+LIBRARY_WATCH_MAX_DELAY = float(os.getenv('LIBRARY_WATCH_MAX_DELAY', '10'))
+LIBRARY_POLL_INTERVAL = float(os.getenv('LIBRARY_POLL_INTERVAL', '30'))
+LIBRARY_EVENTS_DEBOUNCE = float(os.getenv('LIBRARY_EVENTS_DEBOUNCE', '0.2'))
+# How ComicInfo.xml is written for CBR archives: 'sidecar' (<name>.ComicInfo.xml next to the
+# archive) or 'convert' (repack the CBR as a CBZ)
+CBR_METADATA_MODE = os.getenv('CBR_METADATA_MODE', 'sidecar')
+# Parsed ComicInfo metadata kept in memory (number of archives), optionally persisted in CACHE_DIR
+METADATA_CACHE_SIZE = int(os.getenv('METADATA_CACHE_SIZE', '4096'))
+METADATA_CACHE_PERSIST = os.getenv('METADATA_CACHE_PERSIST', '1') == '1'
+# Threads used by /extract-metadata/batch (archive reads are mostly I/O bound)
+METADATA_READ_WORKERS = int(os.getenv('METADATA_READ_WORKERS', '8'))
+# MangaDex / Jikan proxies: default cache lifetime (seconds) when upstream sends no Cache-Control,
+# in-memory entries, optional SQLite tier, connection pool size and request rates (requests/second)
+PROXY_CACHE_TTL = float(os.getenv('PROXY_CACHE_TTL', '600'))
+PROXY_CACHE_SIZE = int(os.getenv('PROXY_CACHE_SIZE', '1024'))
+PROXY_CACHE_PERSIST = os.getenv('PROXY_CACHE_PERSIST', '1') == '1'
+PROXY_POOL_SIZE = int(os.getenv('PROXY_POOL_SIZE', '16'))
+PROXY_TIMEOUT = float(os.getenv('PROXY_TIMEOUT', '10'))
+MANGADEX_RATE_LIMIT = float(os.getenv('MANGADEX_RATE_LIMIT', '5'))
+JIKAN_RATE_LIMIT = float(os.getenv('JIKAN_RATE_LIMIT', '3'))
+# Manga-News lookups: lifetimes (seconds) of resolved slugs, scraped synopses and "not found" results
+MANGA_NEWS_SLUG_TTL = float(os.getenv('MANGA_NEWS_SLUG_TTL', str(30 * 24 * 3600)))
+MANGA_NEWS_SYNOPSIS_TTL = float(os.getenv('MANGA_NEWS_SYNOPSIS_TTL', str(7 * 24 * 3600)))
+MANGA_NEWS_NEGATIVE_TTL = float(os.getenv('MANGA_NEWS_NEGATIVE_TTL', str(24 * 3600)))
+# Cover thumbnails: bounding box (pixels), JPEG quality, disk cache budget (bytes) in CACHE_DIR,
+# and background generation (worker threads) for the archives found by library scans
+THUMBNAIL_WIDTH = int(os.getenv('THUMBNAIL_WIDTH', '240'))
+THUMBNAIL_HEIGHT = int(os.getenv('THUMBNAIL_HEIGHT', '360'))
+THUMBNAIL_QUALITY = int(os.getenv('THUMBNAIL_QUALITY', '80'))
+THUMBNAIL_CACHE_BYTES = int(os.getenv('THUMBNAIL_CACHE_BYTES', str(256 * 1024 * 1024)))
+THUMBNAIL_WORKERS = int(os.getenv('THUMBNAIL_WORKERS', '2'))
+THUMBNAIL_PREFETCH = os.getenv('THUMBNAIL_PREFETCH', '1') == '1'
+# Page reader: number of archives kept open (parsed central directory + mmap) between page requests
+ARCHIVE_HANDLE_CACHE_SIZE = int(os.getenv('ARCHIVE_HANDLE_CACHE_SIZE', '16'))
+# Fuzzy title index: minimum score (0-1) for a known title to resolve a Manga-News lookup without searching
+TITLE_AUTO_MATCH_SCORE = float(os.getenv('TITLE_AUTO_MATCH_SCORE', '0.97'))
+# Job queue: concurrent steps per job type ('type=count,...'; unlisted types run one step at a time)
+JOB_WORKERS = os.getenv('JOB_WORKERS', 'update-metadata=2,extract-metadata=4,synopsis=2,convert-cbr=1')
+# Logs: level ('debug', 'info', 'warning', 'error' or 'off') and format ('text' or 'json')
+LOG_LEVEL = os.getenv('LOG_LEVEL', 'info')
+LOG_FORMAT = os.getenv('LOG_FORMAT', 'text')
+# Requests sent with an X-Profile header are run under cProfile, their .prof dump written to PROFILE_DIR
+PROFILE_REQUESTS = os.getenv('PROFILE_REQUESTS', '0') == '1'
+PROFILE_DIR = os.getenv('PROFILE_DIR', os.path.join(CACHE_DIR, 'profiles'))
+
+# --- Metrics & Logging --- START ---
+
+_LOG_LEVELS = {'debug': logging.DEBUG, 'info': logging.INFO, 'warning': logging.WARNING, 'error': logging.ERROR}
+
+def _logfmt_value(value):
+    text = value if isinstance(value, str) else json.dumps(value, ensure_ascii=False, default=str)
+    return text if text and not re.search(r'[\s"=]', text) else json.dumps(text, ensure_ascii=False)
+
+class StructuredFormatter(logging.Formatter):
+    """Render a record and its ``fields`` as logfmt text (``key=value``) or as one JSON object per line."""
+
+    def __init__(self, as_json=False):
+        super().__init__()
+        self.as_json = as_json
+
+    def format(self, record):
+        fields = getattr(record, 'fields', {})
+        timestamp = self.formatTime(record, '%Y-%m-%dT%H:%M:%S')
+        if self.as_json:
+            payload = {'time': timestamp, 'level': record.levelname.lower(), 'logger': record.name,
+                       'msg': record.getMessage(), **fields}
+            if record.exc_info:
+                payload['exc'] = self.formatException(record.exc_info)
+            return json.dumps(payload, ensure_ascii=False, default=str)
+        text = f'{timestamp} {record.levelname.lower():<7} [{record.name}] {record.getMessage()}'
+        if fields:
+            text += ' ' + ' '.join(f'{key}={_logfmt_value(value)}' for key, value in fields.items())
+        if record.exc_info:
+            text += '\n' + self.formatException(record.exc_info)
+        return text
+
+class StructuredLogger:
+    """``logging.Logger`` wrapper taking the structured fields as keyword arguments.
+
+    ``log.info('Archive corrompue', path=path)``; the fields are only formatted when the level is enabled.
+    """
+
+    def __init__(self, name):
+        self.logger = logging.getLogger(name)
+
+    def _log(self, level, message, fields, exc_info=False):
+        if self.logger.isEnabledFor(level):
+            self.logger.log(level, message, exc_info=exc_info, extra={'fields': fields})
+
+    def debug(self, message, **fields):
+        self._log(logging.DEBUG, message, fields)
+
+    def info(self, message, **fields):
+        self._log(logging.INFO, message, fields)
+
+    def warning(self, message, **fields):
+        self._log(logging.WARNING, message, fields)
+
+    def error(self, message, **fields):
+        self._log(logging.ERROR, message, fields)
+
+    def exception(self, message, **fields):
+        """Log at error level with the traceback of the exception being handled."""
+        self._log(logging.ERROR, message, fields, exc_info=True)
+
+def configure_logging(level=LOG_LEVEL, log_format=LOG_FORMAT):
+    """Send the ``backend.*`` loggers to stderr; ``level='off'`` silences them."""
+    logger = logging.getLogger('backend')
+    logger.propagate = False
+    for handler in list(logger.handlers):
+        logger.removeHandler(handler)
+    handler = logging.StreamHandler(sys.stderr)
+    handler.setFormatter(StructuredFormatter(as_json=log_format == 'json'))
+    logger.addHandler(handler)
+    logger.setLevel(_LOG_LEVELS.get(level.lower(), logging.CRITICAL + 1))
+
+def get_logger(component):
+    return StructuredLogger(f'backend.{component}')
+
+configure_logging()
+log = get_logger('app')
+
+def _escape_label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def _format_labels(names, values, extra=()):
+    pairs = [*zip(names, values), *extra]
+    return '{' + ','.join(f'{name}="{_escape_label(value)}"' for name, value in pairs) + '}' if pairs else ''
+
+class Counter:
+    """Monotonic counter, one value per combination of label values."""
+
+    kind = 'counter'
+
+    def __init__(self, name, help_text, labels=()):
+        self.name, self.help, self.labels = name, help_text, tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *label_values, amount=1):
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def value(self, *label_values):
+        return self._values.get(label_values, 0)
+
+    def samples(self):
+        with self._lock:
+            values = sorted(self._values.items())
+        for label_values, value in values:
+            yield f'{self.name}{_format_labels(self.labels, label_values)} {value}'
+
+class Histogram:
+    """Cumulative-bucket histogram (Prometheus semantics), one series per combination of label values."""
+
+    kind = 'histogram'
+    DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+    def __init__(self, name, help_text, labels=(), buckets=DEFAULT_BUCKETS):
+        self.name, self.help, self.labels = name, help_text, tuple(labels)
+        self.buckets = tuple(sorted(buckets))
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, *label_values):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = self._series[label_values] = [[0] * len(self.buckets), 0.0, 0]
+            if index < len(self.buckets):
+                series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def count(self, *label_values):
+        series = self._series.get(label_values)
+        return series[2] if series else 0
+
+    def samples(self):
+        with self._lock:
+            series = sorted((labels, (list(counts), total, count)) for labels, (counts, total, count) in self._series.items())
+        for label_values, (counts, total, count) in series:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                yield f'{self.name}_bucket{_format_labels(self.labels, label_values, [("le", repr(float(bound)))])} {cumulative}'
+            yield f'{self.name}_bucket{_format_labels(self.labels, label_values, [("le", "+Inf")])} {count}'
+            yield f'{self.name}_sum{_format_labels(self.labels, label_values)} {total}'
+            yield f'{self.name}_count{_format_labels(self.labels, label_values)} {count}'
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics = []
+
+    def counter(self, name, help_text, labels=()):
+        metric = Counter(name, help_text, labels)
+        self._metrics.append(metric)
+        return metric
+
+    def histogram(self, name, help_text, labels=(), buckets=Histogram.DEFAULT_BUCKETS):
+        metric = Histogram(name, help_text, labels, buckets)
+        self._metrics.append(metric)
+        return metric
+
+    def render(self):
+        """Prometheus text exposition format (version 0.0.4)."""
+        lines = []
+        for metric in self._metrics:
+            lines.append(f'# HELP {metric.name} {metric.help}')
+            lines.append(f'# TYPE {metric.name} {metric.kind}')
+            lines.extend(metric.samples())
+        return '\n'.join(lines) + '\n'
+
+metrics = MetricsRegistry()
+http_request_seconds = metrics.histogram(
+    'mangatagger_http_request_duration_seconds', 'Time to build the response (headers) of a request.',
+    ('method', 'route', 'status'))
+upstream_request_seconds = metrics.histogram(
+    'mangatagger_upstream_request_duration_seconds', 'Duration of the requests sent to external sites.',
+    ('upstream', 'outcome'))
+cache_requests = metrics.counter(
+    'mangatagger_cache_requests_total', 'Cache lookups by cache and result.', ('cache', 'result'))
+archive_io_bytes = metrics.counter(
+    'mangatagger_archive_io_bytes_total', 'Archive bytes read or written, by operation.', ('operation',))
+
+class timed_upstream:
+    """Context manager observing the duration of one upstream request in ``upstream_request_seconds``.
+
+    Set ``.status`` to the HTTP status; an exception is recorded as outcome ``error``.
+    """
+
+    def __init__(self, upstream):
+        self.upstream = upstream
+        self.status = None
+
+    def __enter__(self):
+        self._started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        outcome = 'error' if exc_type is not None or self.status is None else str(self.status)
+        upstream_request_seconds.observe(time.perf_counter() - self._started, self.upstream, outcome)
+
+class InstrumentedSession(requests.Session):
+    """requests.Session recording the duration of every request under the ``upstream`` label."""
+
+    def __init__(self, upstream):
+        super().__init__()
+        self.upstream = upstream
+
+    def request(self, method, url, *args, **kwargs):
+        with timed_upstream(self.upstream) as timer:
+            response = super().request(method, url, *args, **kwargs)
+            timer.status = response.status_code
+        return response
+
+_profile_lock = threading.Lock()
+
+def _profile_file_name(route):
+    slug = re.sub(r'[^A-Za-z0-9]+', '-', route).strip('-') or 'root'
+    return f'{time.strftime("%Y%m%d-%H%M%S")}-{uuid.uuid4().hex[:6]}-{slug}.prof'
+
+@app.before_request
+def start_request_timer():
+    g.request_started = time.perf_counter()
+    # cProfile can only profile one request at a time: concurrent X-Profile requests are not profiled
+    if PROFILE_REQUESTS and request.headers.get('X-Profile') and _profile_lock.acquire(blocking=False):
+        g.profiler = cProfile.Profile()
+        g.profiler.enable()
+
+@app.after_request
+def record_request_metrics(response):
+    route = request.url_rule.rule if request.url_rule is not None else 'unmatched'
+    profiler = g.pop('profiler', None)
+    if profiler is not None:
+        profiler.disable()
+        _profile_lock.release()
+        os.makedirs(PROFILE_DIR, exist_ok=True)
+        file_name = _profile_file_name(route)
+        profiler.dump_stats(os.path.join(PROFILE_DIR, file_name))
+        response.headers['X-Profile-File'] = file_name
+        log.info('Profil enregistré', route=route, file=file_name)
+    started = g.pop('request_started', None)
+    if started is not None:
+        http_request_seconds.observe(time.perf_counter() - started, request.method, route, str(response.status_code))
+    return response
+
+# --- Metrics & Logging --- END ---
+
+# --- Upstream HTTP Helpers --- START ---
+
+# Stale proxy cache entries are kept this long (seconds) so they can still be revalidated
+PROXY_CACHE_KEEP = 7 * 24 * 3600
+# Longest Retry-After (seconds) honoured before giving up on a 429
+MAX_RETRY_AFTER = 10
+
+proxy_log = get_logger('proxy')
+
+def pooled_session(upstream, pool_size=PROXY_POOL_SIZE):
+    """Return a requests.Session keeping up to ``pool_size`` connections alive per host.
+
+    Its request durations are recorded under the ``upstream`` metrics label.
+    """
+    session = InstrumentedSession(upstream)
+    adapter = HTTPAdapter(pool_connections=4, pool_maxsize=pool_size)
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    return session
+
+class TokenBucket:
+    """Thread-safe token bucket. ``acquire()`` reserves a token and sleeps until it is due,
+    so bursts are queued in arrival order instead of being rejected."""
+
+    def __init__(self, rate, capacity=None):
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(rate, 1)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self, tokens=1):
+        """Take ``tokens`` and return how long (seconds) the caller must wait before using them."""
+        if self.rate <= 0:
+            return 0.0
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            self._tokens -= tokens
+            return -self._tokens / self.rate if self._tokens < 0 else 0.0
+
+    def acquire(self, tokens=1):
+        wait = self.reserve(tokens)
+        if wait:
+            time.sleep(wait)
+        return wait
+
+class SingleFlight:
+    """Coalesce concurrent calls sharing a key into one execution whose result everyone gets."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+
+    def do(self, key, func):
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = Future()
+        if not leader:
+            return call.result()
+        try:
+            result = func()
+        except BaseException as e:
+            call.set_exception(e)
+            raise
+        else:
+            call.set_result(result)
+            return result
+        finally:
+            with self._lock:
+                del self._calls[key]
+
+def cache_lifetime(headers, default_ttl):
+    """Seconds a response may be served from cache according to Cache-Control (None: don't store)."""
+    directives = {}
+    for part in headers.get('Cache-Control', '').lower().split(','):
+        name, _, value = part.strip().partition('=')
+        if name:
+            directives[name] = value.strip('"')
+    if 'no-store' in directives:
+        return None
+    if 'no-cache' in directives:
+        return 0.0
+    for name in ('s-maxage', 'max-age'):
+        if name in directives:
+            try:
+                return max(float(directives[name]), 0.0)
+            except ValueError:
+                break
+    return default_ttl
+
+def retry_after_seconds(value):
+    """Parse a Retry-After header (seconds or HTTP date)."""
+    if not value:
+        return 1.0
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+    try:
+        return max(parsedate_to_datetime(value).timestamp() - time.time(), 0.0)
+    except (TypeError, ValueError):
+        return 1.0
+
+def conditional_headers(stale):
+    """If-None-Match / If-Modified-Since headers revalidating a stale cache entry."""
+    headers = {}
+    if stale is not None:
+        if stale['etag']:
+            headers['If-None-Match'] = stale['etag']
+        if stale['last_modified']:
+            headers['If-Modified-Since'] = stale['last_modified']
+    return headers
+
+def build_cache_entry(status_code, headers, content, stale=None):
+    """Turn an upstream response into a cache entry. Returns ``(entry, cacheable)``.
+
+    A 304 refreshes and returns ``stale`` itself.
+    """
+    lifetime = cache_lifetime(headers, PROXY_CACHE_TTL)
+    now = time.time()
+    if status_code == 304 and stale is not None:
+        stale.update(expires=now + (lifetime or 0.0), stored=now)
+        return stale, lifetime is not None
+    entry = {
+        'status': status_code,
+        'content_type': headers.get('Content-Type', 'application/json'),
+        'body': content,
+        'etag': headers.get('ETag'),
+        'last_modified': headers.get('Last-Modified'),
+        'expires': now + (lifetime or 0.0),
+        'stored': now,
+    }
+    return entry, lifetime is not None and status_code == 200
+
+class HttpResponseCache:
+    """Two-tier (memory LRU + optional SQLite) cache of upstream responses with their validators."""
+
+    def __init__(self, max_entries, db_path=None):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._puts = 0
+        self._conn = None
+        if db_path:
+            os.makedirs(os.path.dirname(db_path) or '.', exist_ok=True)
+            self._conn = sqlite3.connect(db_path, check_same_thread=False)
+            self._conn.execute('PRAGMA journal_mode=WAL')
+            self._conn.execute('PRAGMA synchronous=NORMAL')
+            self._conn.execute('''
+                CREATE TABLE IF NOT EXISTS http_cache (
+                    key TEXT PRIMARY KEY,
+                    status INTEGER NOT NULL,
+                    content_type TEXT,
+                    body BLOB NOT NULL,
+                    etag TEXT,
+                    last_modified TEXT,
+                    expires REAL NOT NULL,
+                    stored REAL NOT NULL
+                )
+            ''')
+
+    def get(self, key):
+        """Return the cached entry for ``key`` (possibly expired), or None."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                return entry
+            if self._conn is None:
+                return None
+            row = self._conn.execute(
+                'SELECT status, content_type, body, etag, last_modified, expires, stored FROM http_cache WHERE key = ?',
+                (key,)).fetchone()
+            if row is None:
+                return None
+            entry = dict(zip(('status', 'content_type', 'body', 'etag', 'last_modified', 'expires', 'stored'), row))
+            self._remember(key, entry)
+            return entry
+
+    def put(self, key, entry):
+        with self._lock:
+            self._remember(key, entry)
+            if self._conn is None:
+                return
+            with self._conn:
+                self._conn.execute(
+                    'INSERT OR REPLACE INTO http_cache (key, status, content_type, body, etag, last_modified, expires, stored) '
+                    'VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                    (key, entry['status'], entry['content_type'], entry['body'], entry['etag'],
+                     entry['last_modified'], entry['expires'], entry['stored']))
+                self._puts += 1
+                if self._puts % 100 == 0:
+                    self._conn.execute('DELETE FROM http_cache WHERE expires < ?', (time.time() - PROXY_CACHE_KEEP,))
+
+    def _remember(self, key, entry):
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+proxy_response_cache = HttpResponseCache(
+    PROXY_CACHE_SIZE, os.path.join(CACHE_DIR, 'http.sqlite3') if PROXY_CACHE_PERSIST else None)
+
+class UpstreamProxy:
+    """Pooled, rate-limited and cached GET access to one upstream JSON API.
+
+    Fresh cached responses are served locally; expired ones carrying an ETag or Last-Modified
+    are revalidated with a conditional request. Identical concurrent requests share one call.
+    """
+
+    def __init__(self, name, base_url, rate, cache=proxy_response_cache, timeout=PROXY_TIMEOUT):
+        self.name = name
+        self.base_url = base_url.rstrip('/')
+        self.timeout = timeout
+        self.cache = cache
+        self.session = pooled_session(name)
+        self.limiter = TokenBucket(rate)
+        self._inflight = SingleFlight()
+
+    def cache_key(self, subpath, params):
+        items = sorted((k, v) for k, values in params.items() for v in (values if isinstance(values, list) else [values]))
+        return f'{self.name}:{subpath}?{urllib.parse.urlencode(items)}'
+
+    def get(self, subpath, params, headers=None):
+        """Return ``(entry, cache_status)`` for ``subpath``; raises requests exceptions like ``raise_for_status``."""
+        entry, cache_status = self._lookup(subpath, params, headers)
+        cache_requests.inc(f'proxy-{self.name}', cache_status.lower())
+        return entry, cache_status
+
+    def _lookup(self, subpath, params, headers):
+        # Authenticated calls are user-specific: never share them through the cache
+        if headers and 'Authorization' in headers:
+            return self._fetch(subpath, params, headers, None)[0], 'BYPASS'
+
+        key = self.cache_key(subpath, params)
+        entry = self.cache.get(key)
+        if entry is not None and entry['expires'] > time.time():
+            return entry, 'HIT'
+        return self._inflight.do(key, lambda: self._refresh(key, subpath, params, entry))
+
+    def _refresh(self, key, subpath, params, stale):
+        try:
+            fresh, cacheable = self._fetch(subpath, params, {}, stale)
+        except (requests.exceptions.ConnectionError, requests.exceptions.Timeout):
+            if stale is None:
+                raise
+            return stale, 'STALE'
+        if cacheable:
+            self.cache.put(key, fresh)
+        if fresh is stale:
+            return fresh, 'REVALIDATED'
+        remember_api_titles(self.name, subpath, fresh)
+        return fresh, 'MISS'
+
+    def url(self, subpath):
+        return f'{self.base_url}/{subpath}'
+
+    def _fetch(self, subpath, params, headers, stale):
+        """GET ``subpath`` (conditionally if ``stale`` has validators). Returns ``(entry, cacheable)``."""
+        response = self._send(self.url(subpath), params, {**headers, **conditional_headers(stale)})
+        if response.status_code != 304 or stale is None:
+            response.raise_for_status()
+        return build_cache_entry(response.status_code, response.headers, response.content, stale)
+
+    def _send(self, url, params, headers):
+        """GET through the rate limiter, retrying once after a 429 (honouring Retry-After)."""
+        for attempt in range(2):
+            self.limiter.acquire()
+            response = self.session.get(url, params=params, headers=headers, timeout=self.timeout)
+            if response.status_code != 429 or attempt:
+                return response
+            delay = retry_after_seconds(response.headers.get('Retry-After'))
+            if delay > MAX_RETRY_AFTER:
+                return response
+            time.sleep(delay)
+        return response
+
+mangadex_upstream = UpstreamProxy('mangadex', 'https://api.mangadex.org', MANGADEX_RATE_LIMIT)
+jikan_upstream = UpstreamProxy('jikan', 'https://api.jikan.moe/v4', JIKAN_RATE_LIMIT)
+
+def cached_proxy_response(entry, cache_status):
+    """Build the Flask response forwarded to the frontend from an upstream cache entry."""
+    return Response(entry['body'], status=entry['status'],
+                    headers={'Content-Type': entry['content_type'], 'X-Cache': cache_status})
+
+# --- Upstream HTTP Helpers --- END ---
 
 # --- Manga-News Scraping Logic --- START ---
 
-def normalize_text(text):
-    """Normalize text: remove accents, lowercase, keep alphanumeric."""
-    return re.sub(r'[^a-z0-9]', '', unidecode(text).lower())
+DUCKDUCKGO_HEADERS = {'User-Agent': 'Mozilla/5.0', 'Accept-Language': 'fr-FR,fr;q=0.9'}
+MANGA_NEWS_HEADERS = {'User-Agent': 'Mozilla/5.0'}
+# Path types of Manga-News series pages, in order of preference
+MANGA_NEWS_PATH_TYPES = ('serie', 'serie-vo')
+
+ddg_log = get_logger('ddg')
+manga_news_log = get_logger('manga-news')
+
+def duckduckgo_search_url(title):
+    query = urllib.parse.quote(f"site:manga-news.com {title}")
+    return f"https://html.duckduckgo.com/html/?q={query}"
+
+def manga_news_url(path_type, slug):
+    return f"https://www.manga-news.com/index.php/{path_type}/{slug}"
+
+def direct_manga_news_slug(title):
+    """Slug tried when the search fails: original casing, spaces replaced with hyphens."""
+    return title.replace(' ', '-')
+
+def normalize_text(text):
+    """Normalize text: remove accents, lowercase, keep alphanumeric."""
+    return re.sub(r'[^a-z0-9]', '', unidecode(text).lower())
+
+def title_to_slug(title):
+    """Convert title to a URL slug."""
+    normalized = unidecode(title)
+    no_symbols = re.sub(r'[^a-zA-Z0-9 ]', '', normalized)
+    slug = re.sub(r'\s+', '-', no_symbols.strip())
+    return slug
+
+def check_slug_exists(slug):
+    """Check if a direct slug URL exists on Manga-News."""
+    url = f"https://www.manga-news.com/index.php/serie/{slug}"
+    manga_news_log.debug('Trying slug URL', url=url)
+    try:
+        response = manga_news_session.get(url, timeout=10)
+        return response.status_code == 200
+    except requests.exceptions.RequestException as e:
+        manga_news_log.warning('Error checking slug existence', url=url, error=str(e))
+        return False
+
+def match_duckduckgo_results(title, html):
+    """Pick the Manga-News slug and path type best matching ``title`` in a DuckDuckGo result page."""
+    soup = BeautifulSoup(html, 'html.parser')
+    potential_matches = [] # Store tuples of (link, path_type, slug)
+    # Allow optional trailing slash
+    # Result URLs are displayed without their scheme, allow both
+    link_pattern = re.compile(r'(?:https?://)?www\.manga-news\.com/index\.php/(serie|serie-vo)/([^/]+)/?$')
+
+    all_links = soup.find_all('a', class_='result__url')
+    if not all_links:
+        ddg_log.debug("Selector 'a.result__url' found no elements", title=title)
+    for a_tag in all_links:
+        href = a_tag.get_text(strip=True)
+        match = link_pattern.search(href)
+        if match:
+            potential_matches.append({'link': href, 'path_type': match.group(1), 'slug': match.group(2)})
+    ddg_log.debug('Result links', title=title, links=len(all_links),
+                  matches=[f"{m['path_type']}/{m['slug']}" for m in potential_matches])
+    for match_info in potential_matches:
+        remember_manga_news_titles(match_info)
+
+    if not potential_matches:
+        ddg_log.info('No valid links found on DuckDuckGo', title=title)
+        return None # Return None if no matches
+
+    normalized_title = normalize_text(title)
+    best_match_info = None # Will store {'path_type': ..., 'slug': ...}
+    best_distance = float('inf')
+    max_allowed_distance = len(normalized_title) * 0.4
+
+    for match_info in potential_matches:
+        slug = match_info['slug']
+        path_type = match_info['path_type']
+
+        # Normalize only for comparison
+        normalized_slug_for_comparison = normalize_text(slug.replace('-', ' '))
+        distance = Levenshtein.distance(normalized_title, normalized_slug_for_comparison)
+        ddg_log.debug('Testing link', link=match_info['link'], compared=normalized_slug_for_comparison, distance=distance)
+        if distance < best_distance:
+            best_distance = distance
+            best_match_info = {'path_type': path_type, 'slug': slug} # Store path and original case slug
+
+    final_match_info = None
+    if best_match_info is not None and best_distance <= max_allowed_distance:
+        final_match_info = best_match_info
+    else:
+        fallback_match = potential_matches[0] # Use the first found match
+        ddg_log.debug('No good fuzzy match, using the first result', title=title, best_distance=best_distance,
+                      max_distance=max_allowed_distance)
+        final_match_info = {'path_type': fallback_match['path_type'], 'slug': fallback_match['slug']}
+
+    ddg_log.info('Match selected', title=title, slug=final_match_info['slug'], path=final_match_info['path_type'],
+                 distance=best_distance)
+    return final_match_info # Return dict {'path_type': ..., 'slug': ...} or None
+
+def search_slug_with_duckduckgo(title, raise_errors=False):
+    """Search DuckDuckGo HTML version for the Manga-News slug and path type.
+
+    With ``raise_errors`` request errors are raised instead of being reported as "not found".
+    """
+    search_url = duckduckgo_search_url(title)
+    ddg_log.debug('Searching', url=search_url)
+
+    try:
+        response = duckduckgo_session.get(search_url, headers=DUCKDUCKGO_HEADERS, timeout=15)
+        response.raise_for_status()
+
+        return match_duckduckgo_results(title, response.text)
+
+    except requests.exceptions.RequestException as e:
+        ddg_log.warning('DuckDuckGo request error', title=title, error=str(e))
+        if raise_errors:
+            raise
+        return None
+    except Exception:
+        ddg_log.exception('Error during DuckDuckGo parsing', title=title)
+        return None
+
+def probe_manga_news_url(path_type, slug):
+    """Return True if the Manga-News series page exists (raises on request errors)."""
+    url = manga_news_url(path_type, slug)
+    response = manga_news_session.get(url, headers=MANGA_NEWS_HEADERS, timeout=10)
+    manga_news_log.debug('Direct URL tried', url=url, status=response.status_code)
+    return response.status_code == 200
+
+def search_manga_news_slug(title, raise_errors=False):
+    """Find the Manga-News slug and path type, trying DuckDuckGo first then direct URL checks.
+
+    With ``raise_errors`` a request error is raised when nothing was found, so that callers can
+    tell "not on Manga-News" apart from "could not ask".
+    """
+    request_error = None
+    # First try DuckDuckGo search
+    try:
+        match_info = search_slug_with_duckduckgo(title, raise_errors=raise_errors)
+    except requests.exceptions.RequestException as e:
+        match_info, request_error = None, e
+    if match_info:
+        return match_info
+
+    manga_news_log.debug('DuckDuckGo search failed, trying direct URLs', title=title)
+    
+    # If DuckDuckGo fails, try direct URL patterns with the original title casing
+    direct_slug = direct_manga_news_slug(title)
+    
+    # Probe both paths (serie and serie-vo) concurrently, 'serie' wins if both exist
+    paths_to_try = MANGA_NEWS_PATH_TYPES
+    futures = [scrape_pool.submit(probe_manga_news_url, path_type, direct_slug) for path_type in paths_to_try]
+    for path_type, future in zip(paths_to_try, futures):
+        try:
+            if future.result():
+                manga_news_log.info('Direct URL found', title=title, slug=direct_slug, path=path_type)
+                return {'path_type': path_type, 'slug': direct_slug}
+        except Exception as e:
+            manga_news_log.warning('Error checking direct URL', path=path_type, slug=direct_slug, error=str(e))
+            if isinstance(e, requests.exceptions.RequestException):
+                request_error = e
+    
+    # If all direct URL attempts fail as well
+    manga_news_log.info('No slug/path found', title=title)
+    if raise_errors and request_error is not None:
+        raise request_error
+    return None
+
+# Synopsis locations on Manga-News series pages, tried in order (current layout first)
+SYNOPSIS_SELECTORS = (
+    'div#summary div.bigsize',
+    'div#summary div.card-body p',
+    'div#summary div.card-text',
+    'div#synopsis span[itemprop="description"]',
+    'div.resume',
+)
+
+def parse_synopsis(html):
+    """Extract the synopsis from a Manga-News series page, trying the known layouts in turn."""
+    soup = BeautifulSoup(html, 'html.parser')
+    for selector in SYNOPSIS_SELECTORS:
+        element = soup.select_one(selector)
+        if element:
+            manga_news_log.debug('Synopsis found', selector=selector)
+            return element.get_text(strip=True)
+    manga_news_log.info('All selectors failed to find synopsis')
+    return None
+
+def scrape_synopsis(slug, path_type, raise_errors=False):
+    """Scrape the synopsis from the Manga-News series page using the correct path type.
+
+    With ``raise_errors`` request errors other than a 404 are raised instead of returning None.
+    """
+    url = manga_news_url(path_type, slug)
+    manga_news_log.debug('Scraping', url=url)
+    try:
+        response = manga_news_session.get(url, headers=MANGA_NEWS_HEADERS, timeout=10)
+        response.raise_for_status()
+        return parse_synopsis(response.text)
+
+    except requests.exceptions.RequestException as e:
+        if isinstance(e, requests.exceptions.HTTPError):
+             manga_news_log.warning('Scraping error', url=url, status=e.response.status_code)
+             if raise_errors and e.response.status_code != 404:
+                 raise
+        else:
+             manga_news_log.warning('Scraping error', url=url, error=str(e))
+             if raise_errors:
+                 raise
+        return None
+    except Exception:
+        manga_news_log.exception('Error during synopsis parsing', url=url)
+        return None
+
+class PersistentTTLCache:
+    """Small SQLite key/value store with per-entry expiry. ``None`` values (negative results) are cached too."""
+
+    def __init__(self, db_path):
+        os.makedirs(os.path.dirname(db_path) or '.', exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        self._conn.execute('''
+            CREATE TABLE IF NOT EXISTS ttl_cache (
+                namespace TEXT NOT NULL,
+                key TEXT NOT NULL,
+                value TEXT,
+                expires REAL NOT NULL,
+                PRIMARY KEY (namespace, key)
+            )
+        ''')
+
+    def get(self, namespace, key):
+        """Return ``(found, value)``; expired entries are not found."""
+        with self._lock:
+            row = self._conn.execute(
+                'SELECT value, expires FROM ttl_cache WHERE namespace = ? AND key = ?', (namespace, key)).fetchone()
+        if row is None or row[1] <= time.time():
+            cache_requests.inc(f'manga-news-{namespace}', 'miss')
+            return False, None
+        cache_requests.inc(f'manga-news-{namespace}', 'hit')
+        return True, json.loads(row[0]) if row[0] is not None else None
+
+    def put(self, namespace, key, value, ttl):
+        with self._lock, self._conn:
+            self._conn.execute(
+                'INSERT OR REPLACE INTO ttl_cache (namespace, key, value, expires) VALUES (?, ?, ?, ?)',
+                (namespace, key, json.dumps(value) if value is not None else None, time.time() + ttl))
+
+    def delete(self, namespace, key):
+        with self._lock, self._conn:
+            self._conn.execute('DELETE FROM ttl_cache WHERE namespace = ? AND key = ?', (namespace, key))
+
+duckduckgo_session = pooled_session('duckduckgo', pool_size=4)
+manga_news_session = pooled_session('manga-news', pool_size=8)
+scrape_pool = ThreadPoolExecutor(max_workers=8, thread_name_prefix='scrape')
+manga_news_cache = PersistentTTLCache(os.path.join(CACHE_DIR, 'manga_news.sqlite3'))
+_manga_news_inflight = SingleFlight()
+
+def manga_news_title_key(title):
+    return normalize_text(title) or title
+
+def remember_manga_news_slug(title, match_info):
+    ttl = MANGA_NEWS_SLUG_TTL if match_info else MANGA_NEWS_NEGATIVE_TTL
+    manga_news_cache.put('slug', manga_news_title_key(title), match_info, ttl)
+    if match_info:
+        remember_manga_news_titles(match_info, title)
+
+def cached_manga_news_slug(title):
+    """Return ``(found, match_info)`` from the slug cache, or from a near-exact known title."""
+    found, match_info = manga_news_cache.get('slug', manga_news_title_key(title))
+    if found:
+        manga_news_log.debug('Slug found in cache', title=title, match=match_info)
+        return True, match_info
+    known = title_index.best_match(title, source='manga-news')
+    if known is None:
+        return False, None
+    match_info = {'path_type': known['pathType'], 'slug': known['slug']}
+    manga_news_log.info('Slug found in the title index', title=title, known=known['title'], score=known['score'],
+                        slug=match_info['slug'], path=match_info['path_type'])
+    remember_manga_news_slug(title, match_info)
+    return True, match_info
+
+def remember_synopsis(slug, path_type, synopsis):
+    ttl = MANGA_NEWS_SYNOPSIS_TTL if synopsis else MANGA_NEWS_NEGATIVE_TTL
+    manga_news_cache.put('synopsis', f'{path_type}/{slug}', synopsis, ttl)
+
+def resolve_manga_news_slug(title):
+    """Cached title -> {'path_type', 'slug'} resolution (None when the title is not on Manga-News)."""
+    found, match_info = cached_manga_news_slug(title)
+    if found:
+        return match_info
+    try:
+        match_info = search_manga_news_slug(title, raise_errors=True)
+    except requests.exceptions.RequestException:
+        return None  # Could not ask: don't remember it as "not found"
+    remember_manga_news_slug(title, match_info)
+    return match_info
+
+def get_cached_synopsis(slug, path_type):
+    """Cached slug -> synopsis scraping (None when the page has no synopsis)."""
+    found, synopsis = manga_news_cache.get('synopsis', f'{path_type}/{slug}')
+    if found:
+        manga_news_log.debug('Synopsis found in cache', slug=slug, path=path_type)
+        return synopsis
+    try:
+        synopsis = scrape_synopsis(slug, path_type, raise_errors=True)
+    except requests.exceptions.RequestException:
+        return None
+    remember_synopsis(slug, path_type, synopsis)
+    return synopsis
+
+def get_manga_news_synopsis(title):
+    """Resolve a title and scrape its synopsis through the caches. Returns ``(match_info, synopsis)``.
+
+    Concurrent lookups of the same title share a single upstream fetch.
+    """
+    def lookup():
+        match_info = resolve_manga_news_slug(title)
+        if not match_info:
+            return None, None
+        return match_info, get_cached_synopsis(match_info['slug'], match_info['path_type'])
+    return _manga_news_inflight.do(manga_news_title_key(title), lookup)
+
+# --- Manga-News Scraping Logic --- END ---
+
+# --- Fuzzy Title Index --- START ---
+
+# Bracketed noise of folder names: "[FR]", "(Glénat)", "{Digital}"...
+_TITLE_NOISE = re.compile(r'\[[^\]]*\]|\([^)]*\)|\{[^}]*\}')
+
+def clean_title(name):
+    """Strip the bracketed tags of a folder name, keeping the title itself."""
+    return _TITLE_NOISE.sub(' ', name).strip() or name
+
+def title_trigrams(normalized):
+    """Trigrams of a normalized title, padded so short titles and word starts/ends still count."""
+    padded = f'^{normalized}$'
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+class TitleIndex:
+    """Trigram inverted index of every known series title, reranked with Levenshtein.
+
+    Entries are ``(source, ref, title)`` with a JSON ``match`` payload (the Manga-News slug, the
+    MangaDex id...). They are persisted in SQLite and kept in memory as posting lists.
+    """
+
+    def __init__(self, db_path):
+        os.makedirs(os.path.dirname(db_path) or '.', exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        self._conn.execute('''
+            CREATE TABLE IF NOT EXISTS titles (
+                source TEXT NOT NULL,
+                ref TEXT NOT NULL,
+                normalized TEXT NOT NULL,
+                title TEXT NOT NULL,
+                match TEXT NOT NULL,
+                PRIMARY KEY (source, ref, normalized)
+            )
+        ''')
+        self._entries = []  # (source, ref, normalized, title, match)
+        self._ids = {}  # (source, ref, normalized) -> position in _entries
+        self._postings = {}  # source -> trigram -> positions in _entries
+        self._loaded = False
+
+    def __len__(self):
+        self._load()
+        return len(self._entries)
+
+    def _load(self):
+        if self._loaded:
+            return
+        with self._lock:
+            if self._loaded:
+                return
+            for source, ref, normalized, title, match in self._conn.execute(
+                    'SELECT source, ref, normalized, title, match FROM titles'):
+                self._insert(source, ref, normalized, title, json.loads(match))
+            self._loaded = True
+
+    def _insert(self, source, ref, normalized, title, match):
+        key = (source, ref, normalized)
+        if key in self._ids:
+            return False
+        position = len(self._entries)
+        self._ids[key] = position
+        self._entries.append((source, ref, normalized, title, match))
+        postings = self._postings.setdefault(source, {})
+        for gram in title_trigrams(normalized):
+            postings.setdefault(gram, []).append(position)
+        return True
+
+    def add(self, source, ref, titles, match):
+        """Index the ``titles`` of one series; titles already known for it are ignored."""
+        self._load()
+        rows = []
+        with self._lock:
+            for title in titles:
+                normalized = normalize_text(title or '')
+                if len(normalized) >= 2 and self._insert(source, ref, normalized, title, match):
+                    rows.append((source, ref, normalized, title, json.dumps(match)))
+            if rows:
+                with self._conn:
+                    self._conn.executemany(
+                        'INSERT OR IGNORE INTO titles (source, ref, normalized, title, match) VALUES (?, ?, ?, ?, ?)', rows)
+
+    def match(self, title, limit=5, source=None, min_score=0.0, candidates=50):
+        """Rank the series best matching ``title``: ``[{'source', 'title', 'score', **match}]``.
+
+        The trigram postings (of ``source`` only, when given) select the ``candidates`` entries
+        sharing the most trigrams with the query; only those are scored with ``Levenshtein.ratio``
+        on the normalized titles. Each series appears once, with its best scoring title.
+        """
+        self._load()
+        query = normalize_text(clean_title(title))
+        if not query:
+            return []
+        shared = {}
+        with self._lock:
+            sources = [self._postings.get(source, {})] if source is not None else list(self._postings.values())
+            for gram in title_trigrams(query):
+                for postings in sources:
+                    for position in postings.get(gram, ()):
+                        shared[position] = shared.get(position, 0) + 1
+            entries = self._entries
+        shortlist = sorted(shared, key=shared.__getitem__, reverse=True)[:max(candidates, limit)]
+
+        best = {}
+        for position in shortlist:
+            entry_source, ref, normalized, entry_title, match = entries[position]
+            score = Levenshtein.ratio(query, normalized)
+            if score >= min_score and score > best.get((entry_source, ref), (-1,))[0]:
+                best[(entry_source, ref)] = (score, entry_title, match)
+        ranked = sorted(best.items(), key=lambda item: item[1][0], reverse=True)[:limit]
+        return [{'source': entry_source, 'title': entry_title, 'score': round(score, 4), **match}
+                for (entry_source, _), (score, entry_title, match) in ranked]
+
+    def best_match(self, title, source=None, min_score=TITLE_AUTO_MATCH_SCORE):
+        matches = self.match(title, limit=1, source=source, min_score=min_score)
+        return matches[0] if matches else None
+
+title_index = TitleIndex(os.path.join(CACHE_DIR, 'titles.sqlite3'))
+
+def remember_manga_news_titles(match_info, *titles):
+    """Index a Manga-News series under ``titles`` and the title spelled by its slug."""
+    slug, path_type = match_info['slug'], match_info['path_type']
+    title_index.add('manga-news', f'{path_type}/{slug}', (*titles, slug.replace('-', ' ')),
+                    {'pathType': path_type, 'slug': slug})
+
+def _mangadex_titles(item):
+    if item.get('type') != 'manga':
+        return None, []
+    attributes = item.get('attributes') or {}
+    titles = list((attributes.get('title') or {}).values())
+    for alt_title in attributes.get('altTitles') or []:
+        titles.extend(alt_title.values())
+    return item.get('id'), titles
+
+def _jikan_titles(item):
+    titles = [item.get('title'), item.get('title_english')] + list(item.get('title_synonyms') or [])
+    titles.extend(entry.get('title') for entry in item.get('titles') or [])
+    return item.get('mal_id'), titles
+
+# Upstream name -> (manga endpoints prefix, item -> (id, titles), match payload key)
+API_TITLE_SOURCES = {
+    'mangadex': ('manga', _mangadex_titles, 'id'),
+    'jikan': ('manga', _jikan_titles, 'malId'),
+}
+
+def remember_api_titles(source, subpath, entry):
+    """Index the manga titles found in a fresh MangaDex / Jikan JSON response."""
+    if source not in API_TITLE_SOURCES or entry['status'] != 200:
+        return
+    prefix, extract, id_key = API_TITLE_SOURCES[source]
+    if not subpath.startswith(prefix):
+        return
+    try:
+        data = json.loads(entry['body']).get('data')
+    except (ValueError, AttributeError):
+        return
+    for item in data if isinstance(data, list) else [data]:
+        if not isinstance(item, dict):
+            continue
+        ref, titles = extract(item)
+        # Titles in non-latin scripts only add noise once transliterated
+        titles = [title for title in titles if isinstance(title, str) and re.search(r'[A-Za-z]', title)]
+        if ref is not None and titles:
+            title_index.add(source, str(ref), titles, {id_key: ref})
+
+# --- Fuzzy Title Index --- END ---
+
+# --- Library Index --- START ---
+
+library_log = get_logger('library')
+
+def _subtree_clause(column, path):
+    """SQL condition (and params) matching ``path`` itself and everything below it."""
+    prefix = path.rstrip(os.sep) + os.sep
+    return f'({column} = ? OR substr({column}, 1, ?) = ?)', (path, len(prefix), prefix)
+
+def _like_escape(text):
+    """Escape the LIKE wildcards of ``text`` (used with ESCAPE '\\')."""
+    return text.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+def file_change(change_type, path, mtime, size, sidecar):
+    """Library change of an archive ('add', 'modify', 'remove' or 'rename'), in the /files file format."""
+    return {'type': change_type, 'kind': 'file', 'id': path, 'path': path, 'folder': os.path.dirname(path),
+            'name': os.path.basename(path), 'hasSidecar': bool(sidecar), 'mtime': mtime, 'size': size}
+
+def directory_change(change_type, path):
+    """Library change of a directory; removing a directory removes its whole subtree."""
+    return {'type': change_type, 'kind': 'directory', 'path': path, 'name': os.path.basename(path)}
+
+class LibraryIndex:
+    """Persistent SQLite index of the library folders and archives, keyed by path with mtime and size.
+
+    A directory is only re-listed when its mtime changed since the last scan; unchanged
+    directories reuse their stored children and are only stat'ed on the way down.
+    """
+
+    def __init__(self, db_path, root):
+        self.root = os.path.normpath(root)
+        self.last_scan = 0.0
+        self._lock = threading.RLock()
+        self._listeners = []
+        os.makedirs(os.path.dirname(db_path) or '.', exist_ok=True)
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        self._conn.executescript('''
+            CREATE TABLE IF NOT EXISTS directories (
+                path TEXT PRIMARY KEY,
+                parent TEXT,
+                name TEXT NOT NULL,
+                mtime REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS directories_parent ON directories(parent);
+            CREATE TABLE IF NOT EXISTS files (
+                path TEXT PRIMARY KEY,
+                folder TEXT NOT NULL,
+                name TEXT NOT NULL,
+                mtime REAL NOT NULL,
+                size INTEGER NOT NULL,
+                sidecar INTEGER NOT NULL DEFAULT 0
+            );
+            CREATE INDEX IF NOT EXISTS files_folder ON files(folder);
+        ''')
+        columns = {r[1] for r in self._conn.execute('PRAGMA table_info(files)')}
+        if 'sidecar' not in columns:
+            self._conn.execute('ALTER TABLE files ADD COLUMN sidecar INTEGER NOT NULL DEFAULT 0')
+
+    def contains(self, path):
+        """Return True if ``path`` is the library root or lies below it."""
+        path = os.path.normpath(path)
+        return path == self.root or path.startswith(self.root.rstrip(os.sep) + os.sep)
+
+    def add_listener(self, callback):
+        """Call ``callback(changes)`` with the file_change() / directory_change() records of every index update."""
+        self._listeners.append(callback)
+
+    def _notify(self, changes):
+        if not changes:
+            return
+        for callback in self._listeners:
+            try:
+                callback(changes)
+            except Exception:
+                library_log.exception('Listener error', listener=getattr(callback, '__name__', repr(callback)))
+
+    def is_stale(self, max_age=LIBRARY_RESCAN_INTERVAL):
+        """Return True if the last full scan is older than ``max_age`` seconds."""
+        return time.time() - self.last_scan >= max_age
+
+    def refresh_if_stale(self, max_age=LIBRARY_RESCAN_INTERVAL):
+        """Run an incremental scan of the whole library if the last one is older than ``max_age``."""
+        if self.is_stale(max_age):
+            return self.scan()
+        return None
+
+    def scan(self, path=None, force=False):
+        """Incrementally rescan ``path`` (default: the whole library) and return scan counters.
+
+        With ``force`` every directory is re-listed, whatever its mtime.
+        """
+        stats = {'directories': 0, 'rescanned': 0, 'removed': 0}
+        for _ in self.iter_scan(path, force, stats):
+            pass
+        return stats
+
+    def iter_scan(self, path=None, force=False, stats=None):
+        """Generator behind scan(): yields each directory path, in path order, once its rows are up to date.
+
+        The lock is only held while a single directory is synced, so the walk can be consumed lazily.
+        """
+        top = os.path.normpath(path or self.root)
+        if stats is None:
+            stats = {'directories': 0, 'rescanned': 0, 'removed': 0}
+        if top == self.root:
+            # Drop anything left over from a previous FILES_PATH
+            with self._lock, self._conn:
+                stats['removed'] += self._forget_outside_root()
+        stack = [top]
+        while stack:
+            current = stack.pop()
+            with self._lock, self._conn:
+                subdirs, changes = self._visit(current, force, stats)
+            self._notify(changes)
+            if subdirs is None:
+                continue
+            stack.extend(sorted(subdirs, reverse=True))
+            yield current
+        if top == self.root:
+            self.last_scan = time.time()
+
+    def _visit(self, path, force, stats):
+        """Sync one directory if its mtime changed.
+
+        Returns ``(sub-directories, changes)``; sub-directories are None if it is gone.
+        """
+        try:
+            mtime = os.stat(path).st_mtime
+        except OSError:
+            return None, self._forget_directory(path, stats)
+        stats['directories'] += 1
+        row = self._conn.execute('SELECT mtime FROM directories WHERE path = ?', (path,)).fetchone()
+        if row is not None and row[0] == mtime and not force:
+            return [r[0] for r in self._conn.execute('SELECT path FROM directories WHERE parent = ?', (path,))], []
+        stats['rescanned'] += 1
+        try:
+            subdirs, removed, changes = self._relist_directory(path, mtime)
+        except OSError:
+            return None, self._forget_directory(path, stats)
+        stats['removed'] += removed
+        return subdirs, changes
+
+    def _forget_directory(self, path, stats):
+        removed = self._forget(path)
+        stats['removed'] += removed
+        return [directory_change('remove', path)] if removed else []
+
+    def _relist_directory(self, path, mtime):
+        """Re-read one directory from disk and sync its rows.
+
+        Returns ``(sub-directories, removed rows, changes)``.
+        """
+        subdirs, archives, sidecars = [], {}, set()
+        with os.scandir(path) as entries:
+            for entry in entries:
+                try:
+                    if entry.is_dir(follow_symlinks=False):
+                        subdirs.append(os.path.normpath(entry.path))
+                    elif entry.name.endswith(ARCHIVE_EXTENSIONS) and entry.is_file():
+                        st = entry.stat()
+                        archives[os.path.normpath(entry.path)] = (entry.name, st.st_mtime, st.st_size)
+                    elif entry.name.endswith(SIDECAR_SUFFIX):
+                        sidecars.add(os.path.normpath(entry.path))
+                except OSError:
+                    continue
+
+        removed, changes = 0, []
+        known_dirs = {r[0] for r in self._conn.execute('SELECT path FROM directories WHERE parent = ?', (path,))}
+        for gone in known_dirs.difference(subdirs):
+            removed += self._forget(gone)
+            changes.append(directory_change('remove', gone))
+        changes.extend(directory_change('add', subdir) for subdir in subdirs if subdir not in known_dirs)
+        known_files = {r[0]: (r[1], r[2], bool(r[3])) for r in self._conn.execute(
+            'SELECT path, mtime, size, sidecar FROM files WHERE folder = ?', (path,))}
+        for gone in known_files.keys() - archives.keys():
+            removed += self._conn.execute('DELETE FROM files WHERE path = ?', (gone,)).rowcount
+            changes.append(file_change('remove', gone, *known_files[gone]))
+        rows = [(p, path, name, f_mtime, size, p.endswith(SIDECAR_EXTENSIONS) and sidecar_path(p) in sidecars)
+                for p, (name, f_mtime, size) in archives.items()]
+        for p, _, _, f_mtime, size, sidecar in rows:
+            known = known_files.get(p)
+            if known != (f_mtime, size, sidecar):
+                changes.append(file_change('add' if known is None else 'modify', p, f_mtime, size, sidecar))
+        self._conn.executemany(
+            'INSERT OR REPLACE INTO files (path, folder, name, mtime, size, sidecar) VALUES (?, ?, ?, ?, ?, ?)', rows)
+        parent = None if path == self.root else os.path.dirname(path)
+        self._conn.execute(
+            'INSERT OR REPLACE INTO directories (path, parent, name, mtime) VALUES (?, ?, ?, ?)',
+            (path, parent, os.path.basename(path), mtime))
+        return subdirs, removed, changes
+
+    def update_file(self, path):
+        """Refresh the row of a single archive after it was rewritten (or drop it if it is gone)."""
+        path = os.path.normpath(path)
+        if not self.contains(path) or not path.endswith(ARCHIVE_EXTENSIONS):
+            return
+        changes = []
+        with self._lock, self._conn:
+            row = self._conn.execute('SELECT mtime, size, sidecar FROM files WHERE path = ?', (path,)).fetchone()
+            known = (row[0], row[1], bool(row[2])) if row else None
+            try:
+                st = os.stat(path)
+            except OSError:
+                self._forget(path)
+                if known:
+                    changes.append(file_change('remove', path, *known))
+            else:
+                current = (st.st_mtime, st.st_size, has_sidecar(path))
+                self._conn.execute(
+                    'INSERT OR REPLACE INTO files (path, folder, name, mtime, size, sidecar) VALUES (?, ?, ?, ?, ?, ?)',
+                    (path, os.path.dirname(path), os.path.basename(path), *current))
+                if current != known:
+                    changes.append(file_change('add' if known is None else 'modify', path, *current))
+        self._notify(changes)
+
+    def rename(self, old_path, new_path):
+        """Move the rows of a renamed archive or directory (with its subtree) and report a 'rename' change.
+
+        Returns False, without touching anything, if ``old_path`` is not indexed.
+        """
+        old_path, new_path = os.path.normpath(old_path), os.path.normpath(new_path)
+        with self._lock, self._conn:
+            if new_path != old_path:
+                self._forget(new_path)  # Stale rows left at the destination
+            row = self._conn.execute('SELECT mtime, size, sidecar FROM files WHERE path = ?', (old_path,)).fetchone()
+            if row is not None:
+                if new_path.endswith(ARCHIVE_EXTENSIONS):
+                    self._conn.execute('UPDATE files SET path = ?, folder = ?, name = ? WHERE path = ?',
+                                       (new_path, os.path.dirname(new_path), os.path.basename(new_path), old_path))
+                    change = {**file_change('rename', new_path, *row), 'oldPath': old_path}
+                else:
+                    self._conn.execute('DELETE FROM files WHERE path = ?', (old_path,))
+                    change = file_change('remove', old_path, *row)
+            elif self._conn.execute('SELECT 1 FROM directories WHERE path = ?', (old_path,)).fetchone():
+                for table, columns in (('directories', ('path', 'parent')), ('files', ('path', 'folder'))):
+                    for column in columns:
+                        clause, params = _subtree_clause(column, old_path)
+                        self._conn.execute(
+                            f'UPDATE {table} SET {column} = ? || substr({column}, ?) WHERE {clause}',
+                            (new_path, len(old_path) + 1, *params))
+                self._conn.execute('UPDATE directories SET name = ?, parent = ? WHERE path = ?',
+                                   (os.path.basename(new_path), os.path.dirname(new_path), new_path))
+                change = {**directory_change('rename', new_path), 'oldPath': old_path}
+            else:
+                return False
+        self._notify([change])
+        return True
+
+    def _forget(self, path):
+        """Remove ``path`` and its whole subtree from the index. Returns the number of removed rows."""
+        clause, params = _subtree_clause('path', path)
+        removed = self._conn.execute(f'DELETE FROM directories WHERE {clause}', params).rowcount
+        removed += self._conn.execute(f'DELETE FROM files WHERE {clause}', params).rowcount
+        return removed
+
+    def _forget_outside_root(self):
+        clause, params = _subtree_clause('path', self.root)
+        removed = self._conn.execute(f'DELETE FROM directories WHERE NOT {clause}', params).rowcount
+        removed += self._conn.execute(f'DELETE FROM files WHERE NOT {clause}', params).rowcount
+        return removed
+
+    def archives(self, path=None):
+        """Return ``(path, mtime, size)`` of every indexed archive below ``path`` (default: the whole library)."""
+        clause, params = _subtree_clause('path', os.path.normpath(path or self.root))
+        with self._lock:
+            return self._conn.execute(f'SELECT path, mtime, size FROM files WHERE {clause} ORDER BY path', params).fetchall()
+
+    def folders(self, limit=None, cursor=None, prefix=None, q=None, only=None):
+        """Return the indexed folders (with their archives) in the /files JSON format, ordered by path.
+
+        ``cursor`` is the path of the last folder of the previous page. ``prefix`` keeps folders whose
+        name starts with it; ``q`` keeps folders whose name, or archives whose name, contain it
+        (both case-insensitive). ``only`` restricts the result to a single folder path.
+        """
+        clause, params = _subtree_clause('f.folder', self.root)
+        conditions, params = [clause, 'f.folder != ?'], list(params) + [self.root]
+        if only is not None:
+            conditions.append('f.folder = ?')
+            params.append(os.path.normpath(only))
+        if cursor:
+            conditions.append('f.folder > ?')
+            params.append(cursor)
+        if prefix:
+            conditions.append("d.name LIKE ? ESCAPE '\\'")
+            params.append(_like_escape(prefix) + '%')
+        if q:
+            conditions.append("(d.name LIKE ? ESCAPE '\\' OR f.name LIKE ? ESCAPE '\\')")
+            params.extend(['%' + _like_escape(q) + '%'] * 2)
+        source = f"FROM files f JOIN directories d ON d.path = f.folder WHERE {' AND '.join(conditions)}"
+        page = f'SELECT DISTINCT f.folder {source} ORDER BY f.folder'
+        page_params = list(params)
+        if limit is not None:
+            page += ' LIMIT ?'
+            page_params.append(limit)
+
+        with self._lock:
+            rows = self._conn.execute(
+                f'SELECT f.folder, f.path, f.name, f.sidecar {source} AND f.folder IN ({page}) ORDER BY f.folder, f.name',
+                params + page_params).fetchall()
+        folders = []
+        for folder_path, path, name, sidecar in rows:
+            if not folders or folders[-1]['path'] != folder_path:
+                folders.append({
+                    'id': folder_path,
+                    'name': os.path.basename(folder_path),
+                    'path': folder_path,
+                    'files': [],
+                })
+            folders[-1]['files'].append({'id': path, 'name': name, 'path': path, 'hasSidecar': bool(sidecar)})
+        return folders
+
+    def iter_folders(self, prefix=None, q=None, batch_size=200):
+        """Yield every matching folder, fetching them from the index one page at a time."""
+        cursor = None
+        while True:
+            page = self.folders(limit=batch_size, cursor=cursor, prefix=prefix, q=q)
+            yield from page
+            if len(page) < batch_size:
+                return
+            cursor = page[-1]['path']
+
+library_index = LibraryIndex(os.path.join(CACHE_DIR, 'library.sqlite3'), FILES_PATH)
+
+# --- Library Index --- END ---
+
+# --- Library Watcher --- START ---
+
+def coalesce_changes(changes):
+    """Reduce a list of library changes to their net effect.
+
+    Successive changes of one archive collapse into one ('add' then 'modify' is an 'add', 'add'
+    then 'remove' is nothing...), and an archive removed while another one with the same mtime
+    and size appeared becomes a 'rename'. Directory changes are kept as they are, in order.
+    """
+    net = OrderedDict()
+    for position, change in enumerate(changes):
+        if change['kind'] == 'directory':
+            net[position] = change
+            continue
+        path, change_type = change['path'], change['type']
+        previous = net.pop(change['oldPath'], None) if change_type == 'rename' else net.get(path)
+        if previous is None:
+            net[path] = change
+        elif change_type == 'rename':
+            if previous['type'] == 'add':
+                net[path] = {**{k: v for k, v in change.items() if k != 'oldPath'}, 'type': 'add'}
+            else:
+                net[path] = {**change, 'oldPath': previous.get('oldPath', change['oldPath'])}
+        elif previous['type'] == 'add':
+            if change_type == 'remove':
+                del net[path]
+            else:
+                net[path] = {**change, 'type': 'add'}
+        elif previous['type'] == 'remove' and change_type == 'add':
+            net[path] = {**change, 'type': 'modify'}
+        elif previous['type'] == 'rename':
+            if change_type == 'remove':
+                net[path] = file_change('remove', previous['oldPath'], change['mtime'], change['size'], change['hasSidecar'])
+            else:
+                net[path] = {**change, 'type': 'rename', 'oldPath': previous['oldPath']}
+        else:
+            net[path] = change
+
+    # Pair removed and added archives carrying the same (mtime, size), when the pairing is unambiguous
+    removed, added = {}, {}
+    for key, change in net.items():
+        if change['kind'] == 'file' and change['type'] in ('remove', 'add'):
+            side = removed if change['type'] == 'remove' else added
+            side.setdefault((change['mtime'], change['size']), []).append(key)
+    for signature, removed_keys in removed.items():
+        added_keys = added.get(signature, [])
+        if len(removed_keys) == 1 and len(added_keys) == 1:
+            old = net.pop(removed_keys[0])
+            net[added_keys[0]] = {**net[added_keys[0]], 'type': 'rename', 'oldPath': old['path']}
+    return list(net.values())
+
+class LibraryEvents:
+    """Feed of library changes for the /files/events subscribers.
+
+    Published changes are collected for ``debounce`` seconds and logged as one coalesced batch.
+    The last ``history`` batches are kept, so a client reconnecting with its last batch id gets
+    what it missed, or is told to reload /files if it fell too far behind.
+    """
+
+    def __init__(self, debounce, history=256):
+        self.debounce = debounce
+        self.last_id = 0
+        self._cond = threading.Condition()
+        self._pending = []
+        self._timer = None
+        self._log = deque(maxlen=history)
+
+    def publish(self, changes):
+        with self._cond:
+            self._pending.extend(changes)
+            if self._timer is None:
+                self._timer = threading.Timer(self.debounce, self.flush)
+                self._timer.daemon = True
+                self._timer.start()
+
+    def flush(self):
+        with self._cond:
+            pending, self._pending, self._timer = self._pending, [], None
+            batch = coalesce_changes(pending)
+            if batch:
+                self.last_id += 1
+                self._log.append((self.last_id, batch))
+                self._cond.notify_all()
+
+    def since(self, after_id, timeout):
+        """Return the ``(id, changes)`` batches logged after ``after_id``, waiting up to ``timeout`` for one.
+
+        Returns None if some of them are no longer in the log (or ``after_id`` is from a previous run).
+        """
+        with self._cond:
+            self._cond.wait_for(lambda: self.last_id != after_id, timeout)
+            if after_id > self.last_id or (self._log and self._log[0][0] > after_id + 1):
+                return None
+            return [(event_id, changes) for event_id, changes in self._log if event_id > after_id]
+
+library_events = LibraryEvents(LIBRARY_EVENTS_DEBOUNCE)
+library_index.add_listener(library_events.publish)
+
+_IN_CLOSE_WRITE = 0x00000008
+_IN_MOVED_FROM = 0x00000040
+_IN_MOVED_TO = 0x00000080
+_IN_CREATE = 0x00000100
+_IN_DELETE = 0x00000200
+_IN_Q_OVERFLOW = 0x00004000
+_IN_IGNORED = 0x00008000
+_IN_ONLYDIR = 0x01000000
+_IN_ISDIR = 0x40000000
+_INOTIFY_EVENT = struct.Struct('iIII')
+
+class Inotify:
+    """Minimal ctypes binding of the Linux inotify API (no extra dependency)."""
+
+    def __init__(self):
+        self._libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+        self.fd = self._libc.inotify_init1(os.O_CLOEXEC)
+        if self.fd < 0:
+            error = ctypes.get_errno()
+            raise OSError(error, os.strerror(error))
+
+    def add_watch(self, path, mask):
+        wd = self._libc.inotify_add_watch(self.fd, os.fsencode(path), mask)
+        if wd < 0:
+            error = ctypes.get_errno()
+            raise OSError(error, os.strerror(error), path)
+        return wd
+
+    def read(self, timeout):
+        """Return the pending ``(wd, mask, cookie, name)`` events, waiting up to ``timeout`` seconds (None: forever)."""
+        if not select.select([self.fd], [], [], timeout)[0]:
+            return []
+        data = os.read(self.fd, 64 * 1024)
+        events, offset = [], 0
+        while offset < len(data):
+            wd, mask, cookie, length = _INOTIFY_EVENT.unpack_from(data, offset)
+            offset += _INOTIFY_EVENT.size
+            events.append((wd, mask, cookie, os.fsdecode(data[offset:offset + length].rstrip(b'\0'))))
+            offset += length
+        return events
+
+    def close(self):
+        os.close(self.fd)
+
+class LibraryWatcher:
+    """Keeps the library index in sync with the disk, which feeds library_events.
+
+    With inotify, every library directory is watched and the index is updated once the disk
+    has been quiet for ``debounce`` seconds (or at the latest ``max_delay`` seconds after the
+    first event), so a bulk copy costs a few directory scans. Without inotify, or once the
+    watch limit is reached, it falls back to an incremental scan every ``poll_interval`` seconds.
+    """
+
+    WATCH_MASK = _IN_CLOSE_WRITE | _IN_MOVED_FROM | _IN_MOVED_TO | _IN_CREATE | _IN_DELETE | _IN_ONLYDIR
+
+    def __init__(self, index, mode, debounce, max_delay, poll_interval):
+        self.index = index
+        self.mode = mode
+        self.debounce = debounce
+        self.max_delay = max_delay
+        self.poll_interval = poll_interval
+        self._directories = {}  # watch descriptor -> directory
+        self._thread = None
+        self._start_lock = threading.Lock()
+
+    def start(self):
+        with self._start_lock:
+            if self._thread is None and self.mode != 'off':
+                self._thread = threading.Thread(target=self._run, name='library-watcher', daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        if self.mode == 'inotify':
+            try:
+                self._watch()
+            except (OSError, AttributeError) as e:
+                library_log.warning('inotify indisponible, scan périodique', error=str(e), interval=self.poll_interval)
+        while True:
+            time.sleep(self.poll_interval)
+            try:
+                self.index.scan()
+            except Exception:
+                library_log.exception('Erreur de scan')
+
+    def _watch_tree(self, inotify, top):
+        for directory, _, _ in os.walk(top):
+            try:
+                self._directories[inotify.add_watch(directory, self.WATCH_MASK)] = os.path.normpath(directory)
+            except (FileNotFoundError, NotADirectoryError):
+                continue  # Already gone again
+
+    def _watch(self):
+        inotify = Inotify()
+        try:
+            self._watch_tree(inotify, self.index.root)
+            library_log.info('inotify actif', directories=len(self._directories))
+            self.index.scan()  # Catch up with what changed while nobody was watching
+            dirty, written, overflow = set(), set(), False
+            moved_from, renamed = {}, []  # Directory moves, paired by inotify cookie
+            first = last = None
+            while True:
+                timeout = None if first is None else max(0.0, min(last + self.debounce, first + self.max_delay) - time.monotonic())
+                events = inotify.read(timeout)
+                now = time.monotonic()
+                for wd, mask, cookie, name in events:
+                    if mask & _IN_Q_OVERFLOW:
+                        overflow = True
+                        continue
+                    if mask & _IN_IGNORED:
+                        self._directories.pop(wd, None)
+                        continue
+                    directory = self._directories.get(wd)
+                    if directory is None:
+                        continue
+                    path = os.path.join(directory, name)
+                    if mask & _IN_ISDIR and mask & _IN_MOVED_FROM:
+                        moved_from[cookie] = path
+                    if mask & _IN_ISDIR and mask & (_IN_CREATE | _IN_MOVED_TO):
+                        self._watch_tree(inotify, path)
+                        if mask & _IN_MOVED_TO and cookie in moved_from:
+                            renamed.append((moved_from.pop(cookie), path))
+                    if mask & _IN_CLOSE_WRITE:
+                        # Rewritten in place: the directory mtime does not change
+                        if name.endswith(ARCHIVE_EXTENSIONS):
+                            written.add(path)
+                    else:
+                        dirty.add(directory)
+                if events:
+                    first, last = first or now, now
+                if first is not None and (now - last >= self.debounce or now - first >= self.max_delay):
+                    self._sync(dirty, written, overflow, renamed)
+                    dirty, written, overflow = set(), set(), False
+                    moved_from, renamed = {}, []
+                    first = last = None
+        finally:
+            inotify.close()
+            self._directories.clear()
+
+    def _sync(self, dirty, written, overflow, renamed):
+        try:
+            # Moving the rows of renamed directories first turns them into one 'rename' change
+            for old_path, new_path in renamed:
+                self.index.rename(old_path, new_path)
+            if overflow:
+                self.index.scan()
+            else:
+                for directory in sorted(dirty):
+                    self.index.scan(directory)
+            for path in written:
+                self.index.update_file(path)
+        except Exception:
+            library_log.exception('Erreur de mise à jour')
+
+library_watcher = LibraryWatcher(library_index, LIBRARY_WATCH, LIBRARY_WATCH_DEBOUNCE,
+                                 LIBRARY_WATCH_MAX_DELAY, LIBRARY_POLL_INTERVAL)
+
+def start_library_watcher():
+    """Start watching FILES_PATH (once); called by the server entry points."""
+    library_watcher.start()
+
+# --- Library Watcher --- END ---
+
+# --- CBZ Archive Helpers --- START ---
+
+# The writes (rewrite_cbz, sidecars, CBR conversion) live in archive_workers, run by the process pools
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.webp', '.gif', '.bmp')
+
+def natural_sort_key(name):
+    """Sort key putting 'page2.jpg' before 'page10.jpg'."""
+    return [int(part) if part.isdigit() else part.lower() for part in re.split(r'(\d+)', name)]
+
+def open_archive(file_path):
+    """Open a CBZ (zipfile) or CBR (rarfile) for reading; both expose infolist() and open()."""
+    if file_path.endswith('.cbr'):
+        return rarfile.RarFile(file_path)
+    return zipfile.ZipFile(file_path)
+
+def image_members(archive):
+    """Image members of an open archive in natural page order, skipping hidden and __MACOSX entries."""
+    members = [info for info in archive.infolist()
+               if not info.is_dir() and info.filename.lower().endswith(IMAGE_EXTENSIONS)
+               and not any(part.startswith(('.', '__MACOSX')) for part in info.filename.split('/'))]
+    return sorted(members, key=lambda info: natural_sort_key(info.filename))
+
+def count_written_archive(summary):
+    """Add the size of a rewritten CBZ (or of the CBZ converted from a CBR) to the archive I/O metrics."""
+    if 'sizeAfter' in summary:
+        archive_io_bytes.inc('write', amount=summary['sizeAfter'])
+    elif summary.get('newPath') and os.path.exists(summary['newPath']):
+        archive_io_bytes.inc('write', amount=os.path.getsize(summary['newPath']))
+
+# --- CBZ Archive Helpers --- END ---
+
+# --- Metadata Cache --- START ---
+
+metadata_log = get_logger('metadata')
+
+def parse_comic_info(xml_content):
+    """Parse a ComicInfo.xml document into a flat {tag: text} dict."""
+    root = ET.fromstring(xml_content)
+    metadata = {}
+    for child in root:
+        if child.text and child.text.strip():
+            metadata[child.tag] = child.text.strip()
+    return metadata
+
+def read_archive_metadata(file_path):
+    """Read and parse the ComicInfo.xml of an archive (the sidecar of a CBR first). Returns None if there is none."""
+    xml_content, source = None, None
+
+    # Le ComicInfo.xml annexe (sidecar) d'un CBR a priorité sur celui de l'archive
+    if file_path.endswith(ARCHIVE_EXTENSIONS):
+        xml_content = read_sidecar(file_path)
+        if xml_content:
+            source = 'sidecar'
+
+    # Extraction pour fichier CBZ (ZIP)
+    if xml_content is None and file_path.endswith('.cbz'):
+        try:
+            # Only the central directory and the ComicInfo.xml member are read
+            with zipfile.ZipFile(file_path, 'r') as zip_file:
+                try:
+                    xml_content = zip_file.read(COMIC_INFO_NAME).decode('utf-8')
+                    source = 'cbz'
+                except KeyError:
+                    pass
+        except Exception as zip_error:
+            metadata_log.warning("Erreur lors de l'extraction du fichier ZIP", path=file_path, error=str(zip_error))
+
+    # Extraction pour fichier CBR (RAR)
+    elif xml_content is None and file_path.endswith('.cbr'):
+        try:
+            with rarfile.RarFile(file_path) as rar_file:
+                try:
+                    xml_content = rar_file.read(COMIC_INFO_NAME).decode('utf-8')
+                    source = 'cbr'
+                except rarfile.NoRarEntry:
+                    pass
+        except Exception as rar_error:
+            metadata_log.warning("Erreur lors de l'extraction du fichier RAR", path=file_path, error=str(rar_error))
+
+    if not xml_content:
+        metadata_log.debug('Aucune métadonnée ComicInfo.xml trouvée', path=file_path)
+        return None
+    archive_io_bytes.inc('metadata_read', amount=len(xml_content.encode('utf-8')))
+    metadata = parse_comic_info(xml_content)
+    metadata_log.debug('Métadonnées extraites', path=file_path, source=source, fields=len(metadata))
+    return metadata
+
+class MetadataCache:
+    """Bounded LRU of parsed ComicInfo metadata, with an optional SQLite tier.
+
+    Entries are keyed by path and only valid while the archive (and its sidecar) keep the
+    same signature, i.e. (mtime, size, sidecar mtime). Archives without metadata are cached too.
+    """
+
+    def __init__(self, max_entries, db_path=None):
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()  # path -> (signature, metadata)
+        self._lock = threading.Lock()
+        self._conn = None
+        if db_path:
+            os.makedirs(os.path.dirname(db_path) or '.', exist_ok=True)
+            self._conn = sqlite3.connect(db_path, check_same_thread=False)
+            self._conn.execute('PRAGMA journal_mode=WAL')
+            self._conn.execute('PRAGMA synchronous=NORMAL')
+            self._conn.execute('''
+                CREATE TABLE IF NOT EXISTS metadata_cache (
+                    path TEXT PRIMARY KEY,
+                    mtime REAL NOT NULL,
+                    size INTEGER NOT NULL,
+                    sidecar_mtime REAL NOT NULL,
+                    metadata TEXT
+                )
+            ''')
+
+    @staticmethod
+    def signature(path):
+        """Return the (mtime, size, sidecar mtime) signature of an archive, or None if it is missing."""
+        try:
+            st = os.stat(path)
+        except OSError:
+            return None
+        try:
+            sidecar_mtime = os.stat(sidecar_path(path)).st_mtime if path.endswith(SIDECAR_EXTENSIONS) else 0.0
+        except OSError:
+            sidecar_mtime = 0.0
+        return (st.st_mtime, st.st_size, sidecar_mtime)
+
+    def get(self, path, signature):
+        """Return (found, metadata) for ``path`` if the cached entry matches ``signature``."""
+        path = os.path.normpath(path)
+        with self._lock:
+            entry = self._entries.get(path)
+            if entry is not None and entry[0] == signature:
+                self._entries.move_to_end(path)
+                self.hits += 1
+                cache_requests.inc('metadata', 'hit')
+                return True, entry[1]
+            if self._conn is not None:
+                row = self._conn.execute(
+                    'SELECT mtime, size, sidecar_mtime, metadata FROM metadata_cache WHERE path = ?', (path,)).fetchone()
+                if row is not None and tuple(row[:3]) == signature:
+                    metadata = json.loads(row[3]) if row[3] is not None else None
+                    self._remember(path, signature, metadata)
+                    self.hits += 1
+                    cache_requests.inc('metadata', 'hit')
+                    return True, metadata
+            self.misses += 1
+            cache_requests.inc('metadata', 'miss')
+            return False, None
+
+    def put(self, path, signature, metadata):
+        path = os.path.normpath(path)
+        with self._lock:
+            self._remember(path, signature, metadata)
+            if self._conn is not None:
+                with self._conn:
+                    self._conn.execute(
+                        'INSERT OR REPLACE INTO metadata_cache (path, mtime, size, sidecar_mtime, metadata) '
+                        'VALUES (?, ?, ?, ?, ?)',
+                        (path, *signature, json.dumps(metadata) if metadata is not None else None))
+
+    def _remember(self, path, signature, metadata):
+        self._entries[path] = (signature, metadata)
+        self._entries.move_to_end(path)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def evict(self, path):
+        """Forget ``path`` and, for a folder, every archive below it."""
+        path = os.path.normpath(path)
+        prefix = path.rstrip(os.sep) + os.sep
+        with self._lock:
+            for key in [k for k in self._entries if k == path or k.startswith(prefix)]:
+                del self._entries[key]
+            if self._conn is not None:
+                clause, params = _subtree_clause('path', path)
+                with self._conn:
+                    self._conn.execute(f'DELETE FROM metadata_cache WHERE {clause}', params)
+
+    def move(self, old_path, new_path):
+        """Re-key the entries of a renamed archive or folder (a rename keeps mtime and size)."""
+        old_path, new_path = os.path.normpath(old_path), os.path.normpath(new_path)
+        old_prefix = old_path.rstrip(os.sep) + os.sep
+        with self._lock:
+            for key in [k for k in self._entries if k == old_path or k.startswith(old_prefix)]:
+                self._entries[new_path + key[len(old_path):]] = self._entries.pop(key)
+            if self._conn is not None:
+                clause, params = _subtree_clause('path', old_path)
+                new_clause, new_params = _subtree_clause('path', new_path)
+                with self._conn:
+                    self._conn.execute(f'DELETE FROM metadata_cache WHERE {new_clause}', new_params)
+                    self._conn.execute(
+                        f'UPDATE metadata_cache SET path = ? || substr(path, ?) WHERE {clause}',
+                        (new_path, len(old_path) + 1, *params))
+
+metadata_cache = MetadataCache(
+    METADATA_CACHE_SIZE, os.path.join(CACHE_DIR, 'metadata.sqlite3') if METADATA_CACHE_PERSIST else None)
+
+def get_archive_metadata(file_path):
+    """Return the parsed ComicInfo metadata of an archive (None if it has none), through the cache."""
+    signature = metadata_cache.signature(file_path)
+    if signature is not None:
+        found, metadata = metadata_cache.get(file_path, signature)
+        if found:
+            return metadata
+    metadata = read_archive_metadata(file_path)
+    if signature is not None:
+        metadata_cache.put(file_path, signature, metadata)
+    return metadata
+
+def remember_written_metadata(file_path, comic_info_xml, summary):
+    """Update the metadata cache right after ComicInfo.xml was written for ``file_path``."""
+    metadata_cache.evict(file_path)
+    target = summary.get('newPath') or file_path
+    try:
+        metadata = parse_comic_info(comic_info_xml)
+    except ET.ParseError:
+        return
+    signature = metadata_cache.signature(target)
+    if signature is not None:
+        metadata_cache.put(target, signature, metadata)
+
+def update_archive_metadata(file_path, comic_info_xml, cbr_mode=None):
+    """Write ComicInfo.xml for one archive and refresh the caches and the library index (/update-cbz)."""
+    summary = write_archive_metadata(file_path, comic_info_xml, cbr_mode or CBR_METADATA_MODE)
+    count_written_archive(summary)
+    remember_written_metadata(file_path, comic_info_xml, summary)
+    library_index.update_file(file_path)
+    result = {'success': True}
+    if summary.get('newPath'):
+        library_index.update_file(summary['newPath'])
+        result['newPath'] = summary['newPath']
+    return result
+
+_metadata_read_pool = ThreadPoolExecutor(max_workers=max(METADATA_READ_WORKERS, 1), thread_name_prefix='metadata-read')
+
+def iter_archives_metadata(file_paths):
+    """Read the metadata of many archives on the thread pool, yielding results as they complete."""
+    futures = {_metadata_read_pool.submit(get_archive_metadata, path): path for path in file_paths}
+    try:
+        for future in as_completed(futures):
+            path = futures[future]
+            try:
+                yield {'filePath': path, 'metadata': future.result()}
+            except Exception as e:
+                yield {'filePath': path, 'error': str(e)}
+    finally:
+        # The client went away: don't read the remaining archives
+        for future in futures:
+            future.cancel()
+
+# --- Metadata Cache --- END ---
+
+# --- Thumbnails --- START ---
+
+thumbnail_log = get_logger('thumbnails')
+
+# Archives remembered as having no decodable cover, least recently used forgotten first
+THUMBNAIL_MISSING_ENTRIES = 4096
+
+class ThumbnailCache:
+    """Content-addressed JPEG files on disk, evicted least recently used first beyond ``max_bytes``.
+
+    Keys hash the archive path, mtime and size (and the thumbnail settings), so a modified
+    archive simply gets a new entry and the stale one ages out. Archives without a cover are
+    remembered (one key per archive, ``max_missing`` archives at most) to avoid decoding them again.
+    """
+
+    def __init__(self, directory, max_bytes, max_missing=THUMBNAIL_MISSING_ENTRIES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.max_missing = max_missing
+        self.total_bytes = 0
+        self._lock = threading.Lock()
+        self._sizes = OrderedDict()  # key -> bytes, least recently used first
+        self._missing = OrderedDict()  # archive path -> key of its version without a cover, LRU first
+        os.makedirs(directory, exist_ok=True)
+        files = []
+        for shard in os.scandir(directory):
+            if shard.is_dir():
+                for entry in os.scandir(shard.path):
+                    if entry.name.endswith('.jpg'):
+                        st = entry.stat()
+                        files.append((st.st_mtime, entry.name[:-4], st.st_size))
+        # Files are touched when served: their mtime orders the LRU across restarts
+        for _, key, size in sorted(files):
+            self._sizes[key] = size
+            self.total_bytes += size
+        self._evict()
+
+    def path(self, key):
+        return os.path.join(self.directory, key[:2], f'{key}.jpg')
+
+    def get(self, key):
+        """Return the JPEG bytes stored under ``key``, or None."""
+        with self._lock:
+            if key not in self._sizes:
+                return None
+            self._sizes.move_to_end(key)
+        try:
+            with open(self.path(key), 'rb') as f:
+                data = f.read()
+            os.utime(self.path(key))
+            return data
+        except OSError:
+            with self._lock:
+                self.total_bytes -= self._sizes.pop(key, 0)
+            return None
+
+    def put(self, key, data):
+        path = self.path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        with self._lock:
+            self.total_bytes += len(data) - self._sizes.pop(key, 0)
+            self._sizes[key] = len(data)
+        self._evict()
+
+    def is_missing(self, file_path, key):
+        """Return True if ``key`` is the version of ``file_path`` last found without a decodable cover."""
+        with self._lock:
+            if self._missing.get(file_path) != key:
+                return False
+            self._missing.move_to_end(file_path)
+            return True
+
+    def add_missing(self, file_path, key):
+        with self._lock:
+            self._missing.pop(file_path, None)  # A modified archive replaces its previous key
+            self._missing[file_path] = key
+            while len(self._missing) > self.max_missing:
+                self._missing.popitem(last=False)
+
+    def _evict(self):
+        while True:
+            with self._lock:
+                if self.total_bytes <= self.max_bytes or len(self._sizes) <= 1:
+                    return
+                key, size = self._sizes.popitem(last=False)
+                self.total_bytes -= size
+            try:
+                os.remove(self.path(key))
+            except OSError:
+                pass
+
+thumbnail_cache = ThumbnailCache(os.path.join(CACHE_DIR, 'thumbnails'), THUMBNAIL_CACHE_BYTES)
+_thumbnail_inflight = SingleFlight()
+_thumbnail_pool = ThreadPoolExecutor(max_workers=max(THUMBNAIL_WORKERS, 1), thread_name_prefix='thumbnail')
+
+def thumbnail_key(file_path, st):
+    identity = f'{os.path.abspath(file_path)}\0{st.st_mtime_ns}\0{st.st_size}\0{THUMBNAIL_WIDTH}x{THUMBNAIL_HEIGHT}@{THUMBNAIL_QUALITY}'
+    return hashlib.sha1(identity.encode('utf-8')).hexdigest()
+
+def render_thumbnail(file_path):
+    """Downscale the cover (first image in natural order) of an archive to JPEG bytes; None without one.
+
+    Only the cover member is read, streamed from the archive into the decoder. JPEG covers are
+    decoded at a reduced scale directly (``draft``), without a full size decode.
+    """
+    try:
+        with open_archive(file_path) as archive:
+            members = image_members(archive)
+            if not members:
+                return None
+            with archive.open(members[0]) as member:
+                image = Image.open(member)
+                image.draft('RGB', (THUMBNAIL_WIDTH, THUMBNAIL_HEIGHT))
+                image.load()  # While the member is open: covers smaller than the box are not resized
+                image.thumbnail((THUMBNAIL_WIDTH, THUMBNAIL_HEIGHT))
+                if image.mode != 'RGB':
+                    image = image.convert('RGB')
+        archive_io_bytes.inc('thumbnail', amount=members[0].file_size)
+        output = io.BytesIO()
+        image.save(output, 'JPEG', quality=THUMBNAIL_QUALITY, optimize=True)
+        return output.getvalue()
+    except (zipfile.BadZipFile, rarfile.Error, OSError) as e:
+        thumbnail_log.warning('Erreur lors de la génération de la miniature', path=file_path, error=str(e))
+        return None
+
+def get_thumbnail(file_path):
+    """Return ``(key, jpeg_bytes)`` for an archive, generating the thumbnail on a cache miss.
+
+    ``jpeg_bytes`` is None when the archive has no usable cover. Concurrent requests for the same
+    archive share one generation.
+    """
+    file_path = os.path.abspath(file_path)
+    key = thumbnail_key(file_path, os.stat(file_path))
+    data = thumbnail_cache.get(key)
+    if data is not None or thumbnail_cache.is_missing(file_path, key):
+        cache_requests.inc('thumbnail', 'hit')
+        return key, data
+    cache_requests.inc('thumbnail', 'miss')
+
+    def generate():
+        data = thumbnail_cache.get(key)
+        if data is not None:
+            return data
+        data = render_thumbnail(file_path)
+        if data is None:
+            thumbnail_cache.add_missing(file_path, key)
+        else:
+            thumbnail_cache.put(key, data)
+        return data
+    return key, _thumbnail_inflight.do(key, generate)
+
+def _prefetch_thumbnail(file_path):
+    try:
+        get_thumbnail(file_path)
+    except OSError:
+        pass  # Gone since the scan
+
+def prefetch_thumbnails(changes):
+    """Library listener: generate the thumbnails of new, modified or renamed archives in the background."""
+    for change in changes:
+        if change['kind'] == 'file' and change['type'] != 'remove':
+            _thumbnail_pool.submit(_prefetch_thumbnail, change['path'])
+
+if THUMBNAIL_PREFETCH:
+    library_index.add_listener(prefetch_thumbnails)
+
+# --- Thumbnails --- END ---
+
+# --- Page Reader --- START ---
+
+PAGE_CHUNK_SIZE = 256 * 1024
+IMAGE_MIMETYPES = {'.jpg': 'image/jpeg', '.jpeg': 'image/jpeg', '.png': 'image/png',
+                   '.webp': 'image/webp', '.gif': 'image/gif', '.bmp': 'image/bmp'}
+_RAR_SPLIT_FLAGS = rarfile.RAR_FILE_SPLIT_BEFORE | rarfile.RAR_FILE_SPLIT_AFTER
+
+class ArchivePages:
+    """An archive opened for page reads: its image members in natural order and an mmap of the file.
+
+    Pages stored without compression are served as slices of the mmap at their data offset;
+    the others are decompressed as a stream. Requests ``acquire()`` the handle and ``release()``
+    it when done; once ``retire()``d by the cache, it is closed by the last release.
+    """
+
+    def __init__(self, file_path, signature):
+        self.signature = signature
+        self.archive = open_archive(file_path)
+        try:
+            self.pages = image_members(self.archive)
+            with open(file_path, 'rb') as f:
+                self.mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except BaseException:
+            self.archive.close()
+            raise
+        self._offsets = {}
+        self._lock = threading.Lock()
+        self._users = 0
+        self._retired = False
+        self.closed = False
+
+    def acquire(self):
+        """Take a reference for a request; returns False if the handle is already retired."""
+        with self._lock:
+            if self._retired:
+                return False
+            self._users += 1
+            return True
+
+    def release(self):
+        with self._lock:
+            self._users -= 1
+            close = self._retired and self._users == 0
+        if close:
+            self.close()
+
+    def retire(self):
+        """Drop the reference of the cache: close now, or when the last request releases the handle."""
+        with self._lock:
+            self._retired = True
+            close = self._users == 0
+        if close:
+            self.close()
+
+    def close(self):
+        with self._lock:
+            if self.closed:
+                return
+            self.closed = True
+        self.archive.close()
+        self.mmap.close()
+
+    def stored_offset(self, info):
+        """Offset of the page bytes in the file if the member is stored as is, else None."""
+        if isinstance(info, zipfile.ZipInfo):
+            if info.compress_type != zipfile.ZIP_STORED or info.flag_bits & 0x1:
+                return None
+            with self._lock:
+                if info.filename not in self._offsets:
+                    # The mmap position is only used here, under the lock
+                    self._offsets[info.filename] = zip_data_offset(self.mmap, info)
+                return self._offsets[info.filename]
+        if (info.compress_type == rarfile.RAR_M0 and not info.needs_password()
+                and info.file_redir is None and not info.flags & _RAR_SPLIT_FLAGS):
+            return info.data_offset
+        return None
+
+    def iter_page(self, info, start, end):
+        """Yield the bytes ``[start, end)`` of a page, one chunk at a time."""
+        offset = self.stored_offset(info)
+        if offset is not None:
+            for position in range(offset + start, offset + end, PAGE_CHUNK_SIZE):
+                chunk = self.mmap[position:min(position + PAGE_CHUNK_SIZE, offset + end)]
+                archive_io_bytes.inc('page', amount=len(chunk))
+                yield chunk
+            return
+        with self.archive.open(info) as member:
+            if start:
+                member.seek(start)  # Decompresses and drops what precedes the range
+            remaining = end - start
+            while remaining > 0:
+                data = member.read(min(PAGE_CHUNK_SIZE, remaining))
+                if not data:
+                    return
+                remaining -= len(data)
+                archive_io_bytes.inc('page', amount=len(data))
+                yield data
+
+class ArchiveHandleCache:
+    """LRU of ArchivePages by path, reopened when the archive's mtime or size changes.
+
+    ``get()`` returns an acquired handle the caller must ``release()``. Evicted, outdated and
+    invalidated handles are retired, so their file descriptor and mmap are closed as soon as
+    no request reads from them anymore.
+    """
+
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._handles = OrderedDict()
+
+    def get(self, file_path):
+        st = os.stat(file_path)
+        key, signature = os.path.abspath(file_path), (st.st_mtime_ns, st.st_size)
+        with self._lock:
+            handle = self._handles.get(key)
+            if handle is not None and handle.signature == signature and handle.acquire():
+                self._handles.move_to_end(key)
+                cache_requests.inc('archive-handle', 'hit')
+                return handle
+        cache_requests.inc('archive-handle', 'miss')
+        handle = ArchivePages(file_path, signature)
+        handle.acquire()
+        retired = []
+        with self._lock:
+            previous = self._handles.pop(key, None)
+            if previous is not None:
+                retired.append(previous)
+            self._handles[key] = handle
+            while len(self._handles) > self.max_entries:
+                retired.append(self._handles.popitem(last=False)[1])
+        for old in retired:
+            old.retire()
+        return handle
+
+    def invalidate(self, path):
+        """Retire the handles of ``path`` and, if it is a directory, of the archives below it."""
+        path = os.path.abspath(path)
+        prefix = path.rstrip(os.sep) + os.sep
+        with self._lock:
+            keys = [key for key in self._handles if key == path or key.startswith(prefix)]
+            retired = [self._handles.pop(key) for key in keys]
+        for handle in retired:
+            handle.retire()
+
+    def on_library_changes(self, changes):
+        """LibraryIndex listener: archives rewritten, renamed or removed must not keep their old handle."""
+        for change in changes:
+            self.invalidate(change['path'])
+            if change.get('oldPath'):
+                self.invalidate(change['oldPath'])
+
+archive_handles = ArchiveHandleCache(max(ARCHIVE_HANDLE_CACHE_SIZE, 1))
+library_index.add_listener(archive_handles.on_library_changes)
+
+# --- Page Reader --- END ---
+
+# --- Batch Rename --- START ---
+
+rename_log = get_logger('rename')
+
+RENAME_JOURNAL_DIR = os.path.join(CACHE_DIR, 'rename-journal')
+# Characters dropped from template values (path separators and what Windows shares refuse)
+_UNSAFE_NAME_CHARS = re.compile(r'[\\/:*?"<>|\x00-\x1f]')
+_VOLUME_IN_NAME = re.compile(r'(?:\btome|\bvol(?:ume)?\.?|\bt|\bv)\s*(\d+)', re.IGNORECASE)
+_rename_lock = threading.Lock()
+
+def volume_from_name(stem):
+    """Volume number found in a file name ("Tome 3", "v03", else the last number), or None."""
+    match = _VOLUME_IN_NAME.search(stem)
+    if match:
+        return int(match.group(1))
+    numbers = re.findall(r'\d+', stem)
+    return int(numbers[-1]) if numbers else None
+
+def rename_template_fields(file_path, index, metadata, series=None):
+    """Values available to /rename/batch templates for one archive."""
+    metadata = metadata or {}
+    stem, ext = os.path.splitext(os.path.basename(file_path))
+    volume = metadata.get('Volume') or metadata.get('Number') or volume_from_name(stem) or index
+    if isinstance(volume, str) and volume.strip().isdigit():
+        volume = int(volume)
+    fields = {
+        'series': series or metadata.get('Series') or os.path.basename(os.path.dirname(file_path)),
+        'title': metadata.get('Title') or '',
+        'number': metadata.get('Number') or '',
+        'volume': volume,
+        'index': index,
+        'name': stem,
+        'ext': ext,
+    }
+    return {key: _UNSAFE_NAME_CHARS.sub('', value).strip() if isinstance(value, str) else value
+            for key, value in fields.items()}
+
+class RenameTemplateFormatter(string.Formatter):
+    """``str.format`` restricted to plain field names: ``{volume.real}`` or ``{name[0]}`` are refused."""
+
+    def get_field(self, field_name, args, kwargs):
+        if not field_name.isidentifier():
+            raise ValueError(f"champ '{field_name}' non autorisé")
+        return super().get_field(field_name, args, kwargs)
+
+_rename_formatter = RenameTemplateFormatter()
+
+def render_rename_template(template, fields):
+    """Format ``template`` (``str.format`` syntax); the original extension is added when missing."""
+    name = _rename_formatter.vformat(template, (), fields).strip()
+    if not name.lower().endswith(ARCHIVE_EXTENSIONS):
+        name += fields['ext']
+    return name
+
+def _rename_name_error(name):
+    if not name or name in ('.', '..') or '/' in name or os.sep in name or '\0' in name:
+        return 'nom invalide'
+    if not name.lower().endswith(ARCHIVE_EXTENSIONS):
+        return "l'extension doit être .cbz ou .cbr"
+    return None
+
+def order_rename_steps(moves, temp_name):
+    """Order ``{source: target}`` moves so that no step overwrites a file that still has to move.
+
+    Cycles (A -> B -> A) are broken by moving one of their files to ``temp_name(source)`` first.
+    Returns ``(steps, cycles)``.
+    """
+    pending, steps, cycles = dict(moves), [], 0
+    while pending:
+        ready = [source for source, target in pending.items() if target not in pending]
+        if ready:
+            for source in ready:
+                steps.append((source, pending.pop(source)))
+            continue
+        # Only cycles are left: park one file of a cycle under a temporary name
+        source = next(iter(pending))
+        temp_path = temp_name(source)
+        steps.append((source, temp_path))
+        pending[temp_path] = pending.pop(source)
+        cycles += 1
+    return steps, cycles
+
+def _rename_target_free(source, target, moves):
+    if target in moves:
+        return True  # Its current file moves away first
+    if os.path.lexists(target):
+        return os.path.samefile(source, target)  # Case-only rename on a case-insensitive disk
+    # An orphan sidecar would be adopted by the renamed archive
+    return not (target.endswith(SIDECAR_EXTENSIONS) and os.path.lexists(sidecar_path(target)))
+
+def plan_batch_rename(folder_path, targets):
+    """Check the ``[(source path, new name)]`` renames of a folder and order them.
+
+    Returns the plan: ``renames`` (``{from, to}``), ``unchanged``, ``conflicts`` (``{from, to,
+    reason}``: invalid name, two files to one name, or an existing file that does not move away),
+    ``cycles`` and the ordered ``steps`` (temporary names included).
+    """
+    conflicts, unchanged = [], 0
+    by_target = {}
+    for source, new_name in targets:
+        target = os.path.join(folder_path, new_name)
+        if target == source:
+            unchanged += 1
+            continue
+        error = _rename_name_error(new_name)
+        if error:
+            conflicts.append({'from': source, 'to': target, 'reason': error})
+            continue
+        by_target.setdefault(new_name.casefold(), []).append((source, target))
+
+    moves = {}
+    for group in by_target.values():
+        if len(group) > 1:
+            conflicts.extend({'from': source, 'to': target, 'reason': 'plusieurs fichiers vers le même nom'}
+                             for source, target in group)
+        else:
+            moves[group[0][0]] = group[0][1]
+    # A target may only be taken by a file that moves away itself (which may in turn be blocked)
+    blocked = True
+    while blocked:
+        blocked = [source for source, target in moves.items() if not _rename_target_free(source, target, moves)]
+        for source in blocked:
+            conflicts.append({'from': source, 'to': moves.pop(source), 'reason': 'le fichier existe déjà'})
+    renames = [{'from': source, 'to': target} for source, target in moves.items()]
+
+    batch_id = uuid.uuid4().hex[:8]
+    steps, cycles = order_rename_steps(
+        moves,
+        lambda source: os.path.join(folder_path, f'.renaming-{batch_id}-{os.path.basename(source)}'))
+    return {'folderPath': folder_path, 'renames': renames, 'unchanged': unchanged,
+            'conflicts': conflicts, 'cycles': cycles, 'steps': steps}
+
+def _move_archive(source, target):
+    """Rename an archive with its sidecar and carry the index and metadata cache along."""
+    os.rename(source, target)
+    if has_sidecar(source) and target.endswith(SIDECAR_EXTENSIONS):
+        try:
+            os.rename(sidecar_path(source), sidecar_path(target))
+        except OSError:
+            os.rename(target, source)
+            raise
+    metadata_cache.move(source, target)
+    if library_index.contains(target) and not library_index.rename(source, target):
+        library_index.update_file(target)
+
+class RenameJournal:
+    """Append-only record of a batch rename, so that an interrupted batch can be undone.
+
+    The first line holds the planned steps, each following line the index of a finished step
+    (``done``) or of a step rolled back (``undone``). The file is removed once the batch completed
+    or was fully rolled back; otherwise it is kept for recover_rename_journals.
+    """
+
+    def __init__(self, path):
+        self.path = path
+
+    def begin(self, steps):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        self._file = open(self.path, 'w', encoding='utf-8')
+        self._write({'steps': steps})
+
+    def resume(self):
+        """Reopen a journal left behind, to record the steps undone by the recovery."""
+        self._file = open(self.path, 'a', encoding='utf-8')
+        self._file.write('\n')  # Ends a torn last line, if any
+
+    def step_done(self, index):
+        self._write({'done': index})
+
+    def step_undone(self, index):
+        self._write({'undone': index})
+
+    def _write(self, record):
+        self._file.write(json.dumps(record) + '\n')
+        self._file.flush()
+        os.fsync(self._file.fileno())
+
+    def close(self, keep=False):
+        """Close the journal; it is removed unless ``keep`` (steps are left to undo)."""
+        self._file.close()
+        if not keep:
+            os.remove(self.path)
+
+    @staticmethod
+    def read(path):
+        """Return ``(steps, finished step indexes not undone yet)`` of a journal left behind."""
+        steps, done = [], []
+        with open(path, encoding='utf-8') as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue  # Torn or blank line
+                steps = record.get('steps', steps)
+                if 'done' in record:
+                    done.append(record['done'])
+                elif record.get('undone') in done:
+                    done.remove(record['undone'])
+        return steps, done
+
+def _undo_steps(steps, done, journal):
+    """Reverse the finished steps, most recent first, recording each one in ``journal``.
+
+    Returns the steps that could not be undone.
+    """
+    failed = []
+    for index in reversed(done):
+        source, target = steps[index]
+        # Undone before a crash that kept it from being recorded
+        if not os.path.lexists(target) and os.path.lexists(source):
+            journal.step_undone(index)
+            continue
+        try:
+            if os.path.lexists(source) and not os.path.samefile(target, source):
+                raise FileExistsError(f"'{source}' existe déjà")
+            _move_archive(target, source)
+        except OSError as e:
+            rename_log.error("Impossible d'annuler le renommage", source=target, target=source, error=str(e))
+            failed.append({'from': target, 'to': source, 'error': str(e)})
+            continue
+        journal.step_undone(index)
+    return failed
+
+def apply_batch_rename(plan):
+    """Run the steps of a plan in one pass, journaled; on error the finished steps are undone.
+
+    Returns ``(success, error details)``.
+    """
+    steps = plan['steps']
+    journal = RenameJournal(os.path.join(RENAME_JOURNAL_DIR, f'{uuid.uuid4().hex}.jsonl'))
+    with _rename_lock:
+        journal.begin(steps)
+        # Kept unless the batch completed or was rolled back (an unexpected error leaves it to the recovery)
+        keep_journal = True
+        try:
+            done = []
+            for index, (source, target) in enumerate(steps):
+                try:
+                    if os.path.lexists(target) and not os.path.samefile(source, target):
+                        raise FileExistsError(f"'{target}' existe déjà")
+                    _move_archive(source, target)
+                except OSError as e:
+                    rename_log.warning('Échec du renommage, annulation du lot', source=source, target=target, error=str(e))
+                    failed = _undo_steps(steps, done, journal)
+                    keep_journal = bool(failed)
+                    return False, {'error': str(e), 'from': source, 'to': target,
+                                   'rolledBack': not failed, 'rollbackErrors': failed}
+                done.append(index)
+                journal.step_done(index)
+            keep_journal = False
+        finally:
+            journal.close(keep=keep_journal)
+    return True, None
+
+def recover_rename_journals():
+    """Undo the batch renames interrupted by a crash (called by the server entry points)."""
+    if not os.path.isdir(RENAME_JOURNAL_DIR):
+        return
+    for name in os.listdir(RENAME_JOURNAL_DIR):
+        path = os.path.join(RENAME_JOURNAL_DIR, name)
+        steps, done = RenameJournal.read(path)
+        rename_log.warning('Lot interrompu trouvé, annulation', journal=name, done=len(done), steps=len(steps))
+        # The step after the last recorded one may have been done without being recorded
+        following = max(done) + 1 if done else 0
+        if following < len(steps) and os.path.lexists(steps[following][1]) and not os.path.lexists(steps[following][0]):
+            done.append(following)
+        journal = RenameJournal(path)
+        journal.resume()
+        journal.close(keep=bool(_undo_steps(steps, done, journal)))
+
+# --- Batch Rename --- END ---
+
+# --- Batch Metadata Writes --- START ---
+
+METADATA_WRITE_WORKERS = int(os.getenv('METADATA_WRITE_WORKERS', str(min(os.cpu_count() or 1, 8))))
+# Number of finished batches kept in memory for polling
+METADATA_BATCH_HISTORY = 50
+
+_metadata_write_pool = None
+_metadata_write_pool_lock = threading.Lock()
+_metadata_batches = {}
+_metadata_batches_lock = threading.Lock()
+
+def process_pool_context():
+    """Start method of the process pools: forkserver, or spawn where it is unavailable.
+
+    Forking this threaded process could leave a lock (SQLite, logging...) held forever in the
+    child. The tasks live in archive_workers, which the forkserver preloads.
+    """
+    if 'forkserver' not in multiprocessing.get_all_start_methods():
+        return multiprocessing.get_context('spawn')
+    context = multiprocessing.get_context('forkserver')
+    context.set_forkserver_preload(['archive_workers'])
+    return context
+
+def get_metadata_write_pool():
+    """Lazily create the bounded process pool used for archive rewrites."""
+    global _metadata_write_pool
+    with _metadata_write_pool_lock:
+        if _metadata_write_pool is None:
+            _metadata_write_pool = ProcessPoolExecutor(max_workers=max(METADATA_WRITE_WORKERS, 1),
+                                                       mp_context=process_pool_context())
+        return _metadata_write_pool
+
+def reset_metadata_write_pool(broken):
+    """Drop the write pool if it still is ``broken``; get_metadata_write_pool() then starts a new one."""
+    global _metadata_write_pool
+    with _metadata_write_pool_lock:
+        if _metadata_write_pool is broken:
+            _metadata_write_pool = None
+    broken.shutdown(wait=False)
+
+def submit_to_process_pool(get_pool, reset_pool, fn, *args):
+    """Submit ``fn(*args)`` to the pool of ``get_pool()`` and return a Future of its result.
+
+    A dead worker leaves the pool broken (BrokenProcessPool for every task, queued or new): the
+    pool is then replaced through ``reset_pool(pool)`` and the task retried once on the new one.
+    """
+    result = Future()
 
-def title_to_slug(title):
-    """Convert title to a URL slug."""
-    normalized = unidecode(title)
-    no_symbols = re.sub(r'[^a-zA-Z0-9 ]', '', normalized)
-    slug = re.sub(r'\s+', '-', no_symbols.strip())
-    return slug
+    def attempt(retried):
+        pool = get_pool()
+        try:
+            future = pool.submit(fn, *args)
+        except BrokenProcessPool as e:
+            reset_pool(pool)
+            if retried:
+                result.set_exception(e)
+            else:
+                attempt(True)
+            return
+        future.add_done_callback(lambda f: finished(pool, f, retried))
 
-def check_slug_exists(slug):
-    """Check if a direct slug URL exists on Manga-News."""
-    url = f"https://www.manga-news.com/index.php/serie/{slug}"
-    print(f'Trying slug URL: {url}')
+    def finished(pool, future, retried):
+        error = future.exception()
+        if isinstance(error, BrokenProcessPool):
+            reset_pool(pool)
+            if not retried:
+                attempt(True)
+                return
+        if error is not None:
+            result.set_exception(error)
+        else:
+            result.set_result(future.result())
+
+    attempt(False)
+    return result
+
+class MetadataBatch:
+    """Progress and per-file results of one /update-cbz/batch request."""
+
+    def __init__(self, entries):
+        self.id = uuid.uuid4().hex
+        self.entries = entries
+        self.results = []
+        self.created = time.time()
+        self.finished = None
+        self._condition = threading.Condition()
+
+    @property
+    def done(self):
+        return self.finished is not None
+
+    def add_result(self, result):
+        with self._condition:
+            self.results.append(result)
+            if len(self.results) == len(self.entries):
+                self.finished = time.time()
+            self._condition.notify_all()
+
+    def wait(self, timeout=None):
+        """Block until every file of the batch has a result."""
+        with self._condition:
+            return self._condition.wait_for(lambda: self.done, timeout=timeout)
+
+    def wait_for_results(self, count, timeout=None):
+        """Block until more than ``count`` results are available (or the batch is done)."""
+        with self._condition:
+            self._condition.wait_for(lambda: len(self.results) > count or self.done, timeout=timeout)
+            return list(self.results[count:])
+
+    def to_dict(self):
+        with self._condition:
+            results = list(self.results)
+        return {
+            'batchId': self.id,
+            'total': len(self.entries),
+            'completed': len(results),
+            'failed': sum(1 for r in results if not r['success']),
+            'done': self.done,
+            'results': results,
+        }
+
+def _on_metadata_write_done(batch, entry, future):
+    file_path = entry['filePath']
     try:
-        response = requests.get(url, timeout=10)
-        return response.status_code == 200
-    except requests.exceptions.RequestException as e:
-        print(f'Error checking slug existence: {e}')
-        return False
+        summary = future.result()
+        count_written_archive(summary)
+        if entry.get('comicInfoXML') is not None:
+            remember_written_metadata(file_path, entry['comicInfoXML'], summary)
+        else:
+            metadata_cache.evict(file_path)
+        library_index.update_file(file_path)
+        if summary.get('newPath'):
+            library_index.update_file(summary['newPath'])
+        result = {'filePath': file_path, 'success': True, **summary}
+    except Exception as e:
+        result = {'filePath': file_path, 'success': False, 'error': str(e)}
+    batch.add_result(result)
 
-def search_slug_with_duckduckgo(title):
-    """Search DuckDuckGo HTML version for the Manga-News slug and path type.""" # Updated docstring
-    query = urllib.parse.quote(f"site:manga-news.com {title}")
-    search_url = f"https://html.duckduckgo.com/html/?q={query}"
-    print(f'[DDG Search] Searching URL: {search_url}')
+def start_metadata_batch(entries, task=write_entry_metadata):
+    """Submit ``task(entry)`` for every entry to the process pool and return the batch.
+
+    ``task`` must be a function of archive_workers so the workers can unpickle it.
+    """
+    batch = MetadataBatch(entries)
+    with _metadata_batches_lock:
+        _metadata_batches[batch.id] = batch
+        finished = sorted((b for b in _metadata_batches.values() if b.done), key=lambda b: b.finished)
+        for old in finished[:max(len(finished) - METADATA_BATCH_HISTORY, 0)]:
+            del _metadata_batches[old.id]
+
+    for entry in entries:
+        future = submit_to_process_pool(get_metadata_write_pool, reset_metadata_write_pool, task, entry)
+        future.add_done_callback(lambda f, entry=entry: _on_metadata_write_done(batch, entry, f))
+    return batch
 
+# --- Batch Metadata Writes --- END ---
+
+# --- Integrity Scanner --- START ---
+
+integrity_log = get_logger('integrity')
+
+INTEGRITY_WORKERS = int(os.getenv('INTEGRITY_WORKERS', '2'))
+# Read budget of the whole scan in MB/s, shared between the workers (0: unlimited)
+INTEGRITY_IO_RATE = float(os.getenv('INTEGRITY_IO_RATE', '50'))
+# Pages found in more archives than this (credits, blank pages) are ignored by the near-duplicate search
+NEAR_DUPLICATE_MAX_SHARING = 20
+
+class IntegrityStore:
+    """SQLite table of the last integrity check of each archive, keyed by path with mtime and size."""
+
+    def __init__(self, db_path):
+        os.makedirs(os.path.dirname(db_path) or '.', exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        self._conn.execute('''
+            CREATE TABLE IF NOT EXISTS integrity (
+                path TEXT PRIMARY KEY,
+                mtime REAL NOT NULL,
+                size INTEGER NOT NULL,
+                verified INTEGER NOT NULL,
+                status TEXT NOT NULL,
+                error TEXT,
+                fingerprint TEXT,
+                members TEXT NOT NULL,
+                checked REAL NOT NULL
+            )
+        ''')
+        self._conn.execute('CREATE INDEX IF NOT EXISTS integrity_fingerprint ON integrity(fingerprint)')
+
+    def signatures(self, path):
+        """``{archive: (mtime, size, verified)}`` of the stored checks below ``path``."""
+        clause, params = _subtree_clause('path', path)
+        with self._lock:
+            rows = self._conn.execute(f'SELECT path, mtime, size, verified FROM integrity WHERE {clause}', params)
+            return {row[0]: (row[1], row[2], bool(row[3])) for row in rows}
+
+    def put(self, path, mtime, size, verified, result):
+        with self._lock, self._conn:
+            self._conn.execute(
+                'INSERT OR REPLACE INTO integrity (path, mtime, size, verified, status, error, fingerprint, members, checked)'
+                ' VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                (path, mtime, size, verified, result['status'], result['error'], result['fingerprint'],
+                 json.dumps(result['members']), time.time()))
+
+    def forget(self, paths):
+        with self._lock, self._conn:
+            self._conn.executemany('DELETE FROM integrity WHERE path = ?', [(path,) for path in paths])
+
+    def rows(self):
+        with self._lock:
+            return self._conn.execute('SELECT path, status, error, fingerprint, members FROM integrity ORDER BY path').fetchall()
+
+def find_duplicates(rows, min_similarity):
+    """Group archives by fingerprint (exact duplicates) and pair the ones sharing most of their pages.
+
+    ``rows`` are ``(path, fingerprint, members)``. The near-duplicate similarity is the Jaccard
+    index of the (CRC, size) member sets; only archives sharing at least one page are compared.
+    """
+    by_fingerprint, postings, member_sets = {}, {}, {}
+    for path, fingerprint, members in rows:
+        if not fingerprint:
+            continue
+        by_fingerprint.setdefault(fingerprint, []).append(path)
+        member_sets[path] = {tuple(member) for member in members}
+    duplicates = [{'fingerprint': fingerprint, 'files': paths}
+                  for fingerprint, paths in by_fingerprint.items() if len(paths) > 1]
+
+    # One representative per exact duplicate group
+    for paths in by_fingerprint.values():
+        for member in member_sets[paths[0]]:
+            postings.setdefault(member, []).append(paths[0])
+    shared = {}
+    for paths in postings.values():
+        if len(paths) > NEAR_DUPLICATE_MAX_SHARING:
+            continue
+        for i, first in enumerate(paths):
+            for second in paths[i + 1:]:
+                shared[(first, second)] = shared.get((first, second), 0) + 1
+    near_duplicates = []
+    for (first, second), count in shared.items():
+        similarity = count / len(member_sets[first] | member_sets[second])
+        if similarity >= min_similarity:
+            near_duplicates.append({'files': [first, second], 'similarity': round(similarity, 4)})
+    near_duplicates.sort(key=lambda pair: pair['similarity'], reverse=True)
+    return duplicates, near_duplicates
+
+class IntegrityScan:
+    """Progress of one background integrity scan."""
+
+    def __init__(self, path, force, verify):
+        self.id = uuid.uuid4().hex
+        self.path = path
+        self.force = force
+        self.verify = verify
+        self.total = 0
+        self.checked = 0
+        self.skipped = 0
+        self.corrupt = 0
+        self.started = time.time()
+        self.finished = None
+        self.error = None
+
+    def to_dict(self):
+        return {'scanId': self.id, 'path': self.path, 'verify': self.verify, 'running': self.finished is None,
+                'total': self.total, 'checked': self.checked, 'skipped': self.skipped, 'corrupt': self.corrupt,
+                'started': self.started, 'finished': self.finished, 'error': self.error}
+
+integrity_store = IntegrityStore(os.path.join(CACHE_DIR, 'integrity.sqlite3'))
+_integrity_pool = None
+_integrity_scan = None
+_integrity_scan_lock = threading.Lock()
+
+def get_integrity_pool():
+    """Lazily create the process pool of the integrity scanner."""
+    global _integrity_pool
+    with _integrity_scan_lock:
+        if _integrity_pool is None:
+            _integrity_pool = ProcessPoolExecutor(max_workers=max(INTEGRITY_WORKERS, 1),
+                                                  mp_context=process_pool_context())
+        return _integrity_pool
+
+def reset_integrity_pool(broken):
+    """Drop the integrity pool if it still is ``broken``; get_integrity_pool() then starts a new one."""
+    global _integrity_pool
+    with _integrity_scan_lock:
+        if _integrity_pool is broken:
+            _integrity_pool = None
+    broken.shutdown(wait=False)
+
+def _run_integrity_scan(scan):
     try:
-        headers = {'User-Agent': 'Mozilla/5.0', 'Accept-Language': 'fr-FR,fr;q=0.9'}
-        response = requests.get(search_url, headers=headers, timeout=15)
-        response.raise_for_status()
-        print(f'[DDG Search] Response status: {response.status_code}')
+        library_index.scan(scan.path)
+        archives = library_index.archives(scan.path)
+        known = integrity_store.signatures(scan.path)
+        todo, present = [], []
+        for path, mtime, size in archives:
+            # The index only revisits directories whose mtime changed: an archive overwritten in
+            # place keeps a stale row, so the decision is taken on a fresh stat
+            try:
+                st = os.stat(path)
+            except OSError:
+                library_index.update_file(path)
+                continue
+            if (st.st_mtime, st.st_size) != (mtime, size):
+                library_index.update_file(path)
+                mtime, size = st.st_mtime, st.st_size
+            present.append(path)
+            previous = known.get(path)
+            # Unchanged archives keep their fingerprint (and their CRC check, if one was made)
+            if not scan.force and previous and previous[:2] == (mtime, size) and (previous[2] or not scan.verify):
+                scan.skipped += 1
+            else:
+                todo.append((path, mtime, size))
+        integrity_store.forget(set(known) - set(present))
+        scan.total = len(present)
+        byte_rate = INTEGRITY_IO_RATE * 1024 * 1024 / max(INTEGRITY_WORKERS, 1)
+        futures = {submit_to_process_pool(get_integrity_pool, reset_integrity_pool,
+                                          check_archive_integrity, path, byte_rate, scan.verify): (path, mtime, size)
+                   for path, mtime, size in todo}
+        for future in as_completed(futures):
+            path, mtime, size = futures[future]
+            try:
+                result = future.result()
+            except Exception as e:
+                result = {'status': 'unreadable', 'error': str(e), 'fingerprint': None, 'members': [], 'bytes': 0}
+            archive_io_bytes.inc('integrity', amount=result['bytes'])
+            integrity_store.put(path, mtime, size, scan.verify, result)
+            scan.checked += 1
+            if result['status'] == 'corrupt':
+                scan.corrupt += 1
+                integrity_log.warning('Archive corrompue', path=path, error=result['error'])
+    except Exception as e:
+        scan.error = str(e)
+        integrity_log.exception('Erreur du scan', path=scan.path)
+    finally:
+        scan.finished = time.time()
 
-        soup = BeautifulSoup(response.text, 'html.parser')
-        potential_matches = [] # Store tuples of (link, path_type, slug)
-        # Allow optional trailing slash
-        link_pattern = re.compile(r'https://www\\.manga-news\\.com/index\\.php/(serie|serie-vo)/([^/]+)/?$')
+def start_integrity_scan(path=None, force=False, verify=True):
+    """Start a background scan of ``path`` (default: the whole library); returns None if one is running."""
+    global _integrity_scan
+    with _integrity_scan_lock:
+        if _integrity_scan is not None and _integrity_scan.finished is None:
+            return None
+        _integrity_scan = IntegrityScan(os.path.normpath(path or FILES_PATH), force, verify)
+    threading.Thread(target=_run_integrity_scan, args=(_integrity_scan,), name='integrity-scan', daemon=True).start()
+    return _integrity_scan
 
-        print("[DDG Search] Raw links found:") # Log header
-        all_links = soup.find_all('a', class_='result__url')
-        if not all_links:
-            print("[DDG Search]   Selector 'a.result__url' found no elements.")
-        else:
-            for a_tag in all_links:
-                href = a_tag.get_text(strip=True)
-                print(f"[DDG Search]   Raw href: {href}") # Log each raw link
-                match = link_pattern.search(href)
-                if match:
-                     path_type = match.group(1)
-                     slug = match.group(2)
-                     print(f'[DDG Search]     -> Matched! Path: {path_type}, Slug: {slug}') # Log match success
-                     potential_matches.append({'link': href, 'path_type': path_type, 'slug': slug})
-                # else: # Optional: Log non-matches
-                #     print(f'[DDG Search]     -> No match with regex.')
-
-        print(f'[DDG Search] Filtered potential matches: {potential_matches}')
-
-        if not potential_matches:
-            print('[DDG Search] No valid links found on DuckDuckGo.')
-            return None # Return None if no matches
-
-        normalized_title = normalize_text(title)
-        print(f'[DDG Search] Normalized title: {normalized_title}')
-        best_match_info = None # Will store {'path_type': ..., 'slug': ...}
-        best_distance = float('inf')
-        max_allowed_distance = len(normalized_title) * 0.4
-        print(f'[DDG Search] Max allowed distance for fuzzy match: {max_allowed_distance}')
-
-        for match_info in potential_matches:
-            slug = match_info['slug']
-            path_type = match_info['path_type']
-            link = match_info['link']
-
-            # Normalize only for comparison
-            normalized_slug_for_comparison = normalize_text(slug.replace('-', ' '))
-            distance = Levenshtein.distance(normalized_title, normalized_slug_for_comparison)
-            print(f'[DDG Search] Testing link: {link} | Extracted slug: {slug} | Path: {path_type} | Normalized slug for comparison: {normalized_slug_for_comparison} | distance = {distance}')
-            if distance < best_distance:
-                best_distance = distance
-                best_match_info = {'path_type': path_type, 'slug': slug} # Store path and original case slug
-                print(f'[DDG Search] New best match: Slug={best_match_info["slug"]}, Path={best_match_info["path_type"]} (distance {best_distance})')
-
-        final_match_info = None
-        if best_match_info is not None and best_distance <= max_allowed_distance:
-            print(f'[DDG Search] Selected best fuzzy match: Slug={best_match_info["slug"]}, Path={best_match_info["path_type"]} (distance {best_distance})')
-            final_match_info = best_match_info
+def integrity_report(min_similarity):
+    """Corrupt / unchecked archives and exact / near duplicates among the archives still in the library."""
+    in_library = {path for path, _, _ in library_index.archives()}
+    rows = [row for row in integrity_store.rows() if row[0] in in_library]
+    problems = {'corrupt': [], 'unreadable': [], 'unchecked': []}
+    for path, status, error, _, _ in rows:
+        if status in problems:
+            problems[status].append({'path': path, 'error': error})
+    duplicates, near_duplicates = find_duplicates(
+        [(path, fingerprint, json.loads(members)) for path, _, _, fingerprint, members in rows], min_similarity)
+    return {'archives': len(rows), **problems, 'duplicates': duplicates, 'nearDuplicates': near_duplicates}
+
+# --- Integrity Scanner --- END ---
+
+# --- Job Queue --- START ---
+
+job_log = get_logger('jobs')
+
+# Finished jobs kept in the job table (the oldest are deleted beyond this)
+JOB_HISTORY = 200
+JOB_ACTIVE_STATUSES = ('queued', 'running')
+
+def parse_job_workers(spec):
+    """Parse ``'type=count,...'`` (JOB_WORKERS) into ``{type: count}``."""
+    workers = {}
+    for part in spec.split(','):
+        name, _, count = part.partition('=')
+        if name.strip() and count.strip():
+            workers[name.strip()] = max(int(count), 1)
+    return workers
+
+def _job_update_metadata(step):
+    return {'filePath': step['filePath'],
+            **update_archive_metadata(step['filePath'], step['comicInfoXML'], step.get('cbrMode'))}
+
+def _job_extract_metadata(step):
+    return {'filePath': step['filePath'], 'metadata': get_archive_metadata(step['filePath'])}
+
+def _job_synopsis(step):
+    match_info, synopsis = get_manga_news_synopsis(step['title'])
+    return {'title': step['title'], 'slug': match_info and match_info['slug'],
+            'pathType': match_info and match_info['path_type'], 'summary': synopsis}
+
+def _job_convert_cbr(step):
+    file_path = step['filePath']
+    new_path = os.path.splitext(file_path)[0] + '.cbz'
+    # Resumed after a restart: the conversion may have completed before the step was recorded
+    if not os.path.exists(file_path) and os.path.exists(new_path):
+        return {'filePath': file_path, 'newPath': new_path}
+    summary = submit_to_process_pool(get_metadata_write_pool, reset_metadata_write_pool,
+                                     convert_cbr_to_cbz, file_path).result()
+    count_written_archive(summary)
+    metadata_cache.evict(file_path)
+    library_index.update_file(file_path)
+    library_index.update_file(summary['newPath'])
+    return {'filePath': file_path, **summary}
+
+# Job type -> (step function, required step fields). A step function gets one step input (a dict)
+# and returns its JSON result; an exception fails that step only.
+JOB_TYPES = {
+    'update-metadata': (_job_update_metadata, ('filePath', 'comicInfoXML')),
+    'extract-metadata': (_job_extract_metadata, ('filePath',)),
+    'synopsis': (_job_synopsis, ('title',)),
+    'convert-cbr': (_job_convert_cbr, ('filePath',)),
+}
+
+class JobStore:
+    """SQLite table of the jobs and of their steps (input, status and result of each)."""
+
+    def __init__(self, db_path):
+        os.makedirs(os.path.dirname(db_path) or '.', exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        self._conn.executescript('''
+            CREATE TABLE IF NOT EXISTS jobs (
+                id TEXT PRIMARY KEY,
+                type TEXT NOT NULL,
+                status TEXT NOT NULL,
+                total INTEGER NOT NULL,
+                created REAL NOT NULL,
+                started REAL,
+                finished REAL
+            );
+            CREATE TABLE IF NOT EXISTS job_steps (
+                job_id TEXT NOT NULL,
+                idx INTEGER NOT NULL,
+                input TEXT NOT NULL,
+                status TEXT NOT NULL,
+                result TEXT,
+                PRIMARY KEY (job_id, idx)
+            );
+            CREATE INDEX IF NOT EXISTS jobs_status ON jobs(status);
+        ''')
+
+    def create(self, job_id, job_type, inputs):
+        with self._lock, self._conn:
+            self._conn.execute('INSERT INTO jobs (id, type, status, total, created) VALUES (?, ?, ?, ?, ?)',
+                               (job_id, job_type, 'queued', len(inputs), time.time()))
+            self._conn.executemany('INSERT INTO job_steps (job_id, idx, input, status) VALUES (?, ?, ?, ?)',
+                                   [(job_id, index, json.dumps(step), 'pending') for index, step in enumerate(inputs)])
+
+    def set_status(self, job_id, status, started=None, finished=None):
+        with self._lock, self._conn:
+            self._conn.execute('UPDATE jobs SET status = ?, started = COALESCE(started, ?), finished = ? WHERE id = ?',
+                               (status, started, finished, job_id))
+
+    def finish_step(self, job_id, index, status, result):
+        with self._lock, self._conn:
+            self._conn.execute('UPDATE job_steps SET status = ?, result = ? WHERE job_id = ? AND idx = ?',
+                               (status, json.dumps(result), job_id, index))
+
+    def cancel_pending(self, job_id):
+        with self._lock, self._conn:
+            self._conn.execute("UPDATE job_steps SET status = 'cancelled' WHERE job_id = ? AND status = 'pending'",
+                               (job_id,))
+
+    def pending_steps(self, job_id):
+        """``[(index, input)]`` of the steps not run yet."""
+        with self._lock:
+            rows = self._conn.execute("SELECT idx, input FROM job_steps WHERE job_id = ? AND status = 'pending' ORDER BY idx",
+                                      (job_id,)).fetchall()
+        return [(index, json.loads(step)) for index, step in rows]
+
+    def summary(self, job_id):
+        """Job row with its step counts (the /jobs JSON format), or None."""
+        jobs = self.summaries(job_id=job_id)
+        return jobs[0] if jobs else None
+
+    def summaries(self, job_id=None, status=None, job_type=None, limit=None):
+        conditions, params = [], []
+        for column, value in (('j.id', job_id), ('j.status', status), ('j.type', job_type)):
+            if value is not None:
+                conditions.append(f'{column} = ?')
+                params.append(value)
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ''
+        query = f'''
+            SELECT j.id, j.type, j.status, j.total, j.created, j.started, j.finished,
+                   SUM(s.status = 'done'), SUM(s.status = 'failed'), SUM(s.status = 'cancelled')
+            FROM jobs j LEFT JOIN job_steps s ON s.job_id = j.id {where}
+            GROUP BY j.id ORDER BY j.created DESC'''
+        if limit:
+            query += f' LIMIT {int(limit)}'
+        with self._lock:
+            rows = self._conn.execute(query, params).fetchall()
+        return [{'jobId': row[0], 'type': row[1], 'status': row[2], 'total': row[3],
+                 'completed': (row[7] or 0) + (row[8] or 0), 'failed': row[8] or 0, 'cancelled': row[9] or 0,
+                 'created': row[4], 'started': row[5], 'finished': row[6]} for row in rows]
+
+    def steps(self, job_id):
+        with self._lock:
+            rows = self._conn.execute('SELECT idx, input, status, result FROM job_steps WHERE job_id = ? ORDER BY idx',
+                                      (job_id,)).fetchall()
+        return [{'index': index, 'input': json.loads(step), 'status': status,
+                 'result': json.loads(result) if result is not None else None} for index, step, status, result in rows]
+
+    def unfinished(self):
+        """``[(id, type, status)]`` of the jobs whose steps were not all run or skipped yet."""
+        with self._lock:
+            return self._conn.execute('SELECT id, type, status FROM jobs WHERE finished IS NULL ORDER BY created').fetchall()
+
+    def prune(self, keep):
+        with self._lock, self._conn:
+            old = [row[0] for row in self._conn.execute(
+                f"SELECT id FROM jobs WHERE status NOT IN ({', '.join('?' * len(JOB_ACTIVE_STATUSES))})"
+                ' ORDER BY finished DESC LIMIT -1 OFFSET ?', (*JOB_ACTIVE_STATUSES, keep))]
+            self._conn.executemany('DELETE FROM job_steps WHERE job_id = ?', [(job_id,) for job_id in old])
+            self._conn.executemany('DELETE FROM jobs WHERE id = ?', [(job_id,) for job_id in old])
+
+class Job:
+    """In-memory progress of a job being run: steps left, cancellation flag and finished step results."""
+
+    def __init__(self, job_id, job_type, pending):
+        self.id = job_id
+        self.type = job_type
+        self.remaining = pending
+        self.cancelled = False
+        self.started = False
+        self.results = []
+        self.closed = False  # Final status stored
+        self._condition = threading.Condition()
+
+    def add_result(self, result):
+        """Record a finished step; returns True for the last one."""
+        with self._condition:
+            self.results.append(result)
+            self.remaining -= 1
+            self._condition.notify_all()
+            return self.remaining == 0
+
+    def close(self):
+        with self._condition:
+            self.closed = True
+            self._condition.notify_all()
+
+    def wait_for_results(self, count, timeout=None):
+        """Block until more than ``count`` step results are available (or the job is closed)."""
+        with self._condition:
+            self._condition.wait_for(lambda: len(self.results) > count or self.closed, timeout=timeout)
+            return list(self.results[count:])
+
+class JobQueue:
+    """Runs the steps of the submitted jobs on one thread pool per job type, in submission order.
+
+    Every step outcome is written to the JobStore as soon as it is known, so a restarted backend
+    resumes the unfinished jobs with their remaining steps (``resume()``).
+    """
+
+    def __init__(self, store, workers):
+        self.store = store
+        self.workers = workers
+        self._executors = {}
+        self._active = {}
+        self._lock = threading.Lock()
+
+    def _executor(self, job_type):
+        with self._lock:
+            if job_type not in self._executors:
+                self._executors[job_type] = ThreadPoolExecutor(
+                    max_workers=self.workers.get(job_type, 1), thread_name_prefix=f'job-{job_type}')
+            return self._executors[job_type]
+
+    def submit(self, job_type, inputs):
+        job_id = uuid.uuid4().hex
+        self.store.create(job_id, job_type, inputs)
+        self.store.prune(JOB_HISTORY)
+        self._start(job_id, job_type, list(enumerate(inputs)))
+        job_log.info('Tâche créée', job=job_id, type=job_type, steps=len(inputs))
+        return job_id
+
+    def get(self, job_id):
+        return self._active.get(job_id)
+
+    def _start(self, job_id, job_type, pending):
+        job = Job(job_id, job_type, len(pending))
+        with self._lock:
+            self._active[job_id] = job
+        if not pending:
+            self._finish(job)
+            return
+        executor = self._executor(job_type)
+        for index, step in pending:
+            executor.submit(self._run_step, job, index, step)
+
+    def _run_step(self, job, index, step):
+        if job.cancelled:
+            status, result = 'cancelled', None
         else:
-            print(f'[DDG Search] No good fuzzy match found (best distance {best_distance} > {max_allowed_distance}). Trying fallback.')
-            if potential_matches:
-                fallback_match = potential_matches[0] # Use the first found match
-                print(f'[DDG Search] Using fallback: Slug={fallback_match["slug"]}, Path={fallback_match["path_type"]}')
-                final_match_info = {'path_type': fallback_match['path_type'], 'slug': fallback_match['slug']}
-            else:
-                print('[DDG Search] Fallback failed: No potential matches were available.')
+            if not job.started:
+                job.started = True
+                self.store.set_status(job.id, 'running', started=time.time())
+            try:
+                status, result = 'done', JOB_TYPES[job.type][0](step)
+            except Exception as e:
+                job_log.warning('Étape en échec', job=job.id, type=job.type, step=index, error=str(e))
+                status, result = 'failed', {'error': str(e)}
+        self.store.finish_step(job.id, index, status, result)
+        if job.add_result({'index': index, 'status': status, 'result': result}):
+            self._finish(job)
+
+    def _finish(self, job):
+        self.store.set_status(job.id, 'cancelled' if job.cancelled else 'done', finished=time.time())
+        with self._lock:
+            self._active.pop(job.id, None)
+        job.close()
+        job_log.info('Tâche terminée', job=job.id, type=job.type, cancelled=job.cancelled)
 
-        if final_match_info:
-            print(f"[DDG Search] Returning final match: Slug='{final_match_info['slug']}', Path='{final_match_info['path_type']}'")
+    def cancel(self, job_id):
+        """Skip the steps of ``job_id`` not started yet (running steps complete). Returns False if it is not active."""
+        job = self._active.get(job_id)
+        summary = self.store.summary(job_id)
+        if summary is None or summary['status'] not in JOB_ACTIVE_STATUSES:
+            return False
+        if job is not None:
+            # Its queued steps are skipped as they come up; _finish() then sets the finish time
+            job.cancelled = True
+            self.store.set_status(job_id, 'cancelled')
         else:
-            print("[DDG Search] Failed to determine final slug and path.")
-        return final_match_info # Return dict {'path_type': ..., 'slug': ...} or None
+            self.store.cancel_pending(job_id)
+            self.store.set_status(job_id, 'cancelled', finished=time.time())
+        return True
 
-    except requests.exceptions.RequestException as e:
-        print(f'[DDG Search] DuckDuckGo request error: {e}')
-        return None
-    except Exception as e:
-        import traceback
-        print(f'[DDG Search] Error during DuckDuckGo parsing: {e}\n{traceback.format_exc()}')
-        return None
+    def resume(self):
+        """Restart the jobs left queued or running by a previous backend process."""
+        for job_id, job_type, status in self.store.unfinished():
+            if job_id in self._active:
+                continue
+            if status not in JOB_ACTIVE_STATUSES or job_type not in JOB_TYPES:
+                self.store.cancel_pending(job_id)
+                self.store.set_status(job_id, 'cancelled', finished=time.time())
+                continue
+            pending = self.store.pending_steps(job_id)
+            job_log.info('Reprise de la tâche', job=job_id, type=job_type, steps=len(pending))
+            self._start(job_id, job_type, pending)
 
-def search_manga_news_slug(title):
-    """Find the Manga-News slug and path type, trying DuckDuckGo first then direct URL checks."""
-    # First try DuckDuckGo search
-    match_info = search_slug_with_duckduckgo(title)
-    if match_info:
-        print(f'Slug and path found via DuckDuckGo: Slug={match_info["slug"]}, Path={match_info["path_type"]}')
-        return match_info
+job_queue = JobQueue(JobStore(os.path.join(CACHE_DIR, 'jobs.sqlite3')), parse_job_workers(JOB_WORKERS))
 
-    print(f'DuckDuckGo search failed for title: {title}. Trying direct URL checks...')
-    
-    # If DuckDuckGo fails, try direct URL patterns with the original title casing
-    # Preserve original casing, just replace spaces with hyphens
-    direct_slug = title.replace(' ', '-')
-    
-    # Try both paths (serie and serie-vo) with the direct slug
-    paths_to_try = ['serie', 'serie-vo']
-    for path_type in paths_to_try:
-        url = f"https://www.manga-news.com/index.php/{path_type}/{direct_slug}"
-        print(f'Trying direct URL: {url}')
-        try:
-            headers = {'User-Agent': 'Mozilla/5.0'}
-            response = requests.get(url, headers=headers, timeout=10)
-            if response.status_code == 200:
-                print(f'Direct URL successful: {url}')
-                return {'path_type': path_type, 'slug': direct_slug}
-        except Exception as e:
-            print(f'Error checking direct URL {url}: {e}')
-    
-    # If all direct URL attempts fail as well
-    print(f'No slug/path found for title: {title}')
+def _job_step_error(job_type, step):
+    if not isinstance(step, dict):
+        return 'chaque étape doit être un objet'
+    missing = [field for field in JOB_TYPES[job_type][1] if not step.get(field)]
+    if missing:
+        return f"champ requis manquant : {', '.join(missing)}"
     return None
 
-def scrape_synopsis(slug, path_type):
-    """Scrape the synopsis from the Manga-News series page using the correct path type."""
-    url = f"https://www.manga-news.com/index.php/{path_type}/{slug}"
-    print(f'Scraping URL: {url}')
+# --- Job Queue --- END ---
+
+FILES_PAGE_DEFAULT = 100
+FILES_PAGE_MAX = 1000
+
+def _stream_folders(refresh, prefix=None, q=None):
+    """Yield /files folders as NDJSON lines, walking the disk first if the index is stale."""
+    if refresh or library_index.is_stale():
+        for directory in library_index.iter_scan():
+            for folder in library_index.folders(only=directory, prefix=prefix, q=q):
+                yield json.dumps(folder) + '\n'
+    else:
+        for folder in library_index.iter_folders(prefix=prefix, q=q):
+            yield json.dumps(folder) + '\n'
+
+@app.route('/files', methods=['GET'])
+def list_files():
+    """List the library folders.
+
+    Query parameters: ``prefix`` / ``q`` filter by name, ``limit`` / ``cursor`` paginate
+    (the response then becomes ``{'folders': [...], 'nextCursor': ...}``), ``format=ndjson``
+    streams one folder per line and ``refresh=1`` forces an incremental rescan.
+    """
+    args = request.args
+    refresh = args.get('refresh') == '1'
+    filters = {'prefix': args.get('prefix') or None, 'q': args.get('q') or None}
+
     try:
-        headers = {'User-Agent': 'Mozilla/5.0'}
-        response = requests.get(url, headers=headers, timeout=10)
-        response.raise_for_status()
-        soup = BeautifulSoup(response.text, 'html.parser')
-
-        # Try to find the synopsis in the correct structure: div.bigsize inside div#summary after h2
-        summary_div = soup.select_one('div#summary div.bigsize')
-        if summary_div:
-            print(f'Found synopsis using div#summary div.bigsize selector')
-            summary = summary_div.get_text(strip=True)
-            return summary
-
-        # Fallback selectors if the first one fails
-        # Try the "card-body" approach
-        summary_p = soup.select_one('div#summary div.card-body p')
-        if summary_p:
-            print('Found synopsis using div#summary div.card-body p selector')
-            summary = summary_p.get_text(strip=True)
-            return summary
-            
-        # Try the "card-text" approach
-        summary_div = soup.select_one('div#summary div.card-text')
-        if summary_div:
-            print('Found synopsis using div#summary div.card-text selector')
-            summary = summary_div.get_text(strip=True)
-            return summary
-
-        # Try the "description" approach
-        desc_span = soup.select_one('div#synopsis span[itemprop="description"]')
-        if desc_span:
-            print('Found synopsis using div#synopsis span[itemprop="description"] selector')
-            summary = desc_span.get_text(strip=True)
-            return summary
-
-        # Try the "resume" approach
-        resume_div = soup.select_one('div.resume')
-        if resume_div:
-            print('Found synopsis using div.resume selector')
-            summary = resume_div.get_text(strip=True)
-            return summary
-
-        print('All selectors failed to find synopsis.')
-        return None
+        if args.get('format') == 'ndjson':
+            return Response(_stream_folders(refresh, **filters), mimetype='application/x-ndjson')
 
-    except requests.exceptions.RequestException as e:
-        if isinstance(e, requests.exceptions.HTTPError):
-             print(f'Scraping error Manga-News: HTTP {e.response.status_code} for URL {url}')
+        if refresh:
+            library_index.scan()
         else:
-             print(f'Scraping error Manga-News: {e}')
-        return None
+            library_index.refresh_if_stale()
+
+        if 'limit' not in args and 'cursor' not in args:
+            return jsonify(library_index.folders(**filters))
+
+        try:
+            limit = min(max(int(args.get('limit', FILES_PAGE_DEFAULT)), 1), FILES_PAGE_MAX)
+        except ValueError:
+            return jsonify({'error': 'Le paramètre limit doit être un entier.'}), 400
+        folders = library_index.folders(limit=limit, cursor=args.get('cursor') or None, **filters)
+        next_cursor = folders[-1]['path'] if len(folders) == limit else None
+        return jsonify({'folders': folders, 'nextCursor': next_cursor})
     except Exception as e:
-        print(f'Error during synopsis parsing: {e}')
-        return None
+        return jsonify({'error': str(e)}), 500
 
-# --- Manga-News Scraping Logic --- END ---
+@app.route('/files/events', methods=['GET'])
+def stream_library_events():
+    """Server-sent events: one message per batch of library changes (see LibraryIndex and coalesce_changes).
 
-@app.route('/files', methods=['GET'])
-def list_files():
+    Each message carries the batch id, so a reconnecting EventSource resumes after the last batch
+    it got; a ``reset`` event means some batches were missed and /files must be reloaded.
+    """
+    last_event_id = request.headers.get('Last-Event-ID') or request.args.get('since')
     try:
-        folders = []
-        for root, dirs, files in os.walk(FILES_PATH):
-            if root == FILES_PATH:
-                continue
-            
-            normalized_root = os.path.normpath(root)
-            folder = {
-                'id': normalized_root,
-                'name': os.path.basename(normalized_root),
-                'path': normalized_root,
-                'files': [
-                    {'id': os.path.normpath(os.path.join(normalized_root, f)), 'name': f, 'path': os.path.normpath(os.path.join(normalized_root, f))}
-                    for f in files if f.endswith(('.cbz', '.cbr'))
-                ]
-            }
-            if folder['files']:
-                folders.append(folder)
-        return jsonify(folders)
+        after = int(last_event_id) if last_event_id else library_events.last_id
+    except ValueError:
+        after = -1
+
+    def events():
+        nonlocal after
+        while True:
+            batches = library_events.since(after, timeout=15)
+            if batches is None:
+                after = library_events.last_id
+                yield f'id: {after}\nevent: reset\ndata: {{}}\n\n'
+            elif not batches:
+                yield ': keep-alive\n\n'
+            for event_id, changes in batches or ():
+                yield f'id: {event_id}\ndata: {json.dumps(changes)}\n\n'
+                after = event_id
+
+    return Response(events(), mimetype='text/event-stream', headers={'Cache-Control': 'no-cache'})
+
+@app.route('/files/rescan', methods=['POST'])
+def rescan_files():
+    """Rescan a subtree of the library index (the whole library if no path is given)."""
+    data = request.get_json(silent=True) or {}
+    path = data.get('path') or FILES_PATH
+    force = bool(data.get('force', False))
+
+    if not library_index.contains(path):
+        return jsonify({'error': 'Le chemin doit être dans la bibliothèque.'}), 400
+
+    try:
+        stats = library_index.scan(path, force=force)
+        return jsonify({'success': True, 'path': os.path.normpath(path), **stats})
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -253,16 +3333,135 @@ def update_cbz():
     comic_info_xml = data.get('comicInfoXML')
 
     try:
-        if file_path.endswith('.cbz'):
-            with zipfile.ZipFile(file_path, 'a') as zip_file:
-                zip_file.writestr('ComicInfo.xml', comic_info_xml)
-        elif file_path.endswith('.cbr'):
-            with rarfile.RarFile(file_path) as rar_file:
-                pass
-        return jsonify({'success': True})
+        return jsonify(update_archive_metadata(file_path, comic_info_xml, data.get('cbrMode')))
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/update-cbz/batch', methods=['POST'])
+def update_cbz_batch():
+    """Rewrite the metadata of many archives in parallel.
+
+    Body: ``{'entries': [{'filePath': ..., 'comicInfoXML': ..., 'cbrMode': ...}, ...], 'wait': false}``.
+    Returns the batch id right away (202), or every per-file result when ``wait`` is true.
+    """
+    data = request.get_json(silent=True) or {}
+    entries = data.get('entries')
+
+    if not isinstance(entries, list) or not entries:
+        return jsonify({'error': 'La liste des fichiers (entries) est requise.'}), 400
+    for entry in entries:
+        if not isinstance(entry, dict) or not entry.get('filePath') or entry.get('comicInfoXML') is None:
+            return jsonify({'error': 'Chaque entrée doit contenir filePath et comicInfoXML.'}), 400
+
+    entries = [dict(entry, cbrMode=entry.get('cbrMode') or CBR_METADATA_MODE) for entry in entries]
+    try:
+        batch = start_metadata_batch(entries)
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+    if data.get('wait'):
+        batch.wait()
+        return jsonify(batch.to_dict())
+    return jsonify(batch.to_dict()), 202
+
+@app.route('/update-cbz/batch/<batch_id>', methods=['GET'])
+def get_update_cbz_batch(batch_id):
+    """Poll the progress and per-file results of a metadata batch."""
+    batch = _metadata_batches.get(batch_id)
+    if batch is None:
+        return jsonify({'error': 'Lot introuvable.'}), 404
+    return jsonify(batch.to_dict())
+
+@app.route('/update-cbz/batch/<batch_id>/events', methods=['GET'])
+def stream_update_cbz_batch(batch_id):
+    """Server-sent events: one ``result`` event per finished file, then a ``done`` event."""
+    batch = _metadata_batches.get(batch_id)
+    if batch is None:
+        return jsonify({'error': 'Lot introuvable.'}), 404
+
+    def events():
+        sent = 0
+        while True:
+            new_results = batch.wait_for_results(sent, timeout=15)
+            if not new_results and not batch.done:
+                yield ': keep-alive\n\n'
+                continue
+            for result in new_results:
+                yield f'event: result\ndata: {json.dumps(result)}\n\n'
+            sent += len(new_results)
+            if batch.done and sent == len(batch.entries):
+                summary = {k: v for k, v in batch.to_dict().items() if k != 'results'}
+                yield f'event: done\ndata: {json.dumps(summary)}\n\n'
+                return
+
+    return Response(events(), mimetype='text/event-stream', headers={'Cache-Control': 'no-cache'})
+
+@app.route('/convert-cbr', methods=['POST'])
+def convert_cbr():
+    """Convert one CBR, or every CBR of a folder (optionally recursive), to CBZ in the process pool.
+
+    Body: ``{'filePath': ...}`` or ``{'folderPath': ..., 'recursive': false, 'wait': false}``.
+    Progress is reported like /update-cbz/batch.
+    """
+    data = request.get_json(silent=True) or {}
+    file_path = data.get('filePath')
+    folder_path = data.get('folderPath')
+
+    if file_path:
+        targets = [file_path]
+    elif folder_path:
+        if not os.path.isdir(folder_path):
+            return jsonify({'error': f"Le dossier '{folder_path}' n'existe pas."}), 404
+        if data.get('recursive'):
+            targets = sorted(os.path.join(root, name) for root, _, names in os.walk(folder_path)
+                             for name in names if name.endswith('.cbr'))
+        else:
+            targets = sorted(os.path.join(folder_path, name) for name in os.listdir(folder_path) if name.endswith('.cbr'))
+    else:
+        return jsonify({'error': 'Le chemin du fichier ou du dossier est requis.'}), 400
+
+    if not targets:
+        return jsonify({'error': 'Aucun fichier CBR à convertir.'}), 404
+
+    try:
+        batch = start_metadata_batch([{'filePath': target} for target in targets], task=convert_entry)
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+    if data.get('wait'):
+        batch.wait()
+        return jsonify(batch.to_dict())
+    return jsonify(batch.to_dict()), 202
+
+@app.route('/compact-cbz', methods=['POST'])
+def compact_cbz():
+    """Rewrite CBZ archives to drop duplicated entries (one file, or every CBZ of a folder)."""
+    data = request.get_json(silent=True) or {}
+    file_path = data.get('filePath')
+    folder_path = data.get('folderPath')
+
+    if not file_path and not folder_path:
+        return jsonify({'error': 'Le chemin du fichier ou du dossier est requis.'}), 400
+
+    if file_path:
+        targets = [file_path]
+    else:
+        if not os.path.isdir(folder_path):
+            return jsonify({'error': f"Le dossier '{folder_path}' n'existe pas."}), 404
+        targets = sorted(os.path.join(folder_path, name) for name in os.listdir(folder_path) if name.endswith('.cbz'))
+
+    results = []
+    for target in targets:
+        try:
+            summary = rewrite_cbz(target, compact=True)
+            count_written_archive(summary)
+            metadata_cache.evict(target)
+            library_index.update_file(target)
+            results.append({'filePath': target, 'success': True, **summary})
+        except Exception as e:
+            results.append({'filePath': target, 'success': False, 'error': str(e)})
+    return jsonify({'success': all(r['success'] for r in results), 'results': results})
+
 @app.route('/rename', methods=['POST', 'OPTIONS'])
 def rename_file_or_folder():
     """Endpoint pour renommer un fichier ou un dossier."""
@@ -284,7 +3483,7 @@ def rename_file_or_folder():
         parent_dir = os.path.dirname(old_path)
         new_path = os.path.join(parent_dir, new_name)
         
-        print(f"Renommage demandé: {old_path} -> {new_path} ({'dossier' if is_directory else 'fichier'})")
+        rename_log.info('Renommage demandé', source=old_path, target=new_path, directory=is_directory)
         
         # Vérifier si la destination existe déjà
         if os.path.exists(new_path):
@@ -292,6 +3491,16 @@ def rename_file_or_folder():
             
         # Effectuer le renommage
         os.rename(old_path, new_path)
+
+        # Le ComicInfo.xml annexe (sidecar) suit l'archive
+        if not is_directory and has_sidecar(old_path):
+            if new_path.endswith(SIDECAR_EXTENSIONS) and not os.path.exists(sidecar_path(new_path)):
+                os.rename(sidecar_path(old_path), sidecar_path(new_path))
+
+        metadata_cache.move(old_path, new_path)
+        # The index rows are moved directly, which also sends the rename to /files/events
+        if library_index.contains(parent_dir) and not library_index.rename(old_path, new_path):
+            library_index.scan(parent_dir)
         
         return jsonify({
             'success': True,
@@ -303,9 +3512,64 @@ def rename_file_or_folder():
     except Exception as e:
         import traceback
         error_details = traceback.format_exc()
-        print(f"Erreur de renommage: {e}\n{error_details}")
+        rename_log.exception('Erreur de renommage')
         return jsonify({'error': str(e), 'details': error_details}), 500
 
+@app.route('/rename/batch', methods=['POST'])
+def rename_batch():
+    """Rename many archives of a folder from a template or an explicit mapping.
+
+    Body: ``{'folderPath', 'template': '{series} - Tome {volume:02}', 'series': ...}`` (fields:
+    series, title, number, volume, index, name, ext) or ``{'folderPath', 'mapping': {'ancien.cbz':
+    'nouveau.cbz'}}``, plus ``dryRun`` (default true). The plan is always returned; it is applied
+    in one journaled pass only with ``dryRun: false`` and no conflict.
+    """
+    data = request.get_json(silent=True) or {}
+    folder_path = data.get('folderPath')
+    template, mapping = data.get('template'), data.get('mapping')
+    dry_run = data.get('dryRun', True)
+
+    if not folder_path:
+        return jsonify({'error': 'Le chemin du dossier est requis.'}), 400
+    if not os.path.isdir(folder_path):
+        return jsonify({'error': f"Le dossier '{folder_path}' n'existe pas."}), 404
+    folder_path = os.path.normpath(folder_path)
+    archives = sorted((name for name in os.listdir(folder_path)
+                       if name.endswith(ARCHIVE_EXTENSIONS) and os.path.isfile(os.path.join(folder_path, name))),
+                      key=natural_sort_key)
+
+    if mapping is not None:
+        if not isinstance(mapping, dict) or not all(isinstance(name, str) for name in mapping.values()):
+            return jsonify({'error': 'mapping doit associer des noms de fichiers à leurs nouveaux noms.'}), 400
+        missing = [name for name in mapping if name not in archives]
+        if missing:
+            return jsonify({'error': 'Fichiers introuvables dans le dossier.', 'missing': missing}), 404
+        targets = [(os.path.join(folder_path, old_name), new_name) for old_name, new_name in mapping.items()]
+    elif template:
+        paths = [os.path.join(folder_path, name) for name in archives]
+        metadata = {result['filePath']: result.get('metadata') for result in iter_archives_metadata(paths)}
+        try:
+            targets = [(path, render_rename_template(template, rename_template_fields(
+                           path, index, metadata.get(path), data.get('series'))))
+                       for index, path in enumerate(paths, 1)]
+        except (KeyError, IndexError, TypeError, ValueError) as e:
+            return jsonify({'error': f'Modèle de nom invalide : {e}'}), 400
+    else:
+        return jsonify({'error': 'Un modèle (template) ou une correspondance (mapping) est requis.'}), 400
+
+    plan = plan_batch_rename(folder_path, targets)
+    response = {key: value for key, value in plan.items() if key != 'steps'}
+    response['dryRun'] = bool(dry_run)
+    if dry_run or plan['conflicts']:
+        response['applied'] = False
+        return jsonify(response), 409 if plan['conflicts'] and not dry_run else 200
+
+    success, error = apply_batch_rename(plan)
+    response['applied'] = success
+    if not success:
+        return jsonify({**response, **error}), 500
+    return jsonify(response)
+
 @app.route('/proxy/mangadex/<path:subpath>', methods=['GET', 'OPTIONS'])
 def proxy_mangadex(subpath):
     if request.method == 'OPTIONS':
@@ -316,25 +3580,9 @@ def proxy_mangadex(subpath):
     if 'Authorization' in request.headers:
         headers_to_forward['Authorization'] = request.headers['Authorization']
 
-    mangadex_url = f"https://api.mangadex.org/{subpath}"
-
     try:
-        response = requests.request(
-            method=request.method,
-            url=mangadex_url,
-            params=params,
-            headers=headers_to_forward
-        )
-        response.raise_for_status()
-
-        content = response.content
-
-        resp_headers = {}
-        for h in ['Content-Type', 'Content-Length']:
-            if h in response.headers:
-                resp_headers[h] = response.headers[h]
-        
-        return Response(content, status=response.status_code, headers=resp_headers)
+        entry, cache_status = mangadex_upstream.get(subpath, params, headers_to_forward)
+        return cached_proxy_response(entry, cache_status)
 
     except requests.exceptions.RequestException as e:
         error_message = f"Error proxying to MangaDex: {e}"
@@ -355,34 +3603,15 @@ def proxy_jikan(subpath):
         return Response(status=200)
 
     params = request.args.to_dict(flat=False)
-    jikan_url = f"https://api.jikan.moe/v4/{subpath}"
 
     try:
-        # Log pour aider au débogage
-        print(f"[Jikan Proxy] Forwarding request to: {jikan_url}")
-        print(f"[Jikan Proxy] With params: {params}")
-        
-        response = requests.request(
-            method=request.method,
-            url=jikan_url,
-            params=params,
-            timeout=10  # Timeout explicite pour éviter les blocages
-        )
-        response.raise_for_status()
-
-        content = response.content
-        print(f"[Jikan Proxy] Response status: {response.status_code}")
-
-        resp_headers = {}
-        for h in ['Content-Type', 'Content-Length']:
-            if h in response.headers:
-                resp_headers[h] = response.headers[h]
-        
-        return Response(content, status=response.status_code, headers=resp_headers)
+        entry, cache_status = jikan_upstream.get(subpath, params)
+        proxy_log.debug('Jikan response', subpath=subpath, params=params, status=entry['status'], cache=cache_status)
+        return cached_proxy_response(entry, cache_status)
 
     except requests.exceptions.RequestException as e:
         error_message = f"Error proxying to Jikan API: {e}"
-        print(f"[Jikan Proxy] Error: {error_message}")
+        proxy_log.warning('Jikan request error', subpath=subpath, error=str(e))
         status_code = e.response.status_code if hasattr(e, 'response') and e.response is not None else 500
         if hasattr(e, 'response') and e.response is not None:
             resp_headers = {
@@ -392,7 +3621,7 @@ def proxy_jikan(subpath):
         else:
             return jsonify({'error': error_message}), status_code
     except Exception as e:
-        print(f"[Jikan Proxy] Unexpected error: {str(e)}")
+        proxy_log.exception('Jikan unexpected error', subpath=subpath)
         return jsonify({'error': f"An unexpected error occurred: {str(e)}"}), 500
 
 # --- Manga-News Route --- START ---
@@ -401,32 +3630,261 @@ def get_manga_news_synopsis_route(title):
     """API endpoint to get synopsis from Manga-News."""
     try:
         decoded_title = urllib.parse.unquote(title)
-        print(f'Received request for Manga-News synopsis: {decoded_title}')
-        match_info = search_manga_news_slug(decoded_title) # Returns dict {'path_type': ..., 'slug': ...} or None
+        match_info, synopsis = get_manga_news_synopsis(decoded_title) # match_info: {'path_type': ..., 'slug': ...} or None
 
         if not match_info:
-            print(f'[ERROR] Manga-News slug/path search failed for title: {decoded_title}') # Updated detail
+            manga_news_log.info('Manga-News slug/path search failed', title=decoded_title)
             return jsonify({'error': 'Manga not found on Manga-News'}), 404
 
         slug = match_info['slug']
         path_type = match_info['path_type']
-        print(f'Found Manga-News slug: {slug}, path_type: {path_type}') # Added success log
 
-        synopsis = scrape_synopsis(slug, path_type) # Pass both slug and path_type
         if not synopsis:
             # The error is now more likely caught inside scrape_synopsis due to raise_for_status()
-            print(f'[ERROR] Synopsis scraping failed for slug: {slug}, path: {path_type}') # Updated detail
+            manga_news_log.info('Synopsis scraping failed', title=decoded_title, slug=slug, path=path_type)
             return jsonify({'error': 'Synopsis not found on Manga-News page (or page inaccessible)'}), 404
 
-        print('Synopsis found and returned')
         return jsonify({'summary': synopsis})
 
     except Exception as e:
-        import traceback
-        print(f'API error in /manga-news: {e}\n{traceback.format_exc()}')
+        manga_news_log.exception('API error in /manga-news', title=title)
         return jsonify({'error': 'Server error processing Manga-News request', 'details': str(e)}), 500
 # --- Manga-News Route --- END ---
 
+TITLE_MATCH_LIMIT_MAX = 50
+
+@app.route('/titles/match', methods=['POST'])
+def match_titles():
+    """Match many titles against the fuzzy title index in one call.
+
+    Body: ``{'titles': [...]}`` or ``{'library': true}`` (every folder of the library index), plus
+    optional ``source`` ('manga-news', 'mangadex', 'jikan'), ``limit`` and ``minScore``.
+    Returns ``{'results': [{'query', 'candidates': [...]}], 'indexSize'}``; library results also carry ``path``.
+    """
+    data = request.get_json(silent=True) or {}
+    titles = data.get('titles')
+    source = data.get('source') or None
+    try:
+        limit = min(max(int(data.get('limit', 5)), 1), TITLE_MATCH_LIMIT_MAX)
+        min_score = float(data.get('minScore', 0.5))
+    except (TypeError, ValueError):
+        return jsonify({'error': 'Les paramètres limit et minScore doivent être des nombres.'}), 400
+
+    if titles is not None:
+        if not isinstance(titles, list) or not all(isinstance(title, str) for title in titles):
+            return jsonify({'error': 'titles doit être une liste de chaînes.'}), 400
+        queries = [{'query': title} for title in titles]
+    elif data.get('library'):
+        library_index.refresh_if_stale()
+        queries = [{'query': folder['name'], 'path': folder['path']} for folder in library_index.iter_folders()]
+    else:
+        return jsonify({'error': 'La liste des titres ou library est requise.'}), 400
+
+    results = [{**query, 'candidates': title_index.match(query['query'], limit=limit, source=source, min_score=min_score)}
+               for query in queries]
+    return jsonify({'results': results, 'indexSize': len(title_index)})
+
+def _archive_path_error(file_path):
+    if not file_path:
+        return jsonify({'error': 'Le chemin du fichier est requis.'}), 400
+    if not file_path.endswith(ARCHIVE_EXTENSIONS) or not os.path.isfile(file_path):
+        return jsonify({'error': f"Le fichier '{file_path}' n'existe pas."}), 404
+    return None
+
+@app.route('/thumbnail', methods=['GET'])
+def thumbnail():
+    """Cover thumbnail (JPEG) of the archive given by the ``path`` query parameter."""
+    file_path = request.args.get('path')
+    error = _archive_path_error(file_path)
+    if error:
+        return error
+
+    try:
+        key, data = get_thumbnail(file_path)
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+    if data is None:
+        return jsonify({'error': "Aucune image trouvée dans l'archive."}), 404
+    # The ETag changes with the archive (path, mtime, size): browsers revalidate cheaply
+    return send_file(io.BytesIO(data), mimetype='image/jpeg', etag=key, max_age=0, conditional=True)
+
+@app.route('/archive/pages', methods=['GET'])
+def list_archive_pages():
+    """List the pages (image members in natural order) of the archive ``path``."""
+    file_path = request.args.get('path')
+    error = _archive_path_error(file_path)
+    if error:
+        return error
+    try:
+        handle = archive_handles.get(file_path)
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+    try:
+        pages = [{'index': index, 'name': info.filename, 'size': info.file_size} for index, info in enumerate(handle.pages)]
+    finally:
+        handle.release()
+    return jsonify({'pages': pages, 'count': len(pages)})
+
+@app.route('/archive/page/<int:index>', methods=['GET'])
+def get_archive_page(index):
+    """Stream page ``index`` (0-based) of the archive ``path``, honouring single byte ranges."""
+    file_path = request.args.get('path')
+    error = _archive_path_error(file_path)
+    if error:
+        return error
+    try:
+        handle = archive_handles.get(file_path)
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+    if index >= len(handle.pages):
+        handle.release()
+        return jsonify({'error': 'Page introuvable.'}), 404
+
+    info = handle.pages[index]
+    length = info.file_size
+    etag = f'{handle.signature[0]:x}-{handle.signature[1]:x}-{index}'
+    headers = {'Accept-Ranges': 'bytes', 'ETag': f'"{etag}"', 'Cache-Control': 'no-cache'}
+    if request.if_none_match.contains(etag):
+        handle.release()
+        return Response(status=304, headers=headers)
+
+    status, start, end = 200, 0, length
+    if request.range is not None:
+        byte_range = request.range.range_for_length(length)
+        if byte_range is None:
+            handle.release()
+            return Response(status=416, headers={**headers, 'Content-Range': f'bytes */{length}'})
+        status, (start, end) = 206, byte_range
+        headers['Content-Range'] = f'bytes {start}-{end - 1}/{length}'
+    headers['Content-Length'] = str(end - start)
+    mimetype = IMAGE_MIMETYPES.get(os.path.splitext(info.filename)[1].lower(), 'application/octet-stream')
+    # Not direct_passthrough: Werkzeug would then hand out the bare generator and skip call_on_close
+    response = Response(handle.iter_page(info, start, end), status=status, headers=headers, mimetype=mimetype)
+    response.call_on_close(handle.release)  # The handle stays open until the page is sent
+    return response
+
+@app.route('/integrity/scan', methods=['GET', 'POST'])
+def integrity_scan():
+    """POST starts a background integrity scan (``{'path', 'force', 'verify'}``); GET returns its progress."""
+    if request.method == 'GET':
+        if _integrity_scan is None:
+            return jsonify({'error': "Aucun scan d'intégrité n'a été lancé."}), 404
+        return jsonify(_integrity_scan.to_dict())
+
+    data = request.get_json(silent=True) or {}
+    path = data.get('path') or FILES_PATH
+    if not library_index.contains(path):
+        return jsonify({'error': 'Le chemin doit être dans la bibliothèque.'}), 400
+
+    scan = start_integrity_scan(path, force=bool(data.get('force', False)), verify=bool(data.get('verify', True)))
+    if scan is None:
+        return jsonify({'error': "Un scan d'intégrité est déjà en cours.", **_integrity_scan.to_dict()}), 409
+    return jsonify(scan.to_dict()), 202
+
+@app.route('/integrity/report', methods=['GET'])
+def integrity_report_route():
+    """Corrupt archives and duplicates found by the integrity scans (``?similarity=0.8``)."""
+    try:
+        similarity = float(request.args.get('similarity', 0.8))
+    except ValueError:
+        return jsonify({'error': 'Le paramètre similarity doit être un nombre.'}), 400
+    if not 0 < similarity <= 1:
+        return jsonify({'error': 'Le paramètre similarity doit être compris entre 0 et 1.'}), 400
+    report = integrity_report(similarity)
+    if _integrity_scan is not None:
+        report['scan'] = _integrity_scan.to_dict()
+    return jsonify(report)
+
+# Archives a folder expands to, for the job types taking one file per step
+JOB_FOLDER_EXTENSIONS = {'extract-metadata': ARCHIVE_EXTENSIONS, 'convert-cbr': ('.cbr',)}
+
+@app.route('/jobs', methods=['GET', 'POST'])
+def jobs():
+    """POST submits a job, GET lists the jobs (``?status=&type=&limit=50``), most recent first.
+
+    Body: ``{'type': 'update-metadata' | 'extract-metadata' | 'synopsis' | 'convert-cbr', 'steps': [...]}``
+    with one input per step (``{'filePath', 'comicInfoXML', 'cbrMode'}``, ``{'filePath'}``,
+    ``{'title'}``, ``{'filePath'}``). File based types also accept ``{'folderPath', 'recursive'}``.
+    """
+    if request.method == 'GET':
+        try:
+            limit = min(max(int(request.args.get('limit', 50)), 1), JOB_HISTORY)
+        except ValueError:
+            return jsonify({'error': 'Le paramètre limit doit être un entier.'}), 400
+        return jsonify({'jobs': job_queue.store.summaries(status=request.args.get('status'),
+                                                          job_type=request.args.get('type'), limit=limit)})
+
+    data = request.get_json(silent=True) or {}
+    job_type = data.get('type')
+    steps = data.get('steps')
+    folder_path = data.get('folderPath')
+    if job_type not in JOB_TYPES:
+        return jsonify({'error': f"Type de tâche inconnu (attendu : {', '.join(JOB_TYPES)})."}), 400
+
+    if steps is None and folder_path and job_type in JOB_FOLDER_EXTENSIONS:
+        if not os.path.isdir(folder_path):
+            return jsonify({'error': f"Le dossier '{folder_path}' n'existe pas."}), 404
+        extensions = JOB_FOLDER_EXTENSIONS[job_type]
+        if data.get('recursive'):
+            paths = sorted(os.path.join(root, name) for root, _, names in os.walk(folder_path)
+                           for name in names if name.endswith(extensions))
+        else:
+            paths = sorted(os.path.join(folder_path, name) for name in os.listdir(folder_path)
+                           if name.endswith(extensions))
+        steps = [{'filePath': path} for path in paths]
+    if not isinstance(steps, list) or not steps:
+        return jsonify({'error': 'La liste des étapes (steps) est requise.'}), 400
+    for index, step in enumerate(steps):
+        error = _job_step_error(job_type, step)
+        if error:
+            return jsonify({'error': f'Étape {index} : {error}.'}), 400
+
+    job_id = job_queue.submit(job_type, steps)
+    return jsonify(job_queue.store.summary(job_id)), 202
+
+@app.route('/jobs/<job_id>', methods=['GET'])
+def get_job(job_id):
+    """Progress of a job with the input, status and result of each step."""
+    summary = job_queue.store.summary(job_id)
+    if summary is None:
+        return jsonify({'error': 'Tâche introuvable.'}), 404
+    return jsonify({**summary, 'steps': job_queue.store.steps(job_id)})
+
+@app.route('/jobs/<job_id>/cancel', methods=['POST'])
+def cancel_job(job_id):
+    """Cancel a job: steps not started yet are skipped, the running ones complete."""
+    summary = job_queue.store.summary(job_id)
+    if summary is None:
+        return jsonify({'error': 'Tâche introuvable.'}), 404
+    if not job_queue.cancel(job_id):
+        return jsonify({'error': 'La tâche est déjà terminée.', **summary}), 409
+    return jsonify(job_queue.store.summary(job_id))
+
+@app.route('/jobs/<job_id>/events', methods=['GET'])
+def stream_job(job_id):
+    """Server-sent events: the job state, one ``step`` event per finished step, then a ``done`` event."""
+    summary = job_queue.store.summary(job_id)
+    if summary is None:
+        return jsonify({'error': 'Tâche introuvable.'}), 404
+    job = job_queue.get(job_id)
+
+    def events():
+        yield f'event: progress\ndata: {json.dumps(summary)}\n\n'
+        sent = 0
+        while job is not None:
+            new_results = job.wait_for_results(sent, timeout=15)
+            if not new_results and not job.closed:
+                yield ': keep-alive\n\n'
+                continue
+            for result in new_results:
+                yield f'event: step\ndata: {json.dumps(result)}\n\n'
+            sent += len(new_results)
+            if job.closed and sent == len(job.results):
+                break
+        yield f'event: done\ndata: {json.dumps(job_queue.store.summary(job_id))}\n\n'
+
+    return Response(events(), mimetype='text/event-stream', headers={'Cache-Control': 'no-cache'})
+
 @app.route('/extract-metadata', methods=['POST'])
 def extract_metadata():
     data = request.json
@@ -436,53 +3894,57 @@ def extract_metadata():
         return jsonify({'error': 'Le chemin du fichier est requis.'}), 400
         
     try:
-        xml_content = None
-        print(f"Tentative d'extraction des métadonnées de: {file_path}")
-        
-        # Extraction pour fichier CBZ (ZIP)
-        if file_path.endswith('.cbz'):
-            try:
-                with zipfile.ZipFile(file_path, 'r') as zip_file:
-                    file_list = zip_file.namelist()
-                    print(f"Contenu du CBZ: {file_list}")
-                    if 'ComicInfo.xml' in file_list:
-                        xml_content = zip_file.read('ComicInfo.xml').decode('utf-8')
-                        print("ComicInfo.xml trouvé et extrait du CBZ")
-            except Exception as zip_error:
-                print(f"Erreur lors de l'extraction du fichier ZIP: {zip_error}")
-                    
-        # Extraction pour fichier CBR (RAR)
-        elif file_path.endswith('.cbr'):
-            try:
-                with rarfile.RarFile(file_path) as rar_file:
-                    file_list = rar_file.namelist()
-                    print(f"Contenu du CBR: {file_list}")
-                    if 'ComicInfo.xml' in file_list:
-                        xml_content = rar_file.read('ComicInfo.xml').decode('utf-8')
-                        print("ComicInfo.xml trouvé et extrait du CBR")
-            except Exception as rar_error:
-                print(f"Erreur lors de l'extraction du fichier RAR: {rar_error}")
-                    
-        if xml_content:
-            # Parser le XML en dictionnaire pour le retourner comme JSON
-            import xml.etree.ElementTree as ET
-            root = ET.fromstring(xml_content)
-            metadata = {}
-            
-            # Extraire tous les éléments du XML
-            for child in root:
-                if child.text and child.text.strip():
-                    metadata[child.tag] = child.text.strip()
-            
-            print(f"Métadonnées extraites avec succès: {metadata}")
+        metadata = get_archive_metadata(file_path)
+        if metadata is not None:
             return jsonify({'metadata': metadata})
         else:
-            print("Aucune métadonnée ComicInfo.xml trouvée.")
             return jsonify({'message': 'Aucune métadonnée ComicInfo.xml trouvée.'}), 404
             
     except Exception as e:
-        print(f"Erreur lors de l'extraction des métadonnées: {e}")
+        metadata_log.exception("Erreur lors de l'extraction des métadonnées", path=file_path)
         return jsonify({'error': str(e)}), 500
 
+@app.route('/extract-metadata/batch', methods=['POST'])
+def extract_metadata_batch():
+    """Stream the metadata of many archives as NDJSON, one ``{filePath, metadata|error}`` per line.
+
+    Body: ``{'filePaths': [...]}`` or ``{'folderPath': ..., 'recursive': false}``.
+    Lines come in completion order; ``metadata`` is null for archives without ComicInfo.xml.
+    """
+    data = request.get_json(silent=True) or {}
+    file_paths = data.get('filePaths')
+    folder_path = data.get('folderPath')
+
+    if file_paths is not None:
+        if not isinstance(file_paths, list):
+            return jsonify({'error': 'filePaths doit être une liste.'}), 400
+    elif folder_path:
+        if not os.path.isdir(folder_path):
+            return jsonify({'error': f"Le dossier '{folder_path}' n'existe pas."}), 404
+        if data.get('recursive'):
+            file_paths = sorted(os.path.join(root, name) for root, _, names in os.walk(folder_path)
+                                for name in names if name.endswith(ARCHIVE_EXTENSIONS))
+        else:
+            file_paths = sorted(os.path.join(folder_path, name) for name in os.listdir(folder_path)
+                                if name.endswith(ARCHIVE_EXTENSIONS))
+    else:
+        return jsonify({'error': 'Le chemin du dossier ou la liste des fichiers est requis.'}), 400
+
+    def lines():
+        for result in iter_archives_metadata(file_paths):
+            yield json.dumps(result) + '\n'
+
+    return Response(lines(), mimetype='application/x-ndjson')
+
+@app.route('/metrics', methods=['GET'])
+def metrics_route():
+    """Request latencies, upstream timings, cache hits/misses and archive I/O in the Prometheus text format."""
+    return Response(metrics.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
 if __name__ == '__main__':
+    # Only in the process serving requests, not in the debug reloader's supervisor
+    if os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+        recover_rename_journals()
+        job_queue.resume()
+        start_library_watcher()
     app.run(host='0.0.0.0', port=3001, debug=True)
\ No newline at end of file
@@ -0,0 +1,332 @@
+"""Benchmark of the backend endpoints on a synthetic library.
+
+    python benchmark.py                                  (default library: 20 folders x 10 CBZ)
+    python benchmark.py --folders 50 --files 20 --pages 40 --save-baseline benchmark-baseline.json
+    python benchmark.py --baseline benchmark-baseline.json    (exit code 1 on regression)
+
+A library of FOLDERS x FILES CBZ archives (PAGES pages each, ComicInfo.xml in a COMICINFO share
+of them) is generated in a temporary directory, deterministically from --seed. The /files,
+/extract-metadata and /update-cbz workloads run through the Flask test client. The Manga-News
+and MangaDex / Jikan proxy paths run against a local stub HTTP server standing in for
+DuckDuckGo, Manga-News and the APIs. Each scenario reports throughput, p50 / p99 latency and
+the peak RSS of the process; /update-cbz also reports how much the archives grew.
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import resource
+import shutil
+import sys
+import tempfile
+import threading
+import time
+import urllib.parse
+import zipfile
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Scenario metrics compared with the baseline, and whether higher is better
+COMPARED_METRICS = {'throughput': True, 'p50': False, 'p99': False}
+
+# --- Synthetic library --- START ---
+
+COMIC_INFO_TEMPLATE = '''<?xml version="1.0" encoding="utf-8"?>
+<ComicInfo>
+  <Series>{series}</Series>
+  <Volume>{volume}</Volume>
+  <Title>{series} {volume}</Title>
+  <Summary>{summary}</Summary>
+</ComicInfo>'''
+
+def series_name(index):
+    return f'Serie Synthetique {index:03}'
+
+def generate_library(root, folders, files, pages, page_size, comic_info_share, seed):
+    """Write ``folders`` x ``files`` CBZ archives below ``root``. Returns the archive paths."""
+    rng = random.Random(seed)
+    # Pages are random bytes (incompressible like JPEG data) and stored, as in real CBZ files
+    page_data = [rng.randbytes(page_size) for _ in range(min(pages, 16))]
+    paths = []
+    for folder_index in range(folders):
+        series = series_name(folder_index)
+        folder = os.path.join(root, series)
+        os.makedirs(folder, exist_ok=True)
+        for volume in range(1, files + 1):
+            path = os.path.join(folder, f'{series} - Tome {volume:02}.cbz')
+            with zipfile.ZipFile(path, 'w', zipfile.ZIP_STORED) as archive:
+                for page in range(pages):
+                    archive.writestr(f'{page + 1:03}.jpg', page_data[(page + volume) % len(page_data)])
+                if rng.random() < comic_info_share:
+                    archive.writestr('ComicInfo.xml', COMIC_INFO_TEMPLATE.format(
+                        series=series, volume=volume, summary='Lorem ipsum. ' * 20),
+                        compress_type=zipfile.ZIP_DEFLATED)
+            paths.append(path)
+    return paths
+
+def library_bytes(paths):
+    return sum(os.path.getsize(path) for path in paths if os.path.exists(path))
+
+# --- Synthetic library --- END ---
+
+# --- Stub upstream server --- START ---
+
+def stub_handler(latency):
+    """Request handler answering like DuckDuckGo, Manga-News, MangaDex and Jikan after ``latency`` seconds."""
+
+    class StubHandler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+        # Headers and body are separate writes: without TCP_NODELAY keep-alive requests wait for delayed ACKs
+        disable_nagle_algorithm = True
+
+        def do_GET(self):
+            if latency:
+                time.sleep(latency)
+            url = urllib.parse.urlsplit(self.path)
+            if url.path.startswith('/html'):
+                title = urllib.parse.parse_qs(url.query).get('q', [''])[0].replace('site:manga-news.com ', '')
+                slug = title.replace(' ', '-')
+                body = ''.join(f'<div class="result"><a class="result__url" href="#">www.manga-news.com/index.php/'
+                               f'{path_type}/{slug}{suffix}</a></div>'
+                               for path_type, suffix in (('serie', ''), ('serie-vo', '-vo'), ('serie', '-coffret')))
+                self._send(200, f'<html><body>{body}</body></html>', 'text/html')
+            elif url.path.startswith('/index.php/'):
+                self._send(200, '<html><body><div id="summary"><div class="bigsize">'
+                                + 'Synopsis de test. ' * 30 + '</div></div></body></html>', 'text/html')
+            else:
+                # MangaDex / Jikan style JSON, never cached so every proxy miss reaches the stub
+                data = [{'id': i, 'title': f'Titre {i}', 'attributes': {'title': {'en': f'Titre {i}'}}} for i in range(10)]
+                self._send(200, json.dumps({'data': data}), 'application/json', {'Cache-Control': 'no-store'})
+
+        def _send(self, status, body, content_type, headers=None):
+            body = body.encode('utf-8')
+            self.send_response(status)
+            self.send_header('Content-Type', content_type)
+            self.send_header('Content-Length', str(len(body)))
+            for name, value in (headers or {}).items():
+                self.send_header(name, value)
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    return StubHandler
+
+def start_stub_server(latency):
+    server = ThreadingHTTPServer(('127.0.0.1', 0), stub_handler(latency))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name='benchmark-stub', daemon=True).start()
+    return server
+
+def point_backend_to_stub(backend, base_url):
+    """Send the scraping and proxy requests of ``backend`` to the stub server."""
+    backend.duckduckgo_search_url = lambda title: f'{base_url}/html/?q={urllib.parse.quote(f"site:manga-news.com {title}")}'
+    backend.manga_news_url = lambda path_type, slug: f'{base_url}/index.php/{path_type}/{slug}'
+    backend.mangadex_upstream.base_url = base_url
+    backend.jikan_upstream.base_url = base_url
+    # The stub answers instantly: don't let the real API rate limits dominate the measure
+    backend.mangadex_upstream.limiter.rate = 0
+    backend.jikan_upstream.limiter.rate = 0
+
+# --- Stub upstream server --- END ---
+
+# --- Measures --- START ---
+
+def percentile(sorted_values, fraction):
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return None
+    index = max(int(round(fraction * len(sorted_values) + 0.5)) - 1, 0)
+    return sorted_values[min(index, len(sorted_values) - 1)]
+
+def peak_rss_kb():
+    usage = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return usage // 1024 if sys.platform == 'darwin' else usage  # bytes on macOS, KiB on Linux
+
+def run_scenario(name, calls, expected=(200,)):
+    """Time every ``call()`` (each returns a test client response) and summarise them."""
+    latencies, errors = [], 0
+    started = time.perf_counter()
+    for call in calls:
+        call_started = time.perf_counter()
+        response = call()
+        response.get_data()  # Streamed bodies are produced while being read
+        latencies.append(time.perf_counter() - call_started)
+        if response.status_code not in expected:
+            errors += 1
+    elapsed = time.perf_counter() - started
+    latencies.sort()
+    result = {
+        'requests': len(latencies),
+        'errors': errors,
+        'seconds': round(elapsed, 4),
+        'throughput': round(len(latencies) / elapsed, 2) if elapsed else None,
+        'p50': round(percentile(latencies, 0.50) * 1000, 3) if latencies else None,
+        'p99': round(percentile(latencies, 0.99) * 1000, 3) if latencies else None,
+        'max': round(latencies[-1] * 1000, 3) if latencies else None,
+        'peakRssKb': peak_rss_kb(),
+    }
+    print(f"{name:<24} {result['requests']:>6} req  {result['throughput'] or 0:>9.1f} req/s  "
+          f"p50 {result['p50'] or 0:>8.2f} ms  p99 {result['p99'] or 0:>8.2f} ms  "
+          f"errors {errors}  rss {result['peakRssKb'] // 1024} MiB")
+    return result
+
+# --- Measures --- END ---
+
+# --- Workloads --- START ---
+
+def run_benchmarks(backend, paths, args):
+    client = backend.app.test_client()
+    repeat = args.repeat
+    results = {}
+
+    # /files: a cold full scan, then the indexed listing (JSON and NDJSON)
+    results['files_scan'] = run_scenario('files_scan', [
+        lambda: client.post('/files/rescan', json={'force': True})] * max(repeat // 10, 1))
+    results['files'] = run_scenario('files', [lambda: client.get('/files')] * repeat)
+    results['files_ndjson'] = run_scenario('files_ndjson', [lambda: client.get('/files?format=ndjson')] * repeat)
+
+    # /extract-metadata: every archive once with empty caches, then again from the metadata cache
+    def extract(path):
+        return lambda: client.post('/extract-metadata', json={'filePath': path})
+    for path in paths:
+        backend.metadata_cache.evict(path)
+    results['extract_metadata_cold'] = run_scenario('extract_metadata_cold', [extract(p) for p in paths], (200, 404))
+    results['extract_metadata_warm'] = run_scenario('extract_metadata_warm', [extract(p) for p in paths], (200, 404))
+
+    # /update-cbz: rewrite every archive with a new ComicInfo.xml, twice (the second replaces the first)
+    size_before = library_bytes(paths)
+    def update(path, rewrite):
+        comic_info = COMIC_INFO_TEMPLATE.format(series=os.path.basename(os.path.dirname(path)), volume=rewrite,
+                                                summary='Résumé mis à jour. ' * 20)
+        return lambda: client.post('/update-cbz', json={'filePath': path, 'comicInfoXML': comic_info})
+    results['update_cbz'] = run_scenario('update_cbz', [update(p, rewrite) for rewrite in (1, 2) for p in paths])
+    size_after = library_bytes(paths)
+    results['update_cbz'].update(bytesBefore=size_before, bytesAfter=size_after,
+                                 growth=size_after - size_before,
+                                 growthPercent=round((size_after - size_before) * 100 / size_before, 3))
+
+    # Manga-News: unknown titles (DuckDuckGo search + scraping on the stub), then the same titles from cache
+    titles = [f'Benchmark Titre {i} {random.Random(args.seed + i).randint(0, 10 ** 9)}' for i in range(repeat)]
+    def manga_news(title):
+        return lambda: client.get(f'/manga-news/{urllib.parse.quote(title)}')
+    results['manga_news_miss'] = run_scenario('manga_news_miss', [manga_news(t) for t in titles])
+    results['manga_news_hit'] = run_scenario('manga_news_hit', [manga_news(t) for t in titles])
+
+    # MangaDex / Jikan proxies: the stub forbids caching, so every request reaches it
+    results['proxy_mangadex'] = run_scenario('proxy_mangadex', [
+        lambda i=i: client.get(f'/proxy/mangadex/manga?title=t{i}') for i in range(repeat)])
+    results['proxy_jikan'] = run_scenario('proxy_jikan', [
+        lambda i=i: client.get(f'/proxy/jikan/anime?q=t{i}') for i in range(repeat)])
+    return results
+
+# --- Workloads --- END ---
+
+# --- Baseline --- START ---
+
+def compare_with_baseline(results, baseline, tolerance):
+    """Return the scenario metrics that got worse than ``baseline`` by more than ``tolerance`` (a ratio)."""
+    regressions = []
+    for name, result in results['scenarios'].items():
+        previous = baseline.get('scenarios', {}).get(name)
+        if not previous:
+            continue
+        for metric, higher_is_better in COMPARED_METRICS.items():
+            before, after = previous.get(metric), result.get(metric)
+            if not before or after is None:
+                continue
+            change = (after - before) / before
+            worse = -change if higher_is_better else change
+            if worse > tolerance:
+                regressions.append({'scenario': name, 'metric': metric, 'baseline': before, 'current': after,
+                                    'change': round(change * 100, 1)})
+    return regressions
+
+# --- Baseline --- END ---
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark of the backend endpoints on a synthetic library.')
+    parser.add_argument('--folders', type=int, default=20, help='series folders (default: 20)')
+    parser.add_argument('--files', type=int, default=10, help='CBZ files per folder (default: 10)')
+    parser.add_argument('--pages', type=int, default=20, help='pages per CBZ (default: 20)')
+    parser.add_argument('--page-size', type=int, default=64 * 1024, help='bytes per page (default: 65536)')
+    parser.add_argument('--comicinfo', type=float, default=0.5,
+                        help='share of the archives with a ComicInfo.xml, 0-1 (default: 0.5)')
+    parser.add_argument('--repeat', type=int, default=50,
+                        help='requests of the /files, Manga-News and proxy scenarios (default: 50)')
+    parser.add_argument('--stub-latency', type=float, default=0.0,
+                        help='delay of the stub upstream server in milliseconds (default: 0)')
+    parser.add_argument('--seed', type=int, default=1, help='seed of the synthetic library (default: 1)')
+    parser.add_argument('--workdir', help='directory of the library and caches (default: a temporary one, removed)')
+    parser.add_argument('--output', help='write the results to this JSON file')
+    parser.add_argument('--save-baseline', metavar='PATH', help='write the results as the new baseline')
+    parser.add_argument('--baseline', metavar='PATH', help='compare with this baseline; exit code 1 on regression')
+    parser.add_argument('--tolerance', type=float, default=0.2,
+                        help='allowed degradation before a metric counts as a regression (default: 0.2 = 20%%)')
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+    workdir = args.workdir or tempfile.mkdtemp(prefix='mangatagger-bench-')
+    library_root = os.path.join(workdir, 'files')
+    shutil.rmtree(library_root, ignore_errors=True)
+    shutil.rmtree(os.path.join(workdir, 'cache'), ignore_errors=True)
+
+    print(f'Bibliothèque : {args.folders} dossiers x {args.files} CBZ x {args.pages} pages dans {workdir}')
+    started = time.perf_counter()
+    paths = generate_library(library_root, args.folders, args.files, args.pages, args.page_size,
+                             args.comicinfo, args.seed)
+    print(f'Générée en {time.perf_counter() - started:.1f} s ({library_bytes(paths) / 1024 / 1024:.1f} Mio)')
+
+    # The backend reads its configuration at import time
+    os.environ.update({
+        'FILES_PATH': library_root,
+        'CACHE_DIR': os.path.join(workdir, 'cache'),
+        'LIBRARY_WATCH': 'off',
+        'THUMBNAIL_PREFETCH': '0',
+        'LOG_LEVEL': os.environ.get('LOG_LEVEL', 'warning'),
+    })
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    import backend
+
+    stub = start_stub_server(args.stub_latency / 1000)
+    point_backend_to_stub(backend, f'http://127.0.0.1:{stub.server_port}')
+    try:
+        scenarios = run_benchmarks(backend, paths, args)
+    finally:
+        stub.shutdown()
+        if not args.workdir:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    results = {
+        'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'parameters': {key: value for key, value in vars(args).items()
+                       if key not in ('output', 'save_baseline', 'baseline', 'workdir')},
+        'peakRssKb': peak_rss_kb(),
+        'scenarios': scenarios,
+    }
+    for path in (args.output, args.save_baseline):
+        if path:
+            with open(path, 'w', encoding='utf-8') as f:
+                json.dump(results, f, indent=2, ensure_ascii=False)
+                f.write('\n')
+
+    if not args.baseline:
+        return 0
+    with open(args.baseline, encoding='utf-8') as f:
+        baseline = json.load(f)
+    if baseline.get('parameters') != results['parameters']:
+        print('Attention : paramètres différents de ceux de la référence, comparaison indicative.')
+    regressions = compare_with_baseline(results, baseline, args.tolerance)
+    for regression in regressions:
+        print(f"Régression {regression['scenario']}.{regression['metric']} : {regression['baseline']} -> "
+              f"{regression['current']} ({regression['change']:+.1f} %)")
+    if not regressions:
+        print(f'Aucune régression au-delà de {args.tolerance:.0%} par rapport à {args.baseline}')
+    return 1 if regressions else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,11 +1,89 @@
-import React, { useEffect, useState } from 'react';
+import React, { useEffect, useRef, useState } from 'react';
 import { Folder, CheckCircle } from 'lucide-react';
 import { useTheme } from '../../context/ThemeContext';
 import { useMangaTagger } from '../../context/MangaTaggerContext';
-import { MangaFolder } from '../../types';
+import { CBZFile, MangaFolder } from '../../types';
 
 let isFetching = false;
 
+// Changement envoyé par GET /files/events
+interface LibraryChange {
+  type: 'add' | 'modify' | 'remove' | 'rename';
+  kind: 'file' | 'directory';
+  path: string;
+  oldPath?: string;
+  folder?: string;
+  name: string;
+  hasSidecar?: boolean;
+}
+
+const dirname = (path: string) => path.slice(0, path.lastIndexOf('/'));
+const basename = (path: string) => path.slice(path.lastIndexOf('/') + 1);
+const isInside = (path: string, dir: string) => path === dir || path.startsWith(`${dir}/`);
+
+const libraryFolder = (path: string): MangaFolder => ({ id: path, name: basename(path), path, files: [] });
+
+const libraryChangeToFile = (change: LibraryChange): CBZFile => ({
+  id: change.path,
+  name: change.name,
+  path: change.path,
+  hasSidecar: change.hasSidecar ?? false,
+});
+
+// Applique un lot de changements à la liste des dossiers, sans recharger /files
+const applyLibraryChanges = (folders: MangaFolder[], changes: LibraryChange[]): MangaFolder[] => {
+  const byPath = new Map(folders.map(folder => [folder.path, folder]));
+
+  const removeFile = (path: string) => {
+    const folder = byPath.get(dirname(path));
+    if (folder) {
+      byPath.set(folder.path, { ...folder, files: folder.files.filter(file => file.path !== path) });
+    }
+  };
+
+  const addFile = (change: LibraryChange) => {
+    const folderPath = change.folder ?? dirname(change.path);
+    const folder = byPath.get(folderPath) ?? libraryFolder(folderPath);
+    const file = libraryChangeToFile(change);
+    const files = [...folder.files.filter(f => f.path !== change.path), file].sort((a, b) => a.name.localeCompare(b.name));
+    byPath.set(folderPath, { ...folder, files });
+  };
+
+  for (const change of changes) {
+    if (change.kind === 'directory') {
+      // Un dossier ajouté apparaît avec ses archives, dans les changements suivants
+      if (change.type === 'remove') {
+        [...byPath.keys()].filter(path => isInside(path, change.path)).forEach(path => byPath.delete(path));
+      } else if (change.type === 'rename' && change.oldPath) {
+        const oldPath = change.oldPath;
+        for (const [path, folder] of [...byPath]) {
+          if (!isInside(path, oldPath)) continue;
+          const newPath = change.path + path.slice(oldPath.length);
+          byPath.delete(path);
+          byPath.set(newPath, {
+            ...folder,
+            id: newPath,
+            name: basename(newPath),
+            path: newPath,
+            files: folder.files.map(file => ({ ...file, id: `${newPath}/${file.name}`, path: `${newPath}/${file.name}` })),
+          });
+        }
+      }
+      continue;
+    }
+    if (change.type === 'remove' || change.type === 'rename') {
+      removeFile(change.oldPath ?? change.path);
+    }
+    if (change.type !== 'remove') {
+      addFile(change);
+    }
+  }
+
+  return [...byPath.values()]
+    .filter(folder => folder.files.length > 0)
+    .sort((a, b) => (a.path < b.path ? -1 : a.path > b.path ? 1 : 0));
+};
+
 const FilePanel: React.FC = () => {
   const { 
     mangaFolders = [], 
@@ -18,6 +96,12 @@ const FilePanel: React.FC = () => {
   const { theme } = useTheme();
   const [loading, setLoading] = useState(false);
   const [error, setError] = useState<string | null>(null);
+  const foldersRef = useRef<MangaFolder[]>([]);
+
+  const showFolders = (folders: MangaFolder[]) => {
+    foldersRef.current = folders;
+    setAllMangaFolders(folders);
+  };
 
   const handleFolderClick = (folderId: string) => {
     if (selectedFolder === folderId) {
@@ -37,22 +121,37 @@ const FilePanel: React.FC = () => {
     setError(null);
 
     try {
-      const response = await fetch(`${import.meta.env.VITE_BACKEND_URL}/files`);
-      if (!response.ok) {
+      // Flux NDJSON : un dossier par ligne, affiché dès qu'il arrive
+      const response = await fetch(`${import.meta.env.VITE_BACKEND_URL}/files?format=ndjson`);
+      if (!response.ok || !response.body) {
         throw new Error(`Erreur HTTP : ${response.status}`);
       }
 
-      const folders: MangaFolder[] = await response.json();
-      console.log('Données reçues du backend :', folders);
+      const reader = response.body.getReader();
+      const decoder = new TextDecoder();
+      const folders: MangaFolder[] = [];
+      let buffer = '';
+
+      for (;;) {
+        const { done, value } = await reader.read();
+        buffer += decoder.decode(value, { stream: !done });
+        const lines = buffer.split('\n');
+        buffer = done ? '' : lines.pop() ?? '';
 
-      // Traiter les dossiers et définir les valeurs par défaut
-      const processedFolders = folders.map(folder => ({
-        ...folder,
-        files: folder.files || [],
-      }));
+        const received = lines
+          .filter(line => line.trim())
+          .map(line => JSON.parse(line) as MangaFolder)
+          .map(folder => ({ ...folder, files: folder.files || [] }));
 
-      // Mettre à jour tous les dossiers d'un coup
-      setAllMangaFolders(processedFolders);
+        if (received.length) {
+          folders.push(...received);
+          // Mettre à jour les dossiers au fur et à mesure du flux
+          showFolders([...folders]);
+          setLoading(false);
+        }
+        if (done) break;
+      }
+      console.log('Données reçues du backend :', folders.length, 'dossiers');
     } catch (err) {
       console.error('Erreur lors de la récupération des fichiers :', err);
       setError('Impossible de récupérer les fichiers.');
@@ -69,6 +168,17 @@ const FilePanel: React.FC = () => {
     fetchFilesFromServer();
   }, []); // Assurez-vous que le tableau de dépendances est vide
 
+  // Suivre les changements de la bibliothèque (ajouts, suppressions, renommages)
+  useEffect(() => {
+    const events = new EventSource(`${import.meta.env.VITE_BACKEND_URL}/files/events`);
+    events.onmessage = (event) => {
+      showFolders(applyLibraryChanges(foldersRef.current, JSON.parse(event.data) as LibraryChange[]));
+    };
+    // Des changements ont été perdus : recharger la liste complète
+    events.addEventListener('reset', () => fetchFilesFromServer());
+    return () => events.close();
+  }, []);
+
   return (
     <div
       className={`fade-in h-full flex flex-col`}
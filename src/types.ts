@@ -35,21 +35,23 @@ export interface MangaDetail {
 }
 
 // Types for CBZ files and folders
+// GET /files and the /files/events changes send neither size nor tagged
 export interface MangaFolder {
   id: string;
   name: string;
   path: string;
   files: CBZFile[];
-  tagged: boolean;
+  tagged?: boolean;
   mangaId?: number;
 }
 
 export interface CBZFile {
   id: string;
   name: string;
-  size: string;
+  size?: string;
   path: string;
+  hasSidecar?: boolean;
   volume?: number;
-  tagged: boolean;
+  tagged?: boolean;
   mangaId?: number;
 }
\ No newline at end of file
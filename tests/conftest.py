@@ -0,0 +1,45 @@
+import os
+import shutil
+import sys
+import tempfile
+import zipfile
+
+import pytest
+
+# backend reads its configuration at import time: point it to a throwaway library and cache
+_ROOT = tempfile.mkdtemp(prefix='backend-tests-')
+os.environ['FILES_PATH'] = os.path.join(_ROOT, 'files')
+os.environ['CACHE_DIR'] = os.path.join(_ROOT, 'cache')
+os.environ.setdefault('THUMBNAIL_PREFETCH', '0')
+os.environ.setdefault('LOG_LEVEL', 'off')
+os.makedirs(os.environ['FILES_PATH'], exist_ok=True)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import backend as backend_module  # noqa: E402
+
+
+@pytest.fixture
+def backend():
+    return backend_module
+
+
+@pytest.fixture
+def library(backend):
+    """Empty library directory, cleared after the test."""
+    yield backend.FILES_PATH
+    for name in os.listdir(backend.FILES_PATH):
+        shutil.rmtree(os.path.join(backend.FILES_PATH, name), ignore_errors=True)
+    backend.library_index.scan(force=True)
+
+
+def write_cbz(path, pages):
+    """Write a CBZ archive whose members are ``pages`` (``{name: bytes}``)."""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with zipfile.ZipFile(path, 'w') as archive:
+        for name, data in pages.items():
+            archive.writestr(name, data)
+
+
+@pytest.fixture
+def make_cbz():
+    return write_cbz
@@ -0,0 +1,46 @@
+import io
+import zipfile
+
+import archive_workers
+
+
+class Unseekable(io.RawIOBase):
+    """Write-only stream: zipfile then writes data descriptors after the members."""
+
+    def __init__(self):
+        super().__init__()
+        self.buffer = io.BytesIO()
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        return self.buffer.write(data)
+
+
+def test_rewrite_cbz_copies_members_raw(tmp_path):
+    pages = {'001.jpg': b'\xff\xd8' + bytes(range(256)) * 40, '002.png': b'png' * 3000, 'notes.txt': b'text ' * 500}
+    stream = Unseekable()
+    with zipfile.ZipFile(stream, 'w') as archive:
+        archive.writestr('001.jpg', pages['001.jpg'], compress_type=zipfile.ZIP_STORED)
+        archive.writestr('002.png', pages['002.png'], compress_type=zipfile.ZIP_DEFLATED)
+        with archive.open('notes.txt', 'w', force_zip64=True) as member:
+            member.write(pages['notes.txt'])
+        archive.writestr('ComicInfo.xml', '<ComicInfo><Title>old</Title></ComicInfo>')
+    path = tmp_path / 'Tome 01.cbz'
+    path.write_bytes(stream.buffer.getvalue())
+    with zipfile.ZipFile(path) as archive:
+        assert all(info.flag_bits & 0x08 for info in archive.infolist())
+
+    summary = archive_workers.rewrite_cbz(str(path), '<ComicInfo><Title>new</Title></ComicInfo>')
+
+    assert (summary['entriesBefore'], summary['entriesAfter']) == (4, 4)
+    with zipfile.ZipFile(path) as archive:
+        assert archive.testzip() is None
+        assert archive.namelist() == ['001.jpg', '002.png', 'notes.txt', 'ComicInfo.xml']
+        assert {name: archive.read(name) for name in pages} == pages
+        assert archive.read('ComicInfo.xml') == b'<ComicInfo><Title>new</Title></ComicInfo>'
+        stored = archive.getinfo('001.jpg')
+        with open(path, 'rb') as f:
+            f.seek(archive_workers.zip_data_offset(f, stored))
+            assert f.read(stored.file_size) == pages['001.jpg']
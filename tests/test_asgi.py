@@ -0,0 +1,41 @@
+import asyncio
+import time
+
+import asgi
+
+
+def endless_stream(environ, start_response):
+    start_response('200 OK', [('Content-Type', 'text/event-stream')])
+
+    def events():
+        while True:
+            yield b': keep-alive\n\n'
+            time.sleep(0.01)
+    return events()
+
+
+def test_bridge_returns_after_client_disconnects():
+    bridge = asgi.WsgiBridge(endless_stream, max_workers=2)
+    scope = {'type': 'http', 'method': 'GET', 'path': '/files/events', 'query_string': b'', 'headers': [],
+             'server': ('testserver', 80), 'http_version': '1.1', 'scheme': 'http'}
+    sent, received = [], []
+    disconnect = asyncio.Event()
+
+    async def receive():
+        received.append(True)
+        if len(received) == 1:
+            return {'type': 'http.request', 'body': b'', 'more_body': False}
+        await disconnect.wait()
+        return {'type': 'http.disconnect'}
+
+    async def send(message):
+        sent.append(message)
+        if len(sent) == 3:
+            disconnect.set()
+
+    async def run():
+        await asyncio.wait_for(bridge(scope, receive, send), timeout=5)
+
+    asyncio.run(run())
+    assert sent[0]['type'] == 'http.response.start' and len(sent) >= 3
+    bridge.executor.shutdown(wait=True)
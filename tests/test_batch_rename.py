@@ -0,0 +1,124 @@
+import json
+import os
+
+import pytest
+
+
+@pytest.mark.parametrize('template', ['{name.__class__}', '{name[0]}', '{0}', '{title:d}', '{missing}'])
+def test_invalid_templates_are_rejected(backend, library, make_cbz, template):
+    folder = os.path.join(library, 'Serie')
+    make_cbz(os.path.join(folder, 'Tome 1.cbz'), {'page1.jpg': b'page'})
+
+    response = backend.app.test_client().post('/rename/batch', json={'folderPath': folder, 'template': template})
+    assert response.status_code == 400
+    assert 'Modèle de nom invalide' in response.get_json()['error']
+
+
+def test_template_renders_the_fields(backend, library, make_cbz):
+    folder = os.path.join(library, 'Serie')
+    make_cbz(os.path.join(folder, 'Tome 1.cbz'), {'page1.jpg': b'page'})
+
+    response = backend.app.test_client().post(
+        '/rename/batch', json={'folderPath': folder, 'template': '{series} - Tome {volume:02}'})
+    assert response.status_code == 200
+    assert response.get_json()['renames'] == [
+        {'from': os.path.join(folder, 'Tome 1.cbz'), 'to': os.path.join(folder, 'Serie - Tome 01.cbz')}]
+
+
+def _journals(backend):
+    if not os.path.isdir(backend.RENAME_JOURNAL_DIR):
+        return []
+    return os.listdir(backend.RENAME_JOURNAL_DIR)
+
+
+def _make_archives(folder, names):
+    os.makedirs(folder, exist_ok=True)
+    for name in names:
+        with open(os.path.join(folder, name), 'w') as handle:
+            handle.write(name)
+
+
+def _contents(folder):
+    result = {}
+    for name in sorted(os.listdir(folder)):
+        with open(os.path.join(folder, name)) as handle:
+            result[name] = handle.read()
+    return result
+
+
+def _plan(backend, folder, mapping):
+    return backend.plan_batch_rename(folder, [(os.path.join(folder, old), new) for old, new in mapping.items()])
+
+
+def test_swap_goes_through_a_temporary_name(backend, library):
+    folder = os.path.join(library, 'Serie')
+    _make_archives(folder, ['A.cbz', 'B.cbz'])
+
+    plan = _plan(backend, folder, {'A.cbz': 'B.cbz', 'B.cbz': 'A.cbz'})
+    assert plan['conflicts'] == [] and plan['cycles'] == 1
+    assert backend.apply_batch_rename(plan) == (True, None)
+    assert _contents(folder) == {'A.cbz': 'B.cbz', 'B.cbz': 'A.cbz'}
+    assert _journals(backend) == []
+
+
+def test_three_way_cycle(backend, library):
+    folder = os.path.join(library, 'Serie')
+    _make_archives(folder, ['A.cbz', 'B.cbz', 'C.cbz'])
+
+    plan = _plan(backend, folder, {'A.cbz': 'B.cbz', 'B.cbz': 'C.cbz', 'C.cbz': 'A.cbz'})
+    assert plan['cycles'] == 1 and len(plan['steps']) == 4
+    assert backend.apply_batch_rename(plan) == (True, None)
+    assert _contents(folder) == {'A.cbz': 'C.cbz', 'B.cbz': 'A.cbz', 'C.cbz': 'B.cbz'}
+
+
+def test_failure_in_the_middle_rolls_the_batch_back(backend, library):
+    folder = os.path.join(library, 'Serie')
+    _make_archives(folder, ['1.cbz', '2.cbz', '3.cbz'])
+    plan = _plan(backend, folder, {'1.cbz': 'Tome 1.cbz', '2.cbz': 'Tome 2.cbz', '3.cbz': 'Tome 3.cbz'})
+    # Taken after the plan was made: the last step fails
+    _make_archives(folder, ['Tome 3.cbz'])
+
+    success, error = backend.apply_batch_rename(plan)
+    assert not success and error['rolledBack'] and error['rollbackErrors'] == []
+    assert _contents(folder) == {'1.cbz': '1.cbz', '2.cbz': '2.cbz', '3.cbz': '3.cbz', 'Tome 3.cbz': 'Tome 3.cbz'}
+    assert _journals(backend) == []
+
+
+def test_recovery_only_retries_the_undos_that_failed(backend, library, monkeypatch):
+    folder = os.path.join(library, 'Serie')
+    _make_archives(folder, ['1.cbz', '2.cbz', '3.cbz'])
+    plan = _plan(backend, folder, {'1.cbz': 'Tome 1.cbz', '2.cbz': 'Tome 2.cbz', '3.cbz': 'Tome 3.cbz'})
+    _make_archives(folder, ['Tome 3.cbz'])
+    move_archive = backend._move_archive
+
+    def failing_undo(source, target):
+        if source == os.path.join(folder, 'Tome 1.cbz'):
+            raise PermissionError('refusé')
+        move_archive(source, target)
+
+    monkeypatch.setattr(backend, '_move_archive', failing_undo)
+    success, error = backend.apply_batch_rename(plan)
+    assert not success and not error['rolledBack'] and len(error['rollbackErrors']) == 1
+    [journal] = _journals(backend)
+    assert backend.RenameJournal.read(os.path.join(backend.RENAME_JOURNAL_DIR, journal))[1] == [0]
+
+    monkeypatch.setattr(backend, '_move_archive', move_archive)
+    backend.recover_rename_journals()
+    assert _contents(folder) == {'1.cbz': '1.cbz', '2.cbz': '2.cbz', '3.cbz': '3.cbz', 'Tome 3.cbz': 'Tome 3.cbz'}
+    assert _journals(backend) == []
+
+
+def test_recovery_from_a_truncated_journal(backend, library):
+    folder = os.path.join(library, 'Serie')
+    _make_archives(folder, ['1.cbz', '2.cbz', '3.cbz'])
+    steps = [[os.path.join(folder, f'{n}.cbz'), os.path.join(folder, f'Tome {n}.cbz')] for n in (1, 2, 3)]
+    # Crash while recording the second step: it was done but its line is torn
+    for source, target in steps[:2]:
+        os.rename(source, target)
+    os.makedirs(backend.RENAME_JOURNAL_DIR, exist_ok=True)
+    with open(os.path.join(backend.RENAME_JOURNAL_DIR, 'crash.jsonl'), 'w') as handle:
+        handle.write(json.dumps({'steps': steps}) + '\n' + json.dumps({'done': 0}) + '\n{"do')
+
+    backend.recover_rename_journals()
+    assert _contents(folder) == {'1.cbz': '1.cbz', '2.cbz': '2.cbz', '3.cbz': '3.cbz'}
+    assert _journals(backend) == []
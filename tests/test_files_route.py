@@ -0,0 +1,47 @@
+import json
+import os
+
+import pytest
+
+
+@pytest.fixture
+def series(library, make_cbz):
+    """Five series folders of two archives each."""
+    names = [f'Serie {letter}' for letter in 'ABCDE']
+    for name in names:
+        for volume in (1, 2):
+            make_cbz(os.path.join(library, name, f'Tome {volume}.cbz'), {'page1.jpg': b'page'})
+    return [os.path.join(library, name) for name in names]
+
+
+def test_files_pages_follow_the_cursor(backend, series):
+    client = backend.app.test_client()
+    seen, cursor = [], None
+    while True:
+        query = {'limit': 2, 'refresh': 1} if cursor is None else {'limit': 2, 'cursor': cursor}
+        page = client.get('/files', query_string=query).get_json()
+        assert len(page['folders']) <= 2
+        seen.extend(folder['path'] for folder in page['folders'])
+        cursor = page['nextCursor']
+        if cursor is None:
+            break
+    assert seen == series
+    assert client.get('/files', query_string={'limit': 'x'}).status_code == 400
+
+
+def test_files_without_pagination_keep_the_list_format(backend, series):
+    folders = backend.app.test_client().get('/files', query_string={'refresh': 1, 'prefix': 'serie b'}).get_json()
+    assert [folder['name'] for folder in folders] == ['Serie B']
+    assert [archive['name'] for archive in folders[0]['files']] == ['Tome 1.cbz', 'Tome 2.cbz']
+
+
+@pytest.mark.parametrize('refresh', ['1', '0'])
+def test_files_ndjson_streams_one_folder_per_line(backend, series, refresh):
+    if refresh == '0':
+        backend.library_index.scan()  # Fresh index: the folders are read from it, page by page
+    response = backend.app.test_client().get('/files', query_string={'format': 'ndjson', 'refresh': refresh})
+    assert response.mimetype == 'application/x-ndjson'
+    lines = response.get_data(as_text=True).splitlines()
+    folders = [json.loads(line) for line in lines]
+    assert [folder['path'] for folder in folders] == series
+    assert all(len(folder['files']) == 2 for folder in folders)
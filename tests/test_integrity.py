@@ -0,0 +1,36 @@
+import os
+import time
+
+
+def wait_for_scan(client):
+    deadline = time.time() + 30
+    while client.get('/integrity/scan').json['running']:
+        assert time.time() < deadline
+        time.sleep(0.05)
+    return client.get('/integrity/scan').json
+
+
+def test_archive_rewritten_in_place_is_checked_again(backend, library, make_cbz):
+    client = backend.app.test_client()
+    folder = os.path.join(library, 'Serie')
+    path = os.path.join(folder, 'Tome 01.cbz')
+    make_cbz(path, {'001.jpg': b'a' * 1000, '002.jpg': b'b' * 1000})
+    make_cbz(os.path.join(folder, 'Tome 02.cbz'), {'001.jpg': b'c' * 1000})
+
+    assert client.post('/integrity/scan', json={}).status_code == 202
+    assert wait_for_scan(client)['checked'] == 2
+
+    # Same directory entries, so the directory mtime (and the library index row) stays the same
+    folder_mtime = os.stat(folder).st_mtime_ns
+    with open(path, 'r+b') as f:
+        data = bytearray(f.read())
+        data[60] ^= 0xff
+        f.seek(0)
+        f.write(data)
+    os.utime(path, ns=(time.time_ns(), os.stat(path).st_mtime_ns + 10**9))
+    os.utime(folder, ns=(folder_mtime, folder_mtime))
+
+    client.post('/integrity/scan', json={})
+    scan = wait_for_scan(client)
+    assert (scan['checked'], scan['skipped'], scan['corrupt']) == (1, 1, 1)
+    assert [entry['path'] for entry in client.get('/integrity/report').json['corrupt']] == [path]
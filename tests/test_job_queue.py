@@ -0,0 +1,87 @@
+import threading
+import time
+
+import pytest
+
+
+class Calls(list):
+    pass
+
+
+@pytest.fixture
+def calls(backend, monkeypatch):
+    """Inputs seen by a test 'echo' job type, whose steps can be held with ``calls.gate``."""
+    seen = Calls()
+    seen.gate = threading.Event()
+    seen.gate.set()
+
+    def echo(step):
+        seen.append(step['value'])
+        seen.gate.wait(5)
+        return {'value': step['value']}
+
+    monkeypatch.setitem(backend.JOB_TYPES, 'echo', (echo, ('value',)))
+    return seen
+
+
+@pytest.fixture
+def store_path(tmp_path):
+    return str(tmp_path / 'jobs.sqlite3')
+
+
+def _wait_finished(store, job_id, timeout=5):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        summary = store.summary(job_id)
+        if summary['finished'] is not None:
+            return summary
+        time.sleep(0.01)
+    raise AssertionError(f'job {job_id} did not finish')
+
+
+def test_unfinished_job_resumes_with_its_remaining_steps(backend, calls, store_path):
+    # A previous process ran the first step and died
+    store = backend.JobStore(store_path)
+    store.create('job1', 'echo', [{'value': 1}, {'value': 2}, {'value': 3}])
+    store.set_status('job1', 'running', started=time.time())
+    store.finish_step('job1', 0, 'done', {'value': 1})
+
+    store = backend.JobStore(store_path)
+    backend.JobQueue(store, {'echo': 1}).resume()
+    summary = _wait_finished(store, 'job1')
+
+    assert sorted(calls) == [2, 3]
+    assert summary['status'] == 'done' and summary['completed'] == 3 and summary['failed'] == 0
+    assert [step['result'] for step in store.steps('job1')] == [{'value': 1}, {'value': 2}, {'value': 3}]
+
+
+def test_cancel_skips_the_steps_not_started(backend, calls, store_path):
+    store = backend.JobStore(store_path)
+    queue = backend.JobQueue(store, {'echo': 1})
+    calls.gate.clear()
+    job_id = queue.submit('echo', [{'value': 1}, {'value': 2}, {'value': 3}])
+    deadline = time.monotonic() + 5
+    while not calls and time.monotonic() < deadline:
+        time.sleep(0.01)
+
+    assert queue.cancel(job_id)
+    calls.gate.set()
+    summary = _wait_finished(store, job_id)
+
+    assert calls == [1]
+    assert summary['status'] == 'cancelled' and summary['cancelled'] == 2
+    assert not queue.cancel(job_id)
+
+
+def test_job_cancelled_before_a_restart_is_not_resumed(backend, calls, store_path):
+    store = backend.JobStore(store_path)
+    store.create('job1', 'echo', [{'value': 1}, {'value': 2}])
+    queue = backend.JobQueue(store, {'echo': 1})
+
+    # Not running in this process: its pending steps are cancelled in the store
+    assert queue.cancel('job1')
+    queue.resume()
+
+    summary = store.summary('job1')
+    assert calls == []
+    assert summary['status'] == 'cancelled' and summary['cancelled'] == 2 and summary['finished'] is not None
@@ -0,0 +1,60 @@
+def _file(backend, change_type, path, mtime=1.0, size=10, old_path=None):
+    change = backend.file_change(change_type, path, mtime, size, False)
+    if old_path is not None:
+        change['oldPath'] = old_path
+    return change
+
+
+def _summary(changes):
+    return [(c['type'], c['path'], c.get('oldPath')) for c in changes]
+
+
+def test_successive_changes_of_an_archive_collapse(backend):
+    coalesce = backend.coalesce_changes
+    assert _summary(coalesce([_file(backend, 'add', '/a.cbz'), _file(backend, 'modify', '/a.cbz', size=20)])) == [
+        ('add', '/a.cbz', None)]
+    assert coalesce([_file(backend, 'add', '/a.cbz'), _file(backend, 'remove', '/a.cbz')]) == []
+    assert _summary(coalesce([_file(backend, 'remove', '/a.cbz'), _file(backend, 'add', '/a.cbz', size=20)])) == [
+        ('modify', '/a.cbz', None)]
+    merged = coalesce([_file(backend, 'modify', '/a.cbz'), _file(backend, 'modify', '/a.cbz', size=30)])
+    assert _summary(merged) == [('modify', '/a.cbz', None)] and merged[0]['size'] == 30
+
+
+def test_renames_chain_and_pair_up(backend):
+    coalesce = backend.coalesce_changes
+    # a -> b -> c is one rename from a
+    assert _summary(coalesce([_file(backend, 'rename', '/b.cbz', old_path='/a.cbz'),
+                              _file(backend, 'rename', '/c.cbz', old_path='/b.cbz')])) == [
+        ('rename', '/c.cbz', '/a.cbz')]
+    # A renamed archive removed afterwards is the removal of its original path
+    assert _summary(coalesce([_file(backend, 'rename', '/b.cbz', old_path='/a.cbz'),
+                              _file(backend, 'remove', '/b.cbz')])) == [('remove', '/a.cbz', None)]
+    # An added archive renamed is still an add, under its new name
+    assert _summary(coalesce([_file(backend, 'add', '/a.cbz'),
+                              _file(backend, 'rename', '/b.cbz', old_path='/a.cbz')])) == [('add', '/b.cbz', None)]
+    # A removal and an add with the same (mtime, size) become a rename, unless it is ambiguous
+    assert _summary(coalesce([_file(backend, 'remove', '/a.cbz'), _file(backend, 'add', '/b.cbz')])) == [
+        ('rename', '/b.cbz', '/a.cbz')]
+    ambiguous = [_file(backend, 'remove', '/a.cbz'), _file(backend, 'add', '/b.cbz'), _file(backend, 'add', '/c.cbz')]
+    assert [c['type'] for c in coalesce(ambiguous)] == ['remove', 'add', 'add']
+
+
+def test_directory_changes_are_kept_in_order(backend):
+    changes = [backend.directory_change('add', '/Serie'), _file(backend, 'add', '/Serie/a.cbz'),
+               backend.directory_change('remove', '/Old'), backend.directory_change('add', '/Serie')]
+    assert [(c['kind'], c['type'], c['path']) for c in backend.coalesce_changes(changes)] == [
+        ('directory', 'add', '/Serie'), ('file', 'add', '/Serie/a.cbz'),
+        ('directory', 'remove', '/Old'), ('directory', 'add', '/Serie')]
+
+
+def test_events_are_published_as_one_coalesced_batch(backend):
+    events = backend.LibraryEvents(debounce=60)
+    events.publish([_file(backend, 'add', '/a.cbz')])
+    events.publish([_file(backend, 'modify', '/a.cbz', size=20), _file(backend, 'add', '/b.cbz', size=5)])
+    events._timer.cancel()
+    events.flush()
+
+    [(event_id, batch)] = events.since(0, timeout=0)
+    assert event_id == 1 and _summary(batch) == [('add', '/a.cbz', None), ('add', '/b.cbz', None)]
+    assert events.since(1, timeout=0) == []
+    assert events.since(5, timeout=0) is None  # Id from a previous run: reload /files
@@ -0,0 +1,60 @@
+import os
+
+
+def _touch(path, mtime=None):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'wb') as handle:
+        handle.write(b'archive')
+    if mtime is not None:
+        os.utime(path, (mtime, mtime))
+
+
+def _names(index):
+    return [os.path.basename(path) for path, _, _ in index.archives()]
+
+
+def test_rescan_reuses_unchanged_directories(backend, tmp_path):
+    root = tmp_path / 'library'
+    folder = str(root / 'Serie')
+    _touch(os.path.join(folder, 'Tome 1.cbz'))
+    _touch(os.path.join(folder, 'Tome 2.cbz'))
+    index = backend.LibraryIndex(str(tmp_path / 'library.sqlite3'), str(root))
+    changes = []
+    index.add_listener(changes.extend)
+
+    assert index.scan()['rescanned'] == 2
+    assert _names(index) == ['Tome 1.cbz', 'Tome 2.cbz']
+    assert sorted(c['name'] for c in changes if c['kind'] == 'file') == ['Tome 1.cbz', 'Tome 2.cbz']
+
+    # Same directory mtime: the stored rows are reused without listing the directory
+    mtime = os.stat(folder).st_mtime
+    _touch(os.path.join(folder, 'Tome 3.cbz'))
+    os.utime(folder, (mtime, mtime))
+    changes.clear()
+    assert index.scan() == {'directories': 2, 'rescanned': 0, 'removed': 0}
+    assert _names(index) == ['Tome 1.cbz', 'Tome 2.cbz'] and changes == []
+
+    assert index.scan(force=True)['rescanned'] == 2
+    assert _names(index) == ['Tome 1.cbz', 'Tome 2.cbz', 'Tome 3.cbz']
+
+
+def test_rescan_reflects_added_and_removed_archives(backend, tmp_path):
+    root = tmp_path / 'library'
+    folder = str(root / 'Serie')
+    _touch(os.path.join(folder, 'Tome 1.cbz'))
+    _touch(os.path.join(folder, 'Tome 2.cbz'))
+    index = backend.LibraryIndex(str(tmp_path / 'library.sqlite3'), str(root))
+    index.scan()
+    changes = []
+    index.add_listener(changes.extend)
+
+    os.remove(os.path.join(folder, 'Tome 1.cbz'))
+    _touch(os.path.join(folder, 'Tome 3.cbz'))
+    # Make sure the directory mtime moves even on a coarse-grained file system
+    mtime = os.stat(folder).st_mtime + 10
+    os.utime(folder, (mtime, mtime))
+
+    stats = index.scan()
+    assert stats['rescanned'] == 1 and stats['removed'] == 1
+    assert _names(index) == ['Tome 2.cbz', 'Tome 3.cbz']
+    assert sorted((c['type'], c['name']) for c in changes) == [('add', 'Tome 3.cbz'), ('remove', 'Tome 1.cbz')]
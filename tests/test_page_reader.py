@@ -0,0 +1,43 @@
+import os
+
+
+def test_handles_are_closed_when_retired_and_released(backend, library, make_cbz):
+    client = backend.app.test_client()
+    path = os.path.join(library, 'Serie', 'Tome 01.cbz')
+    make_cbz(path, {'001.jpg': b'a' * 5000, '002.jpg': b'b' * 5000})
+    backend.library_index.scan(force=True)
+
+    with client.get('/archive/page/0', query_string={'path': path}) as response:
+        assert response.data == b'a' * 5000
+    handle = backend.archive_handles.get(path)
+    handle.release()
+    assert not handle.closed
+
+    # A page still streaming keeps its handle open across a metadata write
+    response = client.get('/archive/page/1', query_string={'path': path})
+    assert client.post('/update-cbz', json={'filePath': path, 'comicInfoXML': '<ComicInfo/>'}).status_code == 200
+    assert not handle.closed
+    assert b''.join(response.response) == b'b' * 5000
+    response.close()
+    assert handle.closed
+
+    # Renaming the archive retires the handle opened after the write
+    renamed = backend.archive_handles.get(path)
+    renamed.release()
+    new_path = os.path.join(library, 'Serie', 'Tome 02.cbz')
+    assert client.post('/rename', json={'oldPath': path, 'newName': 'Tome 02.cbz'}).status_code == 200
+    assert renamed.closed
+    with client.get('/archive/page/0', query_string={'path': new_path}) as response:
+        assert response.data == b'a' * 5000
+
+
+def test_evicted_handles_are_closed(backend, library, make_cbz, monkeypatch):
+    monkeypatch.setattr(backend.archive_handles, 'max_entries', 1)
+    paths = [os.path.join(library, 'Serie', f'Tome {number}.cbz') for number in (1, 2)]
+    for path in paths:
+        make_cbz(path, {'001.jpg': b'page'})
+    first = backend.archive_handles.get(paths[0])
+    first.release()
+    second = backend.archive_handles.get(paths[1])
+    second.release()
+    assert first.closed and not second.closed
@@ -0,0 +1,46 @@
+import os
+from concurrent.futures.process import BrokenProcessPool
+
+import pytest
+
+import archive_workers
+
+
+@pytest.fixture
+def write_pool(backend, monkeypatch):
+    """A fresh one-worker metadata write pool, shut down after the test."""
+    monkeypatch.setattr(backend, 'METADATA_WRITE_WORKERS', 1)
+    monkeypatch.setattr(backend, '_metadata_write_pool', None)
+    resets = []
+
+    def reset(pool):
+        resets.append(pool)
+        backend.reset_metadata_write_pool(pool)
+
+    def submit(fn, *args):
+        return backend.submit_to_process_pool(backend.get_metadata_write_pool, reset, fn, *args)
+
+    submit.resets = resets
+    yield submit
+    if backend._metadata_write_pool is not None:
+        backend._metadata_write_pool.shutdown()
+
+
+def test_broken_pool_is_replaced_on_submit(backend, write_pool):
+    pool = backend.get_metadata_write_pool()
+    # A worker dies: the pool refuses every task from then on
+    with pytest.raises(BrokenProcessPool):
+        pool.submit(os._exit, 1).result(timeout=60)
+
+    assert write_pool(archive_workers.sidecar_path, 'Tome 01.cbr').result(timeout=60) == 'Tome 01.ComicInfo.xml'
+    assert write_pool.resets == [pool]
+    assert backend.get_metadata_write_pool() is not pool
+
+
+def test_task_lost_with_its_worker_is_retried_once(backend, write_pool):
+    with pytest.raises(BrokenProcessPool):
+        write_pool(os._exit, 1).result(timeout=60)
+    # Its first pool and the one of the retry were both replaced
+    assert len(write_pool.resets) == 2 and write_pool.resets[0] is not write_pool.resets[1]
+
+    assert write_pool(archive_workers.sidecar_path, 'Tome 01.cbr').result(timeout=60) == 'Tome 01.ComicInfo.xml'
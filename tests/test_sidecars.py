@@ -0,0 +1,30 @@
+import os
+
+from archive_workers import sidecar_path, write_sidecar
+
+
+def _comic_info(title):
+    return f'<?xml version="1.0" encoding="utf-8"?><ComicInfo><Title>{title}</Title></ComicInfo>'
+
+
+def test_sidecar_of_a_cbr_is_not_shared_with_a_cbz_of_the_same_name(backend, library, make_cbz):
+    folder = os.path.join(library, 'Serie')
+    cbz = os.path.join(folder, 'Tome 01.cbz')
+    cbr = os.path.join(folder, 'Tome 01.cbr')
+    make_cbz(cbz, {'ComicInfo.xml': _comic_info('Embedded').encode(), 'page1.jpg': b'\xff\xd8page'})
+    with open(cbr, 'wb') as handle:
+        handle.write(b'Rar!\x1a\x07\x00')
+    write_sidecar(cbr, _comic_info('Sidecar'))
+
+    assert backend.read_archive_metadata(cbr)['Title'] == 'Sidecar'
+    assert backend.read_archive_metadata(cbz)['Title'] == 'Embedded'
+
+    backend.library_index.scan(force=True)
+    files = {entry['name']: entry for entry in backend.library_index.folders(only=folder)[0]['files']}
+    assert files['Tome 01.cbr']['hasSidecar'] is True
+    assert files['Tome 01.cbz']['hasSidecar'] is False
+
+    # Renaming the CBZ leaves the sidecar with the CBR
+    backend._move_archive(cbz, os.path.join(folder, 'Tome 02.cbz'))
+    assert os.path.isfile(sidecar_path(cbr))
+    assert not os.path.exists(sidecar_path(os.path.join(folder, 'Tome 02.cbz')))
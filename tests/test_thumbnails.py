@@ -0,0 +1,34 @@
+import io
+import os
+import time
+
+from PIL import Image
+
+
+def jpeg_bytes():
+    output = io.BytesIO()
+    Image.new('RGB', (60, 90), 'red').save(output, 'JPEG')
+    return output.getvalue()
+
+
+def test_fixed_archive_gets_its_thumbnail(backend, library, make_cbz):
+    client = backend.app.test_client()
+    path = os.path.join(library, 'Serie', 'Tome 01.cbz')
+    make_cbz(path, {'001.jpg': b'not an image'})
+    assert client.get('/thumbnail', query_string={'path': path}).status_code == 404
+
+    make_cbz(path, {'001.jpg': jpeg_bytes()})
+    os.utime(path, ns=(time.time_ns(), os.stat(path).st_mtime_ns + 10**9))
+    response = client.get('/thumbnail', query_string={'path': path})
+    assert response.status_code == 200 and response.mimetype == 'image/jpeg'
+
+
+def test_archives_without_cover_are_bounded(backend, tmp_path):
+    cache = backend.ThumbnailCache(str(tmp_path), 1024 * 1024, max_missing=2)
+    for number in range(3):
+        cache.add_missing(f'/library/{number}.cbz', f'key{number}')
+    cache.add_missing('/library/2.cbz', 'key2-modified')
+    assert not cache.is_missing('/library/0.cbz', 'key0')
+    assert cache.is_missing('/library/1.cbz', 'key1')
+    assert not cache.is_missing('/library/2.cbz', 'key2')
+    assert cache.is_missing('/library/2.cbz', 'key2-modified')
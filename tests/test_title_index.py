@@ -0,0 +1,10 @@
+def test_source_filter_applies_before_the_candidate_shortlist(backend, tmp_path):
+    index = backend.TitleIndex(str(tmp_path / 'titles.sqlite3'))
+    # Many API titles sharing every trigram of the query crowd the 50 candidates out
+    for number in range(80):
+        index.add('jikan', str(number), [f'One Piece Party {number}'], {'malId': number})
+    index.add('manga-news', 'serie/one-piec', ['One Piec'], {'pathType': 'serie', 'slug': 'one-piec'})
+
+    assert all(match['source'] == 'jikan' for match in index.match('One Piece', limit=5))
+    match = index.best_match('One Piece', source='manga-news', min_score=0.9)
+    assert match is not None and match['slug'] == 'one-piec'